@@ -0,0 +1,307 @@
+# асинхронный JSON API мебельной компании (ASGI)
+"""
+Асинхронный JSON API рядом с веб-приложением Flask
+
+Приложение - обычный ASGI-объект без фреймворка, запускается любым
+ASGI-сервером:
+    uvicorn api_async:app --port 8001 --workers 1
+    python api_async.py            (то же самое, если установлен uvicorn)
+
+Маршруты (GET):
+    /api/stats                      - статистика, как в web_app
+    /api/products                   - продукция, те же параметры limit/after/format
+    /api/products/<id>              - позиция с маршрутом по цехам и временем производства
+    /api/search?q=...&limit=N       - поиск по названию
+    /api/analytics                  - по типам, средние цены, самые дорогие
+    /api/analytics/report           - отчет с группировкой по снимку каталога (AnalyticsEngine)
+    /api/lookups                    - справочники: типы, материалы, цеха
+    /api/service                    - состояние пула, кэша и объединения запросов
+
+Запросы к БД выполняются в ограниченном пуле потоков (AsyncDatabase), цикл
+событий не блокируется. Одинаковые одновременные запросы объединяются
+(Coalescer): к БД уходит один, остальные получают тот же ответ. Готовые
+ответы кэшируются по версии данных с ETag и 304, как в web_app.
+"""
+import asyncio
+import json
+import re
+from itertools import islice
+from urllib.parse import parse_qs
+
+from scripts.repository import open_database, AsyncDatabase, Coalescer
+from scripts.analytics_engine import AnalyticsEngine, parse_report_params
+from scripts.response_cache import ResponseCache
+
+# Записей в одной порции потоковой выдачи каталога
+STREAM_BATCH = 500
+
+PRODUCT_PATH = re.compile(r'^/api/products/(\d+)$')
+
+
+class HttpError(Exception):
+    """Ответ с ошибкой: код и сообщение"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncApi:
+    """ASGI-приложение JSON API"""
+
+    def __init__(self, db=None, workers=None, cache=True):
+        """Инициализация поверх менеджера БД
+
+        Без db база из config.ini открывается при запуске сервера
+        (lifespan.startup), а не при импорте модуля.
+        """
+        self.db = self.adb = self.engine = None
+        self.workers = workers
+        self.coalescer = Coalescer()
+        self.cache = ResponseCache() if cache else None
+        if db is not None:
+            self.open(db)
+        self.routes = {
+            '/api/stats': self.stats,
+            '/api/products': self.products,
+            '/api/search': self.search,
+            '/api/analytics': self.analytics,
+            '/api/analytics/report': self.report,
+            '/api/lookups': self.lookups,
+            '/api/service': self.service,
+        }
+
+    async def __call__(self, scope, receive, send):
+        """Точка входа ASGI"""
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle(scope, send)
+
+    def open(self, db=None):
+        """Подключить менеджер БД (по умолчанию - из config.ini) и пул потоков"""
+        self.db = db or open_database()
+        self.adb = AsyncDatabase(self.db, self.workers)
+        self.engine = AnalyticsEngine(self.db)
+
+    async def lifespan(self, receive, send):
+        """Запуск и остановка: при запуске открыть БД, при остановке дождаться запросов и закрыть ее"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.db is None:
+                    try:
+                        # Открытие БД (и загрузка реплики каталога) - блокирующая работа
+                        await asyncio.get_running_loop().run_in_executor(None, self.open)
+                    except Exception as e:
+                        await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                        return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def close(self):
+        """Остановить пул потоков и закрыть соединения"""
+        if self.db is None:
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self.adb.close)
+        self.db.close()
+
+    async def handle(self, scope, send):
+        """Обработка HTTP-запроса"""
+        path = scope['path']
+        params = {key: values[-1] for key, values in
+                  parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        headers = dict(scope.get('headers') or [])
+
+        try:
+            if self.db is None:
+                raise HttpError(503, 'БД не открыта: сервер не выполнил lifespan.startup')
+            if scope['method'] != 'GET':
+                raise HttpError(405, 'Поддерживается только GET')
+
+            handler = self.routes.get(path)
+            args = ()
+            match = PRODUCT_PATH.match(path)
+            if match:
+                handler, args = self.product, (int(match.group(1)),)
+            if handler is None:
+                raise HttpError(404, 'Не найдено')
+
+            # Поток каталога не кэшируется и не объединяется
+            if handler == self.products and self._is_stream(params):
+                await self.products_stream(params, send)
+                return
+
+            # Отчет не кэшируется: снимок обновляется по своему интервалу
+            if handler == self.report:
+                await self.respond(send, 200, await self.render(handler, args, params))
+                return
+
+            # data_state() читает PRAGMA data_version - это запрос к БД, не в цикле событий
+            etag = (await self.adb.data_state())[0]
+            if headers.get(b'if-none-match', b'').decode('latin-1').strip('"') == etag:
+                await self.respond(send, 304, b'', etag=etag)
+                return
+
+            key = scope['path'] + '?' + scope.get('query_string', b'').decode('latin-1')
+            entry = self.cache.get(key, etag) if self.cache else None
+            if entry is not None:
+                body = entry['body']
+            else:
+                # Один запрос к БД на ключ и версию данных
+                body = await self.coalescer.run((key, etag), lambda: self.render(handler, args, params))
+                if self.cache:
+                    self.cache.put(key, etag, body, 'application/json')
+            await self.respond(send, 200, body, etag=etag)
+
+        except HttpError as e:
+            await self.respond(send, e.status, _json({'error': str(e)}))
+        except ValueError as e:
+            await self.respond(send, 400, _json({'error': str(e)}))
+
+    async def render(self, handler, args, params):
+        """Тело JSON-ответа обработчика"""
+        return _json(await handler(*args, params))
+
+    async def respond(self, send, status, body, content_type='application/json', etag=None):
+        """Отправить ответ целиком"""
+        headers = [(b'content-type', content_type.encode('latin-1') + b'; charset=utf-8'),
+                   (b'content-length', str(len(body)).encode('latin-1'))]
+        if etag:
+            headers += [(b'etag', f'"{etag}"'.encode('latin-1')), (b'cache-control', b'no-cache')]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def _is_stream(params):
+        """Выдача всего каталога потоком (без limit/after, формат json или ndjson)"""
+        fmt = params.get('format', 'json')
+        return fmt == 'ndjson' or (fmt == 'json' and 'limit' not in params and 'after' not in params)
+
+    async def stats(self, params):
+        """Статистика"""
+        return await self.adb.get_statistics()
+
+    async def products(self, params):
+        """Страница продукции: {"items", "next"} или компактно с format=rows"""
+        limit = _int_param(params, 'limit', 100)
+        fmt = params.get('format', 'json')
+        if fmt not in ('json', 'rows'):
+            raise HttpError(400, f"Неизвестный формат: {fmt}")
+        page = await self.adb.get_products_page(limit=limit, after=params.get('after'),
+                                                shape='tuple' if fmt == 'rows' else 'dict')
+        if page is None:
+            raise HttpError(500, 'Ошибка выполнения запроса')
+        return page
+
+    async def products_stream(self, params, send):
+        """Весь каталог потоком: JSON-массив или ndjson, порциями из пула потоков"""
+        ndjson = params.get('format') == 'ndjson'
+        rows = self.db.iter_products(after=params.get('after'))
+
+        def fetch():
+            return self.adb.run(lambda: list(islice(rows, STREAM_BATCH)))
+
+        first = True
+        tail = None
+        try:
+            # Первая порция до заголовков: ошибка курсора еще может стать ответом 400
+            batch = await fetch()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'application/x-ndjson' if ndjson else b'application/json; charset=utf-8'),
+            ]})
+            while batch:
+                if ndjson:
+                    chunk = b''.join(_json(row) + b'\n' for row in batch)
+                else:
+                    chunk = (b'[' if first else b',') + b','.join(_json(row) for row in batch)
+                first = False
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                try:
+                    batch = await fetch()
+                except (self.db.DB_ERROR, ValueError) as e:
+                    # Заголовки уже отправлены: завершаем тело без закрывающей скобки,
+                    # чтобы клиент увидел обрыв, а не короткий, но корректный список
+                    print(f"Ошибка потоковой выдачи каталога: {e}")
+                    tail = b''
+                    break
+        finally:
+            await self.adb.run(rows.close)
+
+        if tail is None:
+            tail = b'' if ndjson else (b'[]' if first else b']')
+        await send({'type': 'http.response.body', 'body': tail, 'more_body': False})
+
+    async def product(self, product_id, params):
+        """Позиция продукции с маршрутом по цехам"""
+        product = await self.adb.get_product_details(product_id)
+        if product is None:
+            raise HttpError(404, 'Продукция не найдена')
+        return product
+
+    async def search(self, params):
+        """Поиск по названию"""
+        term = params.get('q', '').strip()
+        if not term:
+            raise HttpError(400, 'Не задан параметр q')
+        return await self.adb.search_products(term, limit=_int_param(params, 'limit', 50)) or []
+
+    async def analytics(self, params):
+        """Три отчета аналитики, запрошенные параллельно"""
+        by_type, avg_price, top_products = await asyncio.gather(
+            self.adb.get_products_by_type(),
+            self.adb.get_average_price_by_type(),
+            self.adb.get_top_expensive_products(_int_param(params, 'limit', 10)),
+        )
+        return {'by_type': by_type, 'avg_price': avg_price, 'top_products': top_products}
+
+    async def report(self, params):
+        """Отчет с группировкой; считается в пуле потоков, цикл событий не блокируется"""
+        options = parse_report_params(params)
+        return await self.adb.run(self.engine.report, **options)
+
+    async def lookups(self, params):
+        """Справочники из кэша менеджера"""
+        lookups = {name: await self.adb.get_lookup(name)
+                   for name in ('product_types', 'material_types', 'workshops')}
+        result = {name: lookup.rows for name, lookup in lookups.items()}
+        result['version'] = lookups['workshops'].version
+        return result
+
+    async def service(self, params):
+        """Состояние сервиса"""
+        return {
+            'pool': self.db.get_pool_stats(),
+            'cache': self.cache.stats() if self.cache else None,
+            'coalescing': self.coalescer.stats(),
+        }
+
+
+def _int_param(params, name, default):
+    """Целый параметр строки запроса (400 при ошибке)"""
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HttpError(400, f"Параметр {name} должен быть числом")
+
+
+def _json(data):
+    """JSON в байтах (Decimal и даты из MySQL - строками)"""
+    return json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+
+
+app = AsyncApi()
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("Для запуска нужен ASGI-сервер: pip install uvicorn")
+    else:
+        uvicorn.run(app, host='127.0.0.1', port=8001)
@@ -1,16 +1,156 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-Создание SQLite базы данных
+Создание и синхронизация SQLite базы данных
+
+Источники - файлы data/*_import.xlsx; они читаются потоково (scripts/xlsx_reader.py),
+без pandas и без промежуточного CSV. Если XLSX нет, читается
+CSV-копия с тем же именем.
+
+    python database/create_sqlite.py                    - пересоздать БД из файлов импорта
+    python database/create_sqlite.py --sync             - применить к рабочей БД только изменения
+    python database/create_sqlite.py --sync --dry-run   - показать изменения, ничего не записывая
+    python database/create_sqlite.py --sync --force     - сверить все файлы, даже неизмененные
 """
+import hashlib
+import json
+import os
+import pickle
 import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
 
-def create_database():
-    """Создать SQLite базу данных"""
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from scripts.db_base import Lookup
+from scripts.db_manager_sqlite import INDEXES
+from scripts.xlsx_reader import read_xlsx_rows
+
+# Размер пакета строк для чтения CSV и executemany
+BATCH_SIZE = 50000
+
+# Источники импорта. file - имя файла в data/ без расширения, columns -
+# ожидаемые заголовки колонок, key - индексы колонок естественного ключа,
+# numeric - колонки с неотрицательными числами, resolve - колонки с названиями,
+# которые заменяются на id (колонка -> таблица, колонка названия, колонка id;
+# по ним же строится порядок записи таблиц),
+# upsert - запрос с параметрами в порядке колонок файла,
+# remove - что сделать со строкой, исчезнувшей из файла (параметры - ключ).
+# Справочники при исчезновении строки не трогаем: на них ссылается продукция.
+SYNC_SOURCES = {
+    'Material_types': {
+        'file': 'Material_type_import',
+        'columns': ['Тип материала', 'Процент потерь сырья'],
+        'key': [0],
+        'numeric': [1],
+        'upsert': """
+            INSERT INTO Material_types (material_type_name, waste_percentage) VALUES (?, ?)
+            ON CONFLICT (material_type_name) DO UPDATE SET waste_percentage = excluded.waste_percentage
+        """,
+        'remove': None,
+    },
+    'Product_types': {
+        'file': 'Product_type_import',
+        'columns': ['Тип продукции', 'Коэффициент типа продукции'],
+        'key': [0],
+        'numeric': [1],
+        'upsert': """
+            INSERT INTO Product_types (product_type_name, type_coefficient) VALUES (?, ?)
+            ON CONFLICT (product_type_name) DO UPDATE SET type_coefficient = excluded.type_coefficient
+        """,
+        'remove': None,
+    },
+    'Workshops': {
+        'file': 'Workshops_import',
+        'columns': ['Название цеха', 'Тип цеха', 'Количество человек для производства '],
+        'key': [0],
+        'numeric': [2],
+        'upsert': """
+            INSERT INTO Workshops (workshop_name, workshop_type, staff_count) VALUES (?, ?, ?)
+            ON CONFLICT (workshop_name) DO UPDATE SET
+                workshop_type = excluded.workshop_type,
+                staff_count = excluded.staff_count
+        """,
+        'remove': None,
+    },
+    'Products': {
+        'file': 'Products_import',
+        'columns': ['Тип продукции', 'Наименование продукции', 'Артикул',
+                    'Минимальная стоимость для партнера', 'Основной материал'],
+        'dtype': {'Артикул': str},
+        'key': [2],
+        'numeric': [3],
+        'resolve': {
+            0: ('Product_types', 'product_type_name', 'product_type_id'),
+            4: ('Material_types', 'material_type_name', 'material_type_id'),
+        },
+        'upsert': """
+            INSERT INTO Products (product_type_id, product_name, article_number,
+                                  min_partner_price, material_type_id)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (article_number) DO UPDATE SET
+                product_type_id = excluded.product_type_id,
+                product_name = excluded.product_name,
+                min_partner_price = excluded.min_partner_price,
+                material_type_id = excluded.material_type_id,
+                is_available = 1,
+                updated_at = CURRENT_TIMESTAMP
+        """,
+        # Продукцию не удаляем (на нее могут ссылаться локальные данные), а снимаем с продажи
+        'remove': "UPDATE Products SET is_available = 0 WHERE article_number = ?",
+    },
+    'Product_workshops': {
+        'file': 'Product_workshops_import',
+        'columns': ['Наименование продукции', 'Название цеха', 'Время изготовления, ч'],
+        'key': [0, 1],
+        'numeric': [2],
+        'resolve': {
+            0: ('Products', 'product_name', 'product_id'),
+            1: ('Workshops', 'workshop_name', 'workshop_id'),
+        },
+        'upsert': """
+            INSERT INTO Product_workshops (product_id, workshop_id, production_time_hours)
+            VALUES (?, ?, ?)
+            ON CONFLICT (product_id, workshop_id) DO UPDATE SET
+                production_time_hours = excluded.production_time_hours
+        """,
+        'remove': "DELETE FROM Product_workshops WHERE product_id = ? AND workshop_id = ?",
+    },
+}
+
+# Служебные таблицы синхронизации: хэш каждого файла и каждой строки
+# источника на момент последнего импорта
+IMPORT_STATE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS Import_state (
+        source TEXT PRIMARY KEY,
+        file_hash TEXT,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Import_rows (
+        source TEXT NOT NULL,
+        row_key TEXT NOT NULL,
+        row_hash TEXT NOT NULL,
+        PRIMARY KEY (source, row_key)
+    ) WITHOUT ROWID
+    """,
+]
+
+def create_database(db_path=None, data_dir=None):
+    """Создать SQLite базу данных
+    
+    По умолчанию - database/furniture_company.db из файлов data/.
+    Возвращает отчет импорта (см. import_sources) с временем индексов и общим.
+    """
+    started = time.perf_counter()
     
     # Путь к БД
-    db_path = Path(__file__).parent / 'furniture_company.db'
+    db_path = Path(db_path or Path(__file__).parent / 'furniture_company.db')
     
     # Удалить старую БД если есть
     if db_path.exists():
@@ -20,6 +160,10 @@ def create_database():
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
+    # На время загрузки отключаем синхронную запись и журнал на диске
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA journal_mode = MEMORY")
+    
     print("Создание таблиц...")
     
     # Material_types
@@ -98,78 +242,377 @@ def create_database():
     
     print("✓ Таблицы созданы")
     
-    # Импорт данных
+    # Импорт данных (одной транзакцией). Вместе с данными запоминаются хэши
+    # файлов и строк, чтобы следующая синхронизация применяла только изменения
     print("\nИмпорт данных...")
-    import_data(cursor)
+    report = import_sources(cursor, data_dir=data_dir)
+    print_report(report)
+    
+    # Индексы строим после загрузки - так быстрее, чем обновлять их на каждой вставке
+    print("\nСоздание индексов...")
+    start = time.perf_counter()
+    create_indexes(cursor)
     
     conn.commit()
+    cursor.execute("ANALYZE")
+    report['index_seconds'] = time.perf_counter() - start
+    print(f"  индексы и статистика: {report['index_seconds']:.2f} с")
     conn.close()
     
     print(f"\n✓ База данных создана: {db_path}")
     print(f"  Размер: {db_path.stat().st_size / 1024:.1f} KB")
     
-    return db_path
+    report['create_seconds'] = time.perf_counter() - started
+    return report
+
+def create_indexes(cursor):
+    """Создать вторичные индексы (набор индексов задан в db_manager_sqlite.INDEXES)"""
+    for name, columns in INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+    print(f"  ✓ Индексов: {len(INDEXES)}")
+
+def source_path(name, data_dir=None):
+    """Файл источника: XLSX, а если его нет - CSV (по умолчанию в data/)"""
+    data_dir = Path(data_dir or Path(__file__).parent.parent / 'data')
+    path = data_dir / f"{name}.xlsx"
+    return path if path.exists() else data_dir / f"{name}.csv"
 
-def import_data(cursor):
-    """Импорт данных из CSV"""
+def source_rows(table, path=None):
+    """Строки источника таблицы (кортежи в порядке колонок SYNC_SOURCES)"""
+    source = SYNC_SOURCES[table]
+    path = Path(path or source_path(source['file']))
+    if path.suffix == '.xlsx':
+        return read_xlsx_rows(path, source['columns'], source.get('dtype'))
+    return read_csv_rows(path, source['columns'], source.get('dtype'))
+
+def read_csv_rows(path, columns, dtype=None, chunksize=BATCH_SIZE):
+    """Прочитать CSV пакетами и вернуть кортежи значений указанных колонок"""
     import pandas as pd
-    from pathlib import Path
     
-    data_dir = Path(__file__).parent.parent / 'data'
+    for chunk in pd.read_csv(path, encoding='utf-8-sig', usecols=columns,
+                             dtype=dtype, chunksize=chunksize):
+        # NaN -> None, numpy-типы -> встроенные типы Python
+        values = [chunk[c].astype(object).where(chunk[c].notna(), None).tolist() for c in columns]
+        yield from zip(*values)
+
+def bulk_insert(cursor, query, rows, batch_size=BATCH_SIZE):
+    """Вставить строки пакетами через executemany, вернуть количество строк"""
+    rows = iter(rows)
+    total = 0
     
-    # Material_types
-    df = pd.read_csv(data_dir / 'Material_type_import.csv', encoding='utf-8-sig')
-    for _, row in df.iterrows():
-        cursor.execute(
-            "INSERT INTO Material_types (material_type_name, waste_percentage) VALUES (?, ?)",
-            (row['Тип материала'], row['Процент потерь сырья'])
-        )
-    print(f"  ✓ Material_types: {len(df)} записей")
+    batch = list(islice(rows, batch_size))
+    while batch:
+        cursor.executemany(query, batch)
+        total += len(batch)
+        batch = list(islice(rows, batch_size))
     
-    # Product_types
-    df = pd.read_csv(data_dir / 'Product_type_import.csv', encoding='utf-8-sig')
-    for _, row in df.iterrows():
-        cursor.execute(
-            "INSERT INTO Product_types (product_type_name, type_coefficient) VALUES (?, ?)",
-            (row['Тип продукции'], row['Коэффициент типа продукции'])
-        )
-    print(f"  ✓ Product_types: {len(df)} записей")
+    return total
+
+def name_to_id(cursor, table, name_column, id_column):
+    """Словарь имя -> id для разрешения внешних ключей (для дублей - первая запись)"""
+    rows = cursor.execute(f"SELECT {id_column}, {name_column} FROM {table}").fetchall()
+    return Lookup(rows, 0, 1).ids
+
+def file_hash(path):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def normalize_value(value):
+    """Значение для сравнения: целые float -> int (pandas читает колонку
+    как float, если в пакете есть пустые значения)"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def row_hash(values):
+    """Хэш строки источника"""
+    data = repr(tuple(normalize_value(v) for v in values)).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def clean_row(source, values):
+    """Проверить строку источника: (значения, None) или (None, описание ошибки)"""
+    if any(values[i] is None for i in source['key']):
+        return None, "пустой ключ"
     
-    # Workshops
-    df = pd.read_csv(data_dir / 'Workshops_import.csv', encoding='utf-8-sig')
-    for _, row in df.iterrows():
-        cursor.execute(
-            "INSERT INTO Workshops (workshop_name, workshop_type, staff_count) VALUES (?, ?, ?)",
-            (row['Название цеха'], row['Тип цеха'], row['Количество человек для производства '])
-        )
-    print(f"  ✓ Workshops: {len(df)} записей")
+    values = list(values)
+    for i in source.get('numeric', ()):
+        value = values[i]
+        if value is None:
+            continue
+        if isinstance(value, str):
+            # Число, сохраненное в XLSX текстом ("12,5")
+            try:
+                value = float(value.strip().replace(',', '.'))
+            except ValueError:
+                return None, f"{source['columns'][i].strip()}: не число ({values[i]!r})"
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            return None, f"{source['columns'][i].strip()}: недопустимое значение ({values[i]!r})"
+        values[i] = normalize_value(value)
+    return tuple(values), None
+
+def parse_source(table, path, spool_dir, known_hash=None):
+    """Этап разбора одного источника (выполняется в процессе пула)
     
-    # Products
-    df = pd.read_csv(data_dir / 'Products_import.csv', encoding='utf-8-sig')
-    for _, row in df.iterrows():
-        cursor.execute("""
-            INSERT INTO Products (product_name, article_number, product_type_id, material_type_id, min_partner_price)
-            VALUES (?, ?, 
-                (SELECT product_type_id FROM Product_types WHERE product_type_name = ?),
-                (SELECT material_type_id FROM Material_types WHERE material_type_name = ?),
-                ?)
-        """, (row['Наименование продукции'], str(row['Артикул']), 
-              row['Тип продукции'], row['Основной материал'], 
-              row['Минимальная стоимость для партнера']))
-    print(f"  ✓ Products: {len(df)} записей")
+    Считает хэш файла; если он совпал с known_hash, файл не разбирается.
+    Иначе строки проверяются, дубли ключа отбрасываются (действует первая
+    строка, как в name_to_id), и пакеты (ключ, хэш строки, значения)
+    сбрасываются в файл spool_dir/<таблица>.pickle, чтобы в памяти
+    не копилась вся таблица. Возвращает сводку разбора.
+    """
+    start = time.perf_counter()
+    source = SYNC_SOURCES[table]
+    result = {'table': table, 'file_hash': file_hash(path), 'file_unchanged': False,
+              'spool': None, 'rows': 0, 'invalid': 0, 'duplicates': 0, 'errors': []}
+    if result['file_hash'] == known_hash:
+        result['file_unchanged'] = True
+        result['seconds'] = time.perf_counter() - start
+        return result
     
-    # Product_workshops
-    df = pd.read_csv(data_dir / 'Product_workshops_import.csv', encoding='utf-8-sig')
-    for _, row in df.iterrows():
+    result['spool'] = str(Path(spool_dir) / f"{table}.pickle")
+    seen = set()
+    with open(result['spool'], 'wb') as spool:
+        batch = []
+        for number, values in enumerate(source_rows(table, path), start=1):
+            values, error = clean_row(source, values)
+            if error:
+                result['invalid'] += 1
+                if len(result['errors']) < 10:
+                    result['errors'].append(f"запись {number}: {error}")
+                continue
+            
+            key = json.dumps([values[i] for i in source['key']], ensure_ascii=False)
+            if key in seen:
+                result['duplicates'] += 1
+                continue
+            seen.add(key)
+            
+            batch.append((key, row_hash(values), values))
+            if len(batch) >= BATCH_SIZE:
+                pickle.dump(batch, spool, pickle.HIGHEST_PROTOCOL)
+                batch = []
+        if batch:
+            pickle.dump(batch, spool, pickle.HIGHEST_PROTOCOL)
+    
+    result['rows'] = len(seen)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def spooled_batches(path):
+    """Пакеты строк, сброшенные parse_source"""
+    with open(path, 'rb') as spool:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
+
+def write_source(cursor, table, parsed, apply=True, record=True):
+    """Этап записи одного источника (единственный писатель - основной процесс)
+    
+    Строки сравниваются с хэшами последнего импорта по естественному ключу:
+    новые и измененные применяются через upsert, исчезнувшие из файла
+    обрабатываются по правилу remove. Upsert задает только колонки из файла,
+    а строки, которые в источнике не менялись, не трогаются, поэтому
+    локальные правки сохраняются, пока не изменится строка источника.
+    """
+    start = time.perf_counter()
+    source = SYNC_SOURCES[table]
+    stats = {'inserted': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'skipped': 0}
+    if parsed['file_unchanged']:
+        stats['seconds'] = 0.0
+        return stats
+    
+    stored = dict(cursor.execute(
+        "SELECT row_key, row_hash FROM Import_rows WHERE source = ?", (table,)))
+    resolvers = {index: name_to_id(cursor, *ref)
+                 for index, ref in source.get('resolve', {}).items()}
+    
+    def resolve(values, indexes):
+        """Заменить названия на id; None, если связанная запись не найдена"""
+        resolved = list(values)
+        for position, index in enumerate(indexes):
+            if index in resolvers:
+                resolved[position] = resolvers[index].get(values[position])
+                if resolved[position] is None:
+                    return None
+        return resolved
+    
+    for batch in spooled_batches(parsed['spool']):
+        upserts = []
+        changed_rows = []
+        for key, digest, values in batch:
+            old = stored.pop(key, None)
+            if old == digest:
+                stats['unchanged'] += 1
+                continue
+            
+            params = resolve(values, range(len(values)))
+            if params is None:
+                # Не найдены связанные записи: состояние не меняем, строка
+                # будет сверена снова при следующей синхронизации
+                stats['skipped'] += 1
+                continue
+            stats['updated' if old is not None else 'inserted'] += 1
+            upserts.append(params)
+            changed_rows.append((table, key, digest))
+        
+        if apply:
+            cursor.executemany(source['upsert'], upserts)
+        if record:
+            cursor.executemany("INSERT OR REPLACE INTO Import_rows VALUES (?, ?, ?)", changed_rows)
+    
+    # Ключи, которых больше нет в файле
+    removed = list(stored)
+    stats['removed'] = len(removed)
+    
+    if apply and source['remove']:
+        params = (resolve(json.loads(key), source['key']) for key in removed)
+        bulk_insert(cursor, source['remove'], (p for p in params if p is not None))
+    
+    if record:
+        bulk_insert(cursor, "DELETE FROM Import_rows WHERE source = ? AND row_key = ?",
+                    ((table, key) for key in removed))
+        # Файл с пропущенными или ошибочными строками будет перечитан в следующий раз
+        incomplete = stats['skipped'] or parsed['invalid']
         cursor.execute("""
-            INSERT INTO Product_workshops (product_id, workshop_id, production_time_hours)
-            VALUES (
-                (SELECT product_id FROM Products WHERE product_name = ?),
-                (SELECT workshop_id FROM Workshops WHERE workshop_name = ?),
-                ?)
-        """, (row['Наименование продукции'], row['Название цеха'], 
-              row['Время изготовления, ч']))
-    print(f"  ✓ Product_workshops: {len(df)} записей")
+            INSERT OR REPLACE INTO Import_state (source, file_hash, synced_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        """, (table, None if incomplete else parsed['file_hash']))
+    
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def source_dependencies():
+    """Граф зависимостей источников по внешним ключам (из правил resolve)"""
+    return {
+        table: {ref[0] for ref in source.get('resolve', {}).values()} - {table}
+        for table, source in SYNC_SOURCES.items()
+    }
+
+def import_sources(cursor, apply=True, record=True, force=False, workers=None, data_dir=None):
+    """Конвейер импорта: параллельный разбор, запись в порядке зависимостей
+    
+    Файлы всех источников разбираются и проверяются одновременно в пуле
+    процессов (parse_source). Основной процесс - единственный писатель:
+    как только источник разобран и все таблицы, на которые он ссылается,
+    записаны, он записывается (write_source). Для пустой БД это полная
+    загрузка, для рабочей - синхронизация только изменений.
+    
+    apply=False - не менять данные, record=False - не запоминать состояние
+    (вместе - пробный прогон), force - разбирать и неизмененные файлы.
+    Возвращает отчет {таблица: счетчики и время этапов}, общее время - total_seconds.
+    """
+    for statement in IMPORT_STATE_SCHEMA:
+        cursor.execute(statement)
+    known = {} if force else dict(cursor.execute("SELECT source, file_hash FROM Import_state"))
+    dependencies = source_dependencies()
+    
+    report = {}
+    parsed = {}
+    pending = list(SYNC_SOURCES)
+    workers = workers or min(len(SYNC_SOURCES), os.cpu_count() or 1)
+    
+    with tempfile.TemporaryDirectory() as spool_dir, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        started = time.perf_counter()
+        futures = [
+            pool.submit(parse_source, table, str(source_path(source['file'], data_dir)), spool_dir,
+                        known.get(table))
+            for table, source in SYNC_SOURCES.items()
+        ]
+        
+        waited = time.perf_counter()
+        for future in as_completed(futures):
+            result = future.result()
+            parsed[result['table']] = result
+            
+            # Записать все источники, которые уже разобраны и зависят
+            # только от записанных таблиц
+            while True:
+                table = next((t for t in pending
+                              if t in parsed and dependencies[t].isdisjoint(pending)), None)
+                if table is None:
+                    break
+                wait = time.perf_counter() - waited
+                result = parsed.pop(table)
+                stats = write_source(cursor, table, result, apply, record)
+                stats.update({
+                    'file_unchanged': result['file_unchanged'],
+                    'invalid': result['invalid'],
+                    'duplicates': result['duplicates'],
+                    'errors': result['errors'],
+                    'parse_seconds': result['seconds'],
+                    'wait_seconds': wait,
+                    'write_seconds': stats.pop('seconds'),
+                })
+                report[table] = stats
+                pending.remove(table)
+                waited = time.perf_counter()
+        
+        report['total_seconds'] = time.perf_counter() - started
+    
+    return report
+
+def print_report(report):
+    """Вывести итоги импорта по источникам и время этапов"""
+    for table, stats in report.items():
+        if not isinstance(stats, dict):
+            continue
+        if stats['file_unchanged']:
+            print(f"  = {table}: файл не изменился (разбор {stats['parse_seconds']:.2f} с)")
+            continue
+        line = (f"  ✓ {table}: новых {stats['inserted']}, измененных {stats['updated']}, "
+                f"удаленных {stats['removed']}, без изменений {stats['unchanged']}")
+        if stats['skipped']:
+            line += f", пропущено {stats['skipped']} (не найдены связанные записи)"
+        if stats['invalid'] or stats['duplicates']:
+            line += f", ошибочных {stats['invalid']}, дублей {stats['duplicates']}"
+        print(line)
+        print(f"      разбор {stats['parse_seconds']:.2f} с, ожидание {stats['wait_seconds']:.2f} с, "
+              f"запись {stats['write_seconds']:.2f} с")
+        for error in stats['errors']:
+            print(f"      ! {error}")
+    print(f"  Всего: {report['total_seconds']:.2f} с")
+
+def sync_database(dry_run=False, force=False, db_path=None, data_dir=None):
+    """Применить к рабочей БД изменения файлов импорта
+    
+    Все изменения вносятся одной транзакцией; в режиме WAL приложение
+    продолжает читать прежний снимок данных, пока она не зафиксирована.
+    """
+    db_path = Path(db_path or Path(__file__).parent / 'furniture_company.db')
+    if not db_path.exists():
+        print("БД не найдена, выполняется полная загрузка")
+        return create_database(db_path, data_dir)
+    
+    conn = sqlite3.connect(db_path, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        report = import_sources(cursor, apply=not dry_run, record=not dry_run, force=force,
+                                data_dir=data_dir)
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+    
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    conn.close()
+    
+    print("Пробный прогон, изменения не записаны:" if dry_run else "Синхронизация:")
+    print_report(report)
+    
+    return report
 
 if __name__ == "__main__":
-    create_database()
+    if '--sync' in sys.argv:
+        sync_database(dry_run='--dry-run' in sys.argv, force='--force' in sys.argv)
+    else:
+        create_database()
@@ -80,10 +80,10 @@ def view_products():
     """Просмотр продукции"""
     print_header("ПРОСМОТР ПРОДУКЦИИ")
     
-    from scripts.db_manager import DatabaseManager
+    from scripts.repository import open_database
     
     try:
-        db = DatabaseManager()
+        db = open_database()
         products = db.get_products()
         
         if products:
@@ -104,14 +104,14 @@ def add_product():
     """Добавление продукции"""
     print_header("ДОБАВЛЕНИЕ ПРОДУКЦИИ")
     
-    from scripts.db_manager import DatabaseManager
+    from scripts.repository import open_database
     
     try:
-        db = DatabaseManager()
+        db = open_database()
         
-        # Получаем типы
-        product_types = db.get_product_types()
-        material_types = db.get_material_types()
+        # Получаем типы (кэш справочников менеджера)
+        product_types = db.get_lookup('product_types').rows
+        material_types = db.get_lookup('material_types').rows
         
         print(f"{Colors.BOLD}Типы продукции:{Colors.END}")
         for i, pt in enumerate(product_types, 1):
@@ -141,10 +141,10 @@ def view_workshops():
     """Просмотр цехов"""
     print_header("ПРОСМОТР ЦЕХОВ")
     
-    from scripts.db_manager import DatabaseManager
+    from scripts.repository import open_database
     
     try:
-        db = DatabaseManager()
+        db = open_database()
         workshops = db.get_workshops()
         
         if workshops:
@@ -165,10 +165,10 @@ def show_statistics():
     """Статистика БД"""
     print_header("СТАТИСТИКА БАЗЫ ДАННЫХ")
     
-    from scripts.db_manager import DatabaseManager
+    from scripts.repository import open_database
     
     try:
-        db = DatabaseManager()
+        db = open_database()
         stats = db.get_statistics()
         
         print(f"{Colors.BOLD}Таблицы:{Colors.END}")
@@ -209,10 +209,10 @@ def export_data():
     """Экспорт данных"""
     print_header("ЭКСПОРТ ДАННЫХ")
     
-    from scripts.db_manager import DatabaseManager
+    from scripts.repository import open_database
     
     try:
-        db = DatabaseManager()
+        db = open_database()
         
         print("1. Экспорт продукции в CSV")
         print("2. Экспорт цехов в CSV")
@@ -237,10 +237,10 @@ def test_queries():
     """Тестовые запросы"""
     print_header("ТЕСТОВЫЕ ЗАПРОСЫ")
     
-    from scripts.db_manager import DatabaseManager
+    from scripts.repository import open_database
     
     try:
-        db = DatabaseManager()
+        db = open_database()
         
         print(f"{Colors.BOLD}1. Продукция по типам:{Colors.END}")
         by_type = db.get_products_by_type()
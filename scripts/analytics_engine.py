@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Аналитика по колоночному снимку каталога в памяти (NumPy)
+
+Снимок - массивы NumPy по продукции (тип, материал, доступность, цена,
+время производства единицы) и по маршрутам (продукция, цех, тип цеха,
+часы в цехе). Он загружается из БД потоково и обновляется по версии данных
+менеджера, но не чаще раза в refresh_interval секунд, так что отчеты не
+нагружают рабочую БД.
+
+Отчет - группировка по любому набору измерений с мерами:
+    измерения: type, material, workshop, workshop_type, availability;
+    меры: count - строк в группе, поле:агрегат, где поле - price или hours,
+          агрегат - count, sum, avg, min, max или pNN (перцентиль, p95).
+Без измерений цеха строка отчета - продукция, hours - время единицы по
+всему маршруту. С измерением цеха строка - пара продукция-цех, hours -
+часы в этом цехе, price - цена продукции (в каждом ее цехе).
+
+Пример:
+    engine = AnalyticsEngine(db)
+    engine.report(group_by=['type', 'availability'],
+                  measures=['count', 'price:avg', 'price:p95', 'hours:max'],
+                  where={'material': ['Массив дерева']})
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DIMENSIONS = ('type', 'material', 'workshop', 'workshop_type', 'availability')
+
+# Измерения уровня маршрута: строка - пара продукция-цех
+ROUTE_DIMENSIONS = frozenset({'workshop', 'workshop_type'})
+
+FIELDS = ('price', 'hours')
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+
+# Снимок обновляется не чаще, чем раз в столько секунд
+REFRESH_INTERVAL = 5.0
+
+# Строк за одну порцию потокового чтения снимка
+LOAD_BATCH = 50000
+
+# Больше возможных сочетаний кодов - группы считаются через np.unique
+DENSE_KEYS_MAX = 10_000_000
+
+# Сколько разбиений на группы держать в снимке (по уровню и набору измерений)
+GROUPINGS_KEEP = 16
+
+
+class Snapshot:
+    """Колоночный снимок каталога
+
+    columns[level][name] - массив длины строк уровня ('product' или
+    'route'): коды измерений (индексы в labels[измерение], int16) и
+    значения полей (float64, NaN - нет значения). Снимок не меняется после
+    загрузки; производные массивы (порядок по значению, разбиения на
+    группы) вычисляются при первом обращении и кэшируются.
+    """
+
+    def __init__(self, columns, labels, version):
+        """Снимок из готовых массивов"""
+        self.columns = columns
+        self.labels = labels
+        self.version = version
+        self.loaded_at = time.time()
+        self.load_seconds = 0.0
+        self._orders = {}
+        self._has_nan = {}
+        self._groupings = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db):
+        """Загрузить снимок из БД
+
+        Версия данных берется до чтения: запись во время загрузки даст
+        новую версию, и снимок обновится при следующем отчете.
+        """
+        started = time.perf_counter()
+        version = db.data_state()[0]
+
+        products = _read_array(db, """
+            SELECT product_id, product_type_id, material_type_id, is_available, min_partner_price
+            FROM Products
+            ORDER BY product_id
+        """, 5)
+        routes = _read_array(db, """
+            SELECT product_id, workshop_id, production_time_hours
+            FROM Product_workshops
+        """, 3)
+
+        types = db.get_lookup('product_types')
+        materials = db.get_lookup('material_types')
+        workshops = db.get_lookup('workshops')
+        workshop_type = {row['workshop_id']: row['workshop_type'] for row in workshops.rows}
+        workshop_type_labels = sorted({t for t in workshop_type.values() if t is not None})
+
+        product_ids = products[:, 0].astype(np.int64)
+        type_labels, type_codes = _encode(products[:, 1], types.names)
+        material_labels, material_codes = _encode(products[:, 2], materials.names)
+
+        # Маршруты продукции, которой нет в снимке, отбрасываются
+        position = np.searchsorted(product_ids, routes[:, 0])
+        position[position >= len(product_ids)] = 0
+        routes = routes[product_ids[position] == routes[:, 0]] if len(product_ids) else routes[:0]
+        route_product = np.searchsorted(product_ids, routes[:, 0])
+        workshop_labels, workshop_codes = _encode(routes[:, 1], workshops.names)
+
+        # Тип цеха - через цех: код типа для каждого кода цеха
+        type_of_workshop = np.array(
+            [workshop_type_labels.index(workshop_type[w]) if workshop_type.get(w) is not None
+             else len(workshop_type_labels) for w in sorted(workshops.names)]
+            + [len(workshop_type_labels)],
+            dtype=np.int16
+        )
+
+        hours = routes[:, 2]
+        columns = {
+            'product': {
+                'type': type_codes,
+                'material': material_codes,
+                'availability': (np.nan_to_num(products[:, 3]) != 0).astype(np.int16),
+                'price': products[:, 4],
+                'hours': np.bincount(route_product, weights=np.nan_to_num(hours), minlength=len(product_ids)),
+            },
+            'route': {
+                'product': route_product,
+                'workshop': workshop_codes,
+                'workshop_type': type_of_workshop[workshop_codes],
+                'hours': hours,
+            },
+        }
+        labels = {
+            'type': type_labels,
+            'material': material_labels,
+            'workshop': workshop_labels,
+            'workshop_type': workshop_type_labels + [None],
+            'availability': [False, True],
+        }
+        snapshot = cls(columns, labels, version)
+        snapshot.load_seconds = time.perf_counter() - started
+        return snapshot
+
+    def size(self, level):
+        """Число строк уровня"""
+        return len(self.columns[level]['hours'])
+
+    def column(self, level, name):
+        """Столбец уровня; столбцы продукции на уровне маршрута собираются по позиции продукции"""
+        columns = self.columns[level]
+        if name not in columns:
+            with self._lock:
+                if name not in columns:
+                    columns[name] = self.columns['product'][name][columns['product']]
+        return columns[name]
+
+    def has_nan(self, level, field):
+        """Есть ли пустые значения в поле"""
+        key = (level, field)
+        if key not in self._has_nan:
+            self._has_nan[key] = bool(np.isnan(self.column(level, field)).any())
+        return self._has_nan[key]
+
+    def order(self, level, field):
+        """Порядок строк уровня по возрастанию значения поля (NaN в конце), вычисляется один раз"""
+        key = (level, field)
+        if key not in self._orders:
+            order = np.argsort(self.column(level, field))
+            with self._lock:
+                self._orders.setdefault(key, order)
+        return self._orders[key]
+
+    def grouping(self, level, group_by):
+        """Разбиение строк уровня на группы по измерениям group_by
+
+        Возвращает (ключи групп по возрастанию, номер группы каждой строки).
+        Ключ - номер сочетания кодов измерений (смешанная система счисления
+        по числу значений каждого измерения).
+        """
+        cache_key = (level, tuple(group_by))
+        with self._lock:
+            if cache_key in self._groupings:
+                self._groupings.move_to_end(cache_key)
+                return self._groupings[cache_key]
+
+        combinations = 1
+        for name in group_by:
+            combinations *= len(self.labels[name])
+        dtype = np.int32 if combinations < 2 ** 31 else np.int64
+        key = np.zeros(self.size(level), dtype=dtype)
+        for name in group_by:
+            key *= len(self.labels[name])
+            key += self.column(level, name)
+
+        if combinations <= DENSE_KEYS_MAX:
+            # Сочетаний немного: подсчет по всем сочетаниям и перенумерация
+            keys = np.flatnonzero(np.bincount(key, minlength=combinations))
+            remap = np.zeros(combinations, dtype=np.int32)
+            remap[keys] = np.arange(len(keys), dtype=np.int32)
+            groups = remap[key]
+        else:
+            keys, groups = np.unique(key, return_inverse=True)
+            groups = groups.astype(np.int32)
+
+        with self._lock:
+            self._groupings[cache_key] = (keys, groups)
+            while len(self._groupings) > GROUPINGS_KEEP:
+                self._groupings.popitem(last=False)
+        return keys, groups
+
+    def info(self):
+        """Описание снимка"""
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 3),
+            'products': self.size('product'),
+            'routes': self.size('route'),
+        }
+
+
+class AnalyticsEngine:
+    """Отчеты с группировкой по снимку каталога"""
+
+    def __init__(self, db, refresh_interval=REFRESH_INTERVAL):
+        """Инициализация поверх менеджера БД (снимок загружается при первом отчете)"""
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, force=False):
+        """Текущий снимок; перезагружается, если данные изменились и интервал истек"""
+        snapshot = self._snapshot
+        if force or self._outdated(snapshot):
+            with self._lock:
+                snapshot = self._snapshot
+                if force or self._outdated(snapshot):
+                    snapshot = self._snapshot = Snapshot.load(self.db)
+        return snapshot
+
+    def _outdated(self, snapshot):
+        """Нужно ли перезагрузить снимок"""
+        if snapshot is None:
+            return True
+        return (time.time() - snapshot.loaded_at >= self.refresh_interval
+                and self.db.data_state()[0] != snapshot.version)
+
+    def report(self, group_by=(), measures=('count',), where=None, sort=None, limit=None):
+        """Отчет: строки {измерение: значение, ..., мера: значение}
+
+        where - фильтр {измерение: значение или список значений}; sort -
+        мера для сортировки по убыванию, пустые значения в конце (по
+        умолчанию - по значениям измерений); limit - число строк.
+        ValueError при ошибке в описании отчета.
+        """
+        started = time.perf_counter()
+        group_by = list(group_by)
+        measures = [_parse_measure(m) for m in measures]
+        where = dict(where or {})
+        for name in group_by + list(where):
+            if name not in DIMENSIONS:
+                raise ValueError(f"Неизвестное измерение: {name} (варианты: {', '.join(DIMENSIONS)})")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("Измерения группировки повторяются")
+        if sort is not None and sort not in [m[0] for m in measures]:
+            raise ValueError(f"Сортировка по мере, которой нет в отчете: {sort}")
+
+        snapshot = self.snapshot()
+        level = 'route' if ROUTE_DIMENSIONS & set(group_by + list(where)) else 'product'
+        keys, groups = snapshot.grouping(level, group_by)
+        count = len(keys)
+
+        # Строки вне фильтра уходят в лишнюю группу с номером count,
+        # которая отбрасывается: так не нужно копировать массивы по маске
+        if where:
+            mask = np.ones(snapshot.size(level), dtype=bool)
+            for name, values in where.items():
+                codes = _filter_codes(snapshot.labels[name], values)
+                mask &= np.isin(snapshot.column(level, name), codes)
+            groups = np.where(mask, groups, count).astype(np.int32)
+        sizes = np.bincount(groups, minlength=count + 1)[:count]
+
+        results = {}
+        targets = {}
+        for column, field, aggregate in measures:
+            if field is None:
+                results[column] = sizes
+            else:
+                results[column] = _aggregate(snapshot, level, field, aggregate, groups, count, targets)
+
+        cardinalities = [len(snapshot.labels[name]) for name in group_by]
+        present = np.flatnonzero(sizes)
+        values = {column: result[present].tolist() for column, result in results.items()}
+        rows = []
+        for i, group_key in enumerate(keys[present].tolist()):
+            codes = []
+            for cardinality in reversed(cardinalities):
+                group_key, code = divmod(group_key, cardinality)
+                codes.append(code)
+            row = {name: snapshot.labels[name][code] for name, code in zip(group_by, reversed(codes))}
+            for column in results:
+                value = values[column][i]
+                row[column] = None if value != value else value
+            rows.append(row)
+
+        if sort is not None:
+            rows.sort(key=lambda r: (r[sort] is not None, r[sort] or 0), reverse=True)
+        else:
+            rows.sort(key=lambda r: [(r[n] is None, str(r[n])) for n in group_by])
+        if limit:
+            rows = rows[:int(limit)]
+
+        return {
+            'group_by': group_by,
+            'measures': [m[0] for m in measures],
+            'level': level,
+            'rows': rows,
+            'snapshot': snapshot.info(),
+            'ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+
+
+def parse_report_params(params):
+    """Параметры report() из строки запроса
+
+    group_by и measures - через запятую; параметр с именем измерения -
+    фильтр (значения через запятую); sort и limit - как в report().
+    """
+    def split(value):
+        return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+    limit = params.get('limit')
+    try:
+        limit = int(limit) if limit else None
+    except ValueError:
+        raise ValueError("Параметр limit должен быть числом")
+
+    return {
+        'group_by': split(params.get('group_by')),
+        'measures': split(params.get('measures')) or ['count'],
+        'where': {name: split(params[name]) for name in DIMENSIONS if params.get(name)},
+        'sort': params.get('sort') or None,
+        'limit': limit,
+    }
+
+
+def _read_array(db, query, width):
+    """Результат запроса массивом float64 (NULL -> NaN), порциями iter_query"""
+    rows = db.iter_query(query, batch_size=LOAD_BATCH)
+    next(rows, None)
+    chunks = [np.array(batch, dtype=np.float64) for batch in rows]
+    if not chunks:
+        return np.empty((0, width), dtype=np.float64)
+    return np.concatenate(chunks)
+
+
+def _encode(ids, names):
+    """Коды по справочнику {id: название}: индекс в списке названий (упорядочен по id)
+
+    id, которых нет в справочнике (и NULL), получают последний код
+    с названием None.
+    """
+    known = np.array(sorted(names), dtype=np.float64)
+    labels = [names[i] for i in sorted(names)] + [None]
+    codes = np.searchsorted(known, ids)
+    codes[codes >= len(known)] = len(known)
+    found = codes < len(known)
+    found[found] = known[codes[found]] == ids[found]
+    codes[~found] = len(known)
+    return labels, codes.astype(np.int16 if len(labels) < 2 ** 15 else np.int32)
+
+
+def _filter_codes(labels, values):
+    """Коды значений фильтра; значения сравниваются строками, для bool - 1/0/true/false"""
+    if not isinstance(values, (list, tuple, set)):
+        values = [values]
+    wanted = {_label_text(value) for value in values}
+    return [code for code, label in enumerate(labels) if _label_text(label) in wanted]
+
+
+def _label_text(value):
+    """Значение измерения для сравнения с фильтром"""
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    text = str(value).strip().lower()
+    return {'true': '1', 'false': '0'}.get(text, text)
+
+
+def _parse_measure(spec):
+    """Разобрать меру: (имя столбца, поле или None, агрегат)"""
+    if spec == 'count':
+        return ('count', None, 'count')
+    field, _, aggregate = spec.partition(':')
+    if field not in FIELDS:
+        raise ValueError(f"Неизвестное поле меры: {spec} (поля: {', '.join(FIELDS)})")
+    if aggregate not in AGGREGATES:
+        try:
+            percentile = float(aggregate[1:]) if aggregate.startswith('p') else None
+        except ValueError:
+            percentile = None
+        if percentile is None or not 0 <= percentile <= 100:
+            raise ValueError(f"Неизвестный агрегат: {spec} (варианты: {', '.join(AGGREGATES)}, pNN)")
+    return (f"{field}_{aggregate}", field, aggregate)
+
+
+def _aggregate(snapshot, level, field, aggregate, groups, count, targets):
+    """Значения агрегата поля по группам (NaN - в группе нет значений)
+
+    groups - номер группы строки, count - для отброшенных строк; targets -
+    кэш номеров групп с учетом пустых значений поля в пределах отчета.
+    """
+    values = snapshot.column(level, field)
+    if field not in targets:
+        # Строки с пустым значением тоже уходят в отбрасываемую группу
+        targets[field] = np.where(np.isnan(values), count, groups).astype(np.int32) \
+            if snapshot.has_nan(level, field) else groups
+    target = targets[field]
+    n = np.bincount(target, minlength=count + 1)[:count]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if aggregate == 'count':
+            return n
+        if aggregate in ('sum', 'avg'):
+            total = np.bincount(target, weights=values, minlength=count + 1)[:count]
+            return total if aggregate == 'sum' else total / n
+        if aggregate in ('min', 'max'):
+            ufunc = np.minimum if aggregate == 'min' else np.maximum
+            result = np.full(count + 1, np.inf if aggregate == 'min' else -np.inf)
+            ufunc.at(result, target, values)
+            return np.where(n > 0, result[:count], np.nan)
+
+        # Перцентиль: значения, отсортированные внутри групп. Глобальный
+        # порядок по значению вычислен для снимка один раз; устойчивая
+        # сортировка по номеру группы его сохраняет (для небольших номеров
+        # NumPy делает ее поразрядно, за линейное время)
+        order = snapshot.order(level, field)
+        ordered_groups = target[order]
+        if count < 2 ** 16 - 1:
+            ordered_groups = ordered_groups.astype(np.uint16)
+        ordered = values[order[np.argsort(ordered_groups, kind='stable')]]
+
+        starts = np.concatenate(([0], np.cumsum(n)[:-1])).astype(np.int64)
+        present = n > 0
+        q = float(aggregate[1:]) / 100
+        # Линейная интерполяция, как np.percentile по умолчанию
+        position = starts[present] + (n[present] - 1) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        result = np.full(count, np.nan)
+        result[present] = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+        return result
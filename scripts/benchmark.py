@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Набор бенчмарков: синтетический каталог, импорт, методы менеджера и маршруты
+
+Генератор строит каталог заданного размера в формате файлов импорта
+(справочники берутся из data/, цехов и маршрутов становится больше вместе
+с продукцией), затем замеряются:
+    import  - полная загрузка create_database (с временем этапов конвейера);
+    query   - методы чтения DatabaseManager (набор PLAN_CHECKS и расчеты);
+    route   - основные маршруты Flask через тестовый клиент, с очищенным
+              кэшем ответов (cold) и с заполненным (cached).
+Результаты сохраняются в JSON; compare сравнивает два файла и завершается
+с кодом 1, если что-то замедлилось больше порога.
+
+Использование:
+    python scripts/benchmark.py run [--products N] [--repeat R] [--output файл.json]
+                                    [--only import,query,route] [--keep каталог]
+    python scripts/benchmark.py compare базовый.json текущий.json [--threshold 0.2]
+"""
+import argparse
+import configparser
+import csv
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'database'))
+
+import create_sqlite
+from db_manager_sqlite import DatabaseManager
+from repository import CONFIG_ENV, config_path
+
+# Допустимое замедление по умолчанию (доля) и минимальная разница, которую
+# считаем значимой (быстрые операции сильнее подвержены шуму), секунды
+REGRESSION_THRESHOLD = 0.2
+REGRESSION_MIN_DELTA = 0.0005
+
+# Маршрутов на продукт (в data/ - 130 на 20 изделий)
+ROUTINGS_MIN = 3
+ROUTINGS_MAX = 10
+
+# Изделий на один цех (не меньше, чем цехов в data/)
+PRODUCTS_PER_WORKSHOP = 200
+
+WORKSHOP_TYPES = ('Проектирование', 'Обработка', 'Сборка', 'Покраска', 'Упаковка', 'Контроль')
+PRODUCT_WORDS = ('Шкаф', 'Стол', 'Стул', 'Кровать', 'Комод', 'Тумба', 'Стеллаж', 'Диван', 'Кресло')
+PRODUCT_FINISHES = ('Дуб', 'Ясень', 'Венге', 'Орех', 'Бук', 'Вишня', 'Ольха', 'Сосна')
+
+# Маршруты веб-приложения: (метод, путь, тело JSON)
+ROUTES = [
+    ('GET', '/', None),
+    ('GET', '/products', None),
+    ('GET', '/products?sort=price&order=desc', None),
+    ('GET', '/products?type=1&available=1', None),
+    ('GET', '/products?search=шкаф', None),
+    ('GET', '/workshops', None),
+    ('GET', '/analytics', None),
+    ('GET', '/api/stats', None),
+    ('GET', '/api/products?limit=100', None),
+    ('GET', '/api/products?limit=100&format=rows', None),
+]
+
+
+def write_csv(path, header, rows):
+    """CSV в кодировке файлов импорта (utf-8 с BOM)"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def generate_catalog(directory, products, seed=0):
+    """Сгенерировать файлы импорта с products изделиями в каталоге directory
+
+    Типы продукции и материалы - из data/ (их немного и в реальности).
+    Строки пишутся потоково, поэтому каталог на миллионы изделий не
+    держится в памяти. Возвращает размеры каталога.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    sources = create_sqlite.SYNC_SOURCES
+
+    product_types = list(create_sqlite.source_rows('Product_types'))
+    materials = list(create_sqlite.source_rows('Material_types'))
+    write_csv(directory / 'Product_type_import.csv', sources['Product_types']['columns'], product_types)
+    write_csv(directory / 'Material_type_import.csv', sources['Material_types']['columns'], materials)
+
+    workshop_count = max(len(WORKSHOP_TYPES) * 2, products // PRODUCTS_PER_WORKSHOP)
+    workshops = [f"Цех {WORKSHOP_TYPES[i % len(WORKSHOP_TYPES)].lower()} №{i + 1}"
+                 for i in range(workshop_count)]
+    write_csv(directory / 'Workshops_import.csv', sources['Workshops']['columns'], (
+        (name, WORKSHOP_TYPES[i % len(WORKSHOP_TYPES)], rng.randint(2, 30))
+        for i, name in enumerate(workshops)
+    ))
+
+    write_csv(directory / 'Products_import.csv', sources['Products']['columns'], (
+        (rng.choice(product_types)[0], product_name(i), str(10 ** 7 + i),
+         round(rng.lognormvariate(10, 0.8), 2), rng.choice(materials)[0])
+        for i in range(products)
+    ))
+
+    routings = 0
+
+    def routing_rows():
+        nonlocal routings
+        for i in range(products):
+            count = rng.randint(ROUTINGS_MIN, ROUTINGS_MAX)
+            routings += count
+            for workshop in rng.sample(workshops, min(count, len(workshops))):
+                yield product_name(i), workshop, round(rng.uniform(0.5, 8), 1)
+
+    write_csv(directory / 'Product_workshops_import.csv',
+              sources['Product_workshops']['columns'], routing_rows())
+
+    return {'products': products, 'workshops': workshop_count, 'routings': routings,
+            'product_types': len(product_types), 'material_types': len(materials)}
+
+
+def product_name(i):
+    """Название i-го изделия: уникальное (маршруты ссылаются на изделие по
+    названию) и вычисляемое, чтобы не хранить список названий"""
+    mixed = (i * 2654435761) % 2 ** 32
+    word = PRODUCT_WORDS[mixed % len(PRODUCT_WORDS)]
+    finish = PRODUCT_FINISHES[(mixed >> 8) % len(PRODUCT_FINISHES)]
+    return f"{word} {finish} {i + 1:08d}"
+
+
+def call_label(name, args, kwargs):
+    """Подпись вызова метода для отчета"""
+    parts = [repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()]
+    return f"{name}({', '.join(parts)})"
+
+
+def measure(function, repeat):
+    """Время вызова: лучшее и медиана из repeat запусков, секунды"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times)}
+
+
+def bench_import(data_dir, db_path):
+    """Полная загрузка каталога и открытие БД менеджером (служебные объекты схемы)"""
+    report = create_sqlite.create_database(db_path, data_dir)
+    results = {
+        'import.total': {'best': report['create_seconds']},
+        'import.indexes': {'best': report['index_seconds']},
+    }
+    for table in create_sqlite.SYNC_SOURCES:
+        stats = report[table]
+        results[f'import.{table}.parse'] = {'best': stats['parse_seconds']}
+        results[f'import.{table}.write'] = {'best': stats['write_seconds']}
+
+    start = time.perf_counter()
+    DatabaseManager(db_path).close()
+    results['import.ensure_schema'] = {'best': time.perf_counter() - start}
+    return results
+
+
+def query_checks(db):
+    """Вызовы методов чтения: набор PLAN_CHECKS плюс расчеты производства"""
+    checks = [(call_label(name, args, kwargs), name, args, kwargs)
+              for name, args, kwargs, _ in db.PLAN_CHECKS]
+
+    ids = [row['product_id'] for row in db.execute_query(
+        "SELECT product_id FROM Products ORDER BY product_id LIMIT 100")]
+    orders = [{'product_id': product_id, 'quantity': 10, 'param1': 1.5, 'param2': 0.8}
+              for product_id in ids]
+    checks += [
+        ('calculate_production(100)', 'calculate_production', (orders,), {}),
+        ('schedule_production(100)', 'schedule_production',
+         ([{'product_id': o['product_id'], 'quantity': 5} for o in orders],), {'details': False}),
+    ]
+    return checks
+
+
+def bench_queries(db_path, repeat):
+    """Методы чтения DatabaseManager (без кэша статистики)"""
+    db = DatabaseManager(db_path)
+    db.STATS_TTL = 0
+    db.acquire()
+    results = {}
+    try:
+        for label, name, args, kwargs in query_checks(db):
+            method = getattr(db, name)
+
+            def call():
+                result = method(*args, **kwargs)
+                if hasattr(result, '__next__'):
+                    for _ in result:
+                        pass
+
+            results[f'query.{label}'] = measure(call, repeat)
+    finally:
+        db.release()
+        db.close()
+    return results
+
+
+def bench_config(db_path):
+    """Временный config.ini рядом с БД бенчмарка: настройки проекта, но БД - db_path"""
+    config = configparser.ConfigParser()
+    config.read(config_path(), encoding='utf-8')
+    for section in ('database', 'metrics'):
+        if not config.has_section(section):
+            config.add_section(section)
+    config['database']['backend'] = 'sqlite'
+    config['database']['path'] = str(Path(db_path).resolve())
+    # Медленные запросы бенчмарка не попадают в журнал проекта
+    config['metrics']['slow_query_log'] = ''
+
+    path = Path(db_path).with_suffix('.ini')
+    with open(path, 'w', encoding='utf-8') as f:
+        config.write(f)
+    return path
+
+
+def bench_routes(db_path, repeat):
+    """Маршруты Flask через тестовый клиент на БД бенчмарка
+
+    web_app открывает БД при импорте, поэтому импортируется с временным
+    config.ini (FURNITURE_CONFIG): рабочая БД проекта не открывается.
+    """
+    if 'web_app' in sys.modules:
+        raise RuntimeError("web_app уже импортирован с другой БД")
+    previous = os.environ.get(CONFIG_ENV)
+    os.environ[CONFIG_ENV] = str(bench_config(db_path))
+    try:
+        import web_app
+    finally:
+        if previous is None:
+            del os.environ[CONFIG_ENV]
+        else:
+            os.environ[CONFIG_ENV] = previous
+    client = web_app.app.test_client()
+    results = {}
+
+    try:
+        for method, path, body in ROUTES:
+            def request():
+                response = client.open(path, method=method, json=body)
+                response.get_data()
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{method} {path}: {response.status_code}")
+
+            def cold():
+                web_app.response_cache.clear()
+                request()
+
+            results[f'route.{method} {path}.cold'] = measure(cold, repeat)
+            results[f'route.{method} {path}.cached'] = measure(request, repeat)
+    finally:
+        web_app.db.close()
+    return results
+
+
+def run(args):
+    """Команда run: сгенерировать каталог, выполнить замеры, сохранить JSON"""
+    stages = set(args.only.split(',')) if args.only else {'import', 'query', 'route'}
+    with tempfile.TemporaryDirectory() as temp:
+        directory = Path(args.keep or temp)
+        data_dir = directory / 'data'
+        db_path = directory / 'benchmark.db'
+
+        start = time.perf_counter()
+        catalog = generate_catalog(data_dir, args.products, args.seed)
+        print(f"Каталог: {catalog} ({time.perf_counter() - start:.1f} с)")
+
+        results = {}
+        if 'import' in stages or not db_path.exists():
+            imported = bench_import(data_dir, db_path)
+            if 'import' in stages:
+                results.update(imported)
+        if 'query' in stages:
+            results.update(bench_queries(db_path, args.repeat))
+        if 'route' in stages:
+            results.update(bench_routes(db_path, args.repeat))
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'catalog': catalog,
+        },
+        'results': results,
+    }
+
+    print(f"\n{'замер':70} {'лучшее, мс':>11} {'медиана, мс':>12}")
+    for name, value in results.items():
+        median = f"{value['median'] * 1000:12.2f}" if 'median' in value else ''
+        print(f"{name[:70]:70} {value['best'] * 1000:11.2f} {median}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\nРезультаты сохранены: {args.output}")
+    return report
+
+
+def compare_reports(baseline, current, threshold=REGRESSION_THRESHOLD, min_delta=REGRESSION_MIN_DELTA):
+    """Сравнить два отчета по лучшему времени: список (замер, было, стало, отношение, регрессия)"""
+    rows = []
+    for name, before in baseline['results'].items():
+        after = current['results'].get(name)
+        if after is None:
+            continue
+        old, new = before['best'], after['best']
+        ratio = new / old if old else float('inf')
+        regression = ratio > 1 + threshold and new - old > min_delta
+        rows.append((name, old, new, ratio, regression))
+    return rows
+
+
+def compare(args):
+    """Команда compare: код 1, если есть регрессии"""
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    current = json.loads(Path(args.current).read_text(encoding='utf-8'))
+    if baseline['meta'].get('catalog') != current['meta'].get('catalog'):
+        print("Внимание: отчеты сняты на каталогах разного размера")
+
+    rows = compare_reports(baseline, current, args.threshold)
+    for name, old, new, ratio, regression in rows:
+        mark = '!!' if regression else '  '
+        print(f"{mark} {name[:70]:70} {old * 1000:10.2f} -> {new * 1000:10.2f} мс  x{ratio:.2f}")
+
+    regressions = [row for row in rows if row[4]]
+    print(f"\nСравнено замеров: {len(rows)}, регрессий (> {args.threshold:.0%}): {len(regressions)}")
+    return 1 if regressions else 0
+
+
+def main():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Бенчмарки БД мебельной компании")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="сгенерировать каталог и выполнить замеры")
+    run_parser.add_argument('--products', type=int, default=10000, help="изделий в каталоге (10^3 - 10^7)")
+    run_parser.add_argument('--repeat', type=int, default=5, help="повторов каждого замера")
+    run_parser.add_argument('--seed', type=int, default=0, help="начальное значение генератора")
+    run_parser.add_argument('--only', help="этапы через запятую: import,query,route")
+    run_parser.add_argument('--output', help="файл JSON с результатами")
+    run_parser.add_argument('--keep', help="каталог для данных и БД (не удалять после замеров)")
+
+    compare_parser = commands.add_parser('compare', help="сравнить два файла результатов")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                                help="допустимое замедление, доля (0.2 = 20%%)")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк калькулятора производства: цикл по заказам против векторного расчета
+
+Использование:
+    python scripts/benchmark_production.py [количество_заказов] [количество_продуктов]
+"""
+import sys
+import time
+
+import numpy as np
+
+from production_calculator import ProductionCalculator
+
+
+def make_calculator(products, rng):
+    """Синтетический калькулятор с заданным числом продуктов"""
+    return ProductionCalculator(
+        np.arange(1, products + 1),
+        rng.choice([1.5, 2.3, 3.0, 3.5, 4.7, 5.6], products),
+        rng.choice([0.003, 0.0055, 0.007, 0.008], products),
+        rng.uniform(5.0, 40.0, products).round(1),
+    )
+
+
+def make_orders(count, products, rng):
+    """Синтетическая книга заказов"""
+    return (
+        rng.integers(1, products + 1, count),
+        rng.integers(1, 50, count),
+        rng.uniform(0.5, 3.0, count).round(2),
+        rng.uniform(0.5, 3.0, count).round(2),
+    )
+
+
+def main():
+    """Запуск бенчмарка"""
+    orders_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    products = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    rng = np.random.default_rng(42)
+    calculator = make_calculator(products, rng)
+    product_ids, quantities, param1, param2 = make_orders(orders_count, products, rng)
+
+    # Цикл по заказам (скалярный путь)
+    ids_list = product_ids.tolist()
+    qty_list = quantities.tolist()
+    p1_list = param1.tolist()
+    p2_list = param2.tolist()
+
+    start = time.perf_counter()
+    loop_results = [
+        calculator.calculate_order(pid, qty, p1, p2)
+        for pid, qty, p1, p2 in zip(ids_list, qty_list, p1_list, p2_list)
+    ]
+    loop_time = time.perf_counter() - start
+
+    # Векторный расчет
+    start = time.perf_counter()
+    batch = calculator.calculate_batch(product_ids, quantities, param1, param2)
+    batch_time = time.perf_counter() - start
+
+    # Результаты должны совпадать
+    loop_material = np.array([m for m, _ in loop_results])
+    loop_hours = np.array([h for _, h in loop_results])
+    same = (np.array_equal(loop_material, batch['material_needed'])
+            and np.array_equal(loop_hours, batch['production_hours']))
+
+    print(f"заказов: {orders_count}, продуктов: {products}")
+    print(f"  цикл:     {loop_time * 1000:10.1f} мс")
+    print(f"  векторно: {batch_time * 1000:10.1f} мс")
+    print(f"  ускорение: x{loop_time / batch_time:.1f}")
+    print(f"  результаты совпадают: {'да' if same else 'НЕТ'}")
+
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Микро-бенчмарк чтения из SQLite: формы результата execute_query и кэш запросов
+
+Копия рабочей БД дополняется синтетической продукцией, затем одна и та же
+выборка читается разными способами:
+    Row -> dict  - прежний путь (sqlite3.Row и копия каждой строки в словарь);
+    dict, tuple, namedtuple, columns, row - формы execute_query(shape=...).
+Отдельно сравнивается повторное выполнение короткого запроса без кэша
+подготовленных запросов и с кэшем STATEMENT_CACHE_SIZE.
+
+Использование:
+    python scripts/benchmark_queries.py [количество_продуктов] [повторов]
+"""
+import argparse
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from db_manager_sqlite import DatabaseManager, STATEMENT_CACHE_SIZE
+from db_base import ROW_SHAPES
+
+DB_PATH = Path(__file__).parent.parent / 'database' / 'furniture_company.db'
+
+QUERY = """
+    SELECT
+        p.product_id,
+        p.product_name,
+        p.article_number,
+        pt.product_type_name,
+        mt.material_type_name,
+        p.min_partner_price,
+        p.is_available
+    FROM Products p
+    JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+    JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+    ORDER BY p.product_name, p.product_id
+    LIMIT ?
+"""
+
+
+def make_database(directory, products):
+    """Копия БД с добавленной синтетической продукцией"""
+    path = Path(directory) / 'benchmark.db'
+    shutil.copyfile(DB_PATH, path)
+
+    connection = sqlite3.connect(path)
+    types = [row[0] for row in connection.execute("SELECT product_type_id FROM Product_types")]
+    materials = [row[0] for row in connection.execute("SELECT material_type_id FROM Material_types")]
+    connection.executemany(
+        """INSERT INTO Products (product_name, article_number, product_type_id, material_type_id,
+                                 min_partner_price, is_available)
+           VALUES (?, ?, ?, ?, ?, 1)""",
+        (
+            (f"Изделие {i:07d}", f"BQ{i:08d}", types[i % len(types)],
+             materials[i % len(materials)], 1000 + i % 50000)
+            for i in range(products)
+        ),
+    )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def best_time(function, repeats):
+    """Лучшее время из repeats запусков, секунды"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def legacy_rows(db, limit):
+    """Прежний путь execute_query: sqlite3.Row и dict(row) на каждую строку"""
+    with db._reader() as connection:
+        cursor = connection.cursor()
+        cursor.execute(QUERY, (limit,))
+        rows = cursor.fetchall()
+    return [dict(row) for row in rows]
+
+
+def statement_cache(path, cache_size, count):
+    """Время count выполнений короткого запроса при заданном кэше запросов"""
+    connection = sqlite3.connect(path, cached_statements=cache_size)
+    start = time.perf_counter()
+    for i in range(count):
+        connection.execute(
+            "SELECT product_name, min_partner_price FROM Products WHERE product_id = ?", (i + 1,)
+        ).fetchone()
+    elapsed = time.perf_counter() - start
+    connection.close()
+    return elapsed
+
+
+def main():
+    """Запуск бенчмарка"""
+    parser = argparse.ArgumentParser(description="Формы результата execute_query и кэш запросов SQLite")
+    parser.add_argument('products', type=int, nargs='?', default=100000,
+                        help="синтетической продукции в копии БД")
+    parser.add_argument('repeats', type=int, nargs='?', default=5, help="повторов каждого замера")
+    args = parser.parse_args()
+    products, repeats = args.products, args.repeats
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = make_database(directory, products)
+        db = DatabaseManager(path)
+        db.acquire()
+        limit = products
+
+        print(f"строк в выборке: {limit}, лучший из {repeats} запусков")
+        baseline = best_time(lambda: legacy_rows(db, limit), repeats)
+        print(f"  {'Row -> dict':12} {baseline * 1000:9.1f} мс")
+        for shape in ROW_SHAPES:
+            elapsed = best_time(lambda: db.execute_query(QUERY, (limit,), shape=shape), repeats)
+            print(f"  {shape:12} {elapsed * 1000:9.1f} мс  x{baseline / elapsed:.2f}")
+
+        count = 50000
+        print(f"\nкороткий запрос {count} раз:")
+        no_cache = statement_cache(path, 0, count)
+        cached = statement_cache(path, STATEMENT_CACHE_SIZE, count)
+        print(f"  без кэша запросов: {no_cache * 1000:9.1f} мс")
+        print(f"  кэш {STATEMENT_CACHE_SIZE}:          {cached * 1000:9.1f} мс  x{no_cache / cached:.2f}")
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
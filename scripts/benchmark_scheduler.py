@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк планировщика цехов на синтетических книгах заказов
+
+Использование:
+    python scripts/benchmark_scheduler.py [размер_книги ...]
+"""
+import random
+import sys
+import time
+
+from production_scheduler import ProductionScheduler, STAGE_ORDER
+
+
+def make_scheduler(products, workshops_count, rng):
+    """Синтетические цеха и маршруты"""
+    stages = list(STAGE_ORDER)
+    workshops = {
+        workshop_id: {
+            'workshop_name': f'Цех {workshop_id}',
+            'workshop_type': stages[workshop_id % len(stages)],
+            'staff_count': rng.randint(2, 8),
+            'is_active': 1,
+        }
+        for workshop_id in range(1, workshops_count + 1)
+    }
+
+    routings = {}
+    for product_id in range(1, products + 1):
+        route = rng.sample(sorted(workshops), rng.randint(3, min(8, workshops_count)))
+        route.sort(key=lambda w: (STAGE_ORDER[workshops[w]['workshop_type']], w))
+        routings[product_id] = [(w, round(rng.uniform(0.3, 3.0), 1)) for w in route]
+
+    return ProductionScheduler(routings, workshops)
+
+
+def main():
+    """Запуск бенчмарка"""
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]
+
+    rng = random.Random(42)
+    scheduler = make_scheduler(products=1000, workshops_count=12, rng=rng)
+
+    print(f"{'заказов':>10} {'операций':>10} {'время, мс':>10} {'операций/с':>12} {'makespan, ч':>12}")
+    for size in sizes:
+        orders = [
+            {'product_id': rng.randint(1, 1000), 'quantity': rng.randint(1, 20)}
+            for _ in range(size)
+        ]
+        operations = sum(len(scheduler.routings[o['product_id']]) for o in orders)
+
+        start = time.perf_counter()
+        result = scheduler.schedule(orders, details=False)
+        elapsed = time.perf_counter() - start
+
+        print(f"{size:>10} {operations:>10} {elapsed * 1000:>10.1f} "
+              f"{operations / elapsed:>12.0f} {result['makespan_hours']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Копия каталога в памяти процесса (реплика для чтения)
+
+Продукция с названиями типа и материала загружается из БД и хранится
+компактными записями (__slots__) с индексами по id, артикулу и типу
+продукции. Позиция по id (get_product), список продукции (get_products),
+топ по цене и счетчики отдаются из памяти без запросов к БД; страницы
+каталога с сортировкой и фильтрами (get_products_listing) идут в БД. Справочники (типы, материалы,
+цеха) хранятся в кэше справочников менеджера (get_lookup).
+
+Реплика обновляется сквозной записью: методы менеджера, меняющие
+продукцию (add_product, update_product, delete_product,
+apply_product_batch), сообщают измененные позиции, и реплика перечитывает
+только их. Любая другая запись, в том числе из другого процесса, помечает
+реплику устаревшей: при следующем чтении она загружается заново. Запись
+в таблицы вне каталога (счетчики, агрегаты) реплику не трогает.
+verify() сверяет реплику с БД.
+
+Подключение: db.use_catalog(CatalogReplica(db)) или replica = yes
+в разделе [catalog] config.ini (open_database).
+"""
+import threading
+import time
+
+if __package__:
+    from .db_base import PRODUCT_COLUMNS
+else:
+    from db_base import PRODUCT_COLUMNS
+
+# Поля записи продукции (как у get_product)
+PRODUCT_FIELDS = ('product_id', 'product_name', 'article_number', 'product_type_id',
+                  'product_type_name', 'material_type_id', 'material_type_name',
+                  'min_partner_price', 'dimensions', 'weight', 'description', 'is_available')
+
+PRODUCTS_QUERY = """
+    SELECT
+        p.product_id,
+        p.product_name,
+        p.article_number,
+        p.product_type_id,
+        pt.product_type_name,
+        p.material_type_id,
+        mt.material_type_name,
+        p.min_partner_price,
+        p.dimensions,
+        p.weight,
+        p.description,
+        p.is_available
+    FROM Products p
+    LEFT JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+    LEFT JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+"""
+
+# Сколько id/артикулов перечитывать одним запросом
+REFRESH_CHUNK = 500
+
+
+class ProductRecord:
+    """Позиция продукции в реплике"""
+
+    __slots__ = PRODUCT_FIELDS
+
+    def __init__(self, row):
+        """Запись из строки PRODUCTS_QUERY"""
+        for name, value in zip(PRODUCT_FIELDS, row):
+            setattr(self, name, value)
+
+    def values(self):
+        """Значения полей кортежем (в порядке PRODUCT_FIELDS)"""
+        return tuple(getattr(self, name) for name in PRODUCT_FIELDS)
+
+    def as_dict(self, fields=PRODUCT_FIELDS):
+        """Словарь выбранных полей"""
+        return {name: getattr(self, name) for name in fields}
+
+    @property
+    def listed(self):
+        """Попадает ли позиция в get_products (там тип и материал через JOIN)"""
+        return self.product_type_name is not None and self.material_type_name is not None
+
+
+class CatalogReplica:
+    """Реплика каталога для чтения из памяти"""
+
+    def __init__(self, db, load=True):
+        """Инициализация поверх менеджера БД (load=False - загрузка при первом чтении)"""
+        self.db = db
+        self._lock = threading.RLock()
+        self._stale = True
+
+        self.by_id = {}          # product_id -> ProductRecord
+        self.by_article = {}     # article_number -> ProductRecord
+        self.by_type = {}        # product_type_id -> {product_id: ProductRecord}
+        self._ordered = None     # записи в порядке (product_name, product_id)
+        self._by_price = None    # записи по убыванию цены (без цены - в конце)
+
+        self.loaded_at = None
+        self.loads = 0
+        self.refreshes = 0
+        if load:
+            self.load()
+
+    def load(self):
+        """Полная загрузка из БД; False, если запрос не удался"""
+        with self._lock:
+            # Флаг снимается до чтения: запись во время загрузки снова пометит реплику
+            self._stale = False
+            rows = self.db.execute_query(PRODUCTS_QUERY, shape='tuple')
+            if rows is None:
+                self._stale = True
+                return False
+
+            # Индексы строятся заново и подменяются целиком: чтение без
+            # блокировки (get, count) не видит наполовину загруженных
+            by_id, by_article, by_type = {}, {}, {}
+            for row in rows:
+                record = ProductRecord(row)
+                by_id[record.product_id] = record
+                if record.article_number is not None:
+                    by_article[record.article_number] = record
+                by_type.setdefault(record.product_type_id, {})[record.product_id] = record
+            self.by_id, self.by_article, self.by_type = by_id, by_article, by_type
+            self._ordered = self._by_price = None
+            self.loaded_at = time.time()
+            self.loads += 1
+            return True
+
+    def invalidate(self):
+        """Пометить реплику устаревшей (перезагрузится при следующем чтении)"""
+        self._stale = True
+
+    def refresh(self, product_ids=(), articles=()):
+        """Перечитать из БД только указанные позиции (сквозная запись)
+
+        Позиции, которых больше нет в БД, удаляются из реплики. Чтение идет
+        под блокировкой реплики, поэтому обновления применяются в порядке
+        чтения и более старые данные не перетирают новые.
+        """
+        with self._lock:
+            if self._stale:
+                return
+            product_ids = list(dict.fromkeys(product_ids))
+            articles = list(dict.fromkeys(a for a in articles if a is not None))
+
+            found = {}
+            for column, keys in (('p.product_id', product_ids), ('p.article_number', articles)):
+                for start in range(0, len(keys), REFRESH_CHUNK):
+                    chunk = keys[start:start + REFRESH_CHUNK]
+                    rows = self.db.execute_query(
+                        self.db.sql(PRODUCTS_QUERY + f" WHERE {column} IN ({', '.join('?' * len(chunk))})"),
+                        tuple(chunk), shape='tuple'
+                    )
+                    if rows is None:
+                        self._stale = True
+                        return
+                    for row in rows:
+                        found[row[0]] = row
+
+            for product_id in product_ids:
+                if product_id not in found:
+                    self._remove(product_id)
+            for article in articles:
+                record = self.by_article.get(article)
+                if record is not None and record.product_id not in found:
+                    self._remove(record.product_id)
+            for row in found.values():
+                self._put(ProductRecord(row))
+            self._ordered = self._by_price = None
+            self.refreshes += 1
+
+    def ready(self):
+        """Актуальна ли реплика (при необходимости перезагружается)
+
+        Версия данных менеджера запрашивается заранее: так замечаются записи
+        других процессов, которые помечают реплику устаревшей.
+        """
+        self.db.data_state()
+        if self._stale:
+            return self.load()
+        return True
+
+    def _put(self, record):
+        """Добавить или заменить запись с обновлением индексов"""
+        old = self.by_id.get(record.product_id)
+        if old is not None:
+            self._unindex(old)
+        self.by_id[record.product_id] = record
+        if record.article_number is not None:
+            self.by_article[record.article_number] = record
+        self.by_type.setdefault(record.product_type_id, {})[record.product_id] = record
+
+    def _remove(self, product_id):
+        """Удалить запись и ее ключи из индексов"""
+        record = self.by_id.pop(product_id, None)
+        if record is not None:
+            self._unindex(record)
+
+    def _unindex(self, record):
+        """Убрать запись из индексов по артикулу и типу"""
+        if self.by_article.get(record.article_number) is record:
+            del self.by_article[record.article_number]
+        same_type = self.by_type.get(record.product_type_id)
+        if same_type is not None:
+            same_type.pop(record.product_id, None)
+            if not same_type:
+                del self.by_type[record.product_type_id]
+
+    def _sorted(self):
+        """Записи get_products в порядке (product_name, product_id)"""
+        ordered = self._ordered
+        if ordered is None:
+            with self._lock:
+                ordered = self._ordered = sorted(
+                    (r for r in self.by_id.values() if r.listed),
+                    key=lambda r: (r.product_name, r.product_id)
+                )
+        return ordered
+
+    def _price_sorted(self):
+        """Все записи по убыванию цены (строится при первом топе после изменения)"""
+        by_price = self._by_price
+        if by_price is None:
+            with self._lock:
+                by_price = self._by_price = sorted(
+                    self.by_id.values(),
+                    key=lambda r: (r.min_partner_price is not None, r.min_partner_price or 0),
+                    reverse=True
+                )
+        return by_price
+
+    def get(self, product_id):
+        """Позиция по id (поля get_product) или None"""
+        record = self.by_id.get(product_id)
+        return record.as_dict() if record is not None else None
+
+    def products(self, limit=None):
+        """Список продукции как get_products"""
+        ordered = self._sorted()
+        if limit:
+            ordered = ordered[:int(limit)]
+        return [record.as_dict(PRODUCT_COLUMNS) for record in ordered]
+
+    def top_expensive(self, limit=10):
+        """Самые дорогие позиции как get_top_expensive_products (без цены - в конце)"""
+        records = self._price_sorted()[:limit]
+        return [{'product_name': r.product_name, 'min_partner_price': r.min_partner_price}
+                for r in records]
+
+    def count(self, product_type_id=None):
+        """Количество продукции (всего или заданного типа)"""
+        if product_type_id is None:
+            return len(self.by_id)
+        return len(self.by_type.get(product_type_id, ()))
+
+    def stats(self):
+        """Состояние реплики"""
+        return {
+            'products': len(self.by_id),
+            'stale': self._stale,
+            'loaded_at': self.loaded_at,
+            'loads': self.loads,
+            'refreshes': self.refreshes,
+        }
+
+    def verify(self):
+        """Сверить реплику с БД
+
+        Возвращает словарь расхождений: missing - id, которых нет в реплике,
+        extra - id, которых нет в БД, changed - id с отличающимися полями.
+        Пустой словарь - реплика совпадает.
+        Запись, идущая во время сверки, может дать ложное расхождение.
+        """
+        # Сверяется то, что реплика отдала бы сейчас (устаревшая перезагружается)
+        self.ready()
+        with self._lock:
+            rows = self.db.execute_query(PRODUCTS_QUERY, shape='tuple')
+            if rows is None:
+                raise RuntimeError("Не удалось прочитать продукцию для сверки")
+            actual = {row[0]: tuple(row) for row in rows}
+
+            problems = {
+                'missing': sorted(set(actual) - set(self.by_id)),
+                'extra': sorted(set(self.by_id) - set(actual)),
+                'changed': sorted(product_id for product_id, record in self.by_id.items()
+                                  if product_id in actual and record.values() != actual[product_id]),
+            }
+            # Индексы должны соответствовать основному словарю
+            if any(self.by_article.get(r.article_number) is not r
+                   for r in self.by_id.values() if r.article_number is not None) \
+                    or sum(map(len, self.by_type.values())) != len(self.by_id):
+                problems['indexes'] = ['индексы не соответствуют записям']
+        return {key: value for key, value in problems.items() if value}
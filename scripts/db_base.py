@@ -0,0 +1,978 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Общая часть менеджеров БД (SQLite и MySQL)
+
+Здесь собрано то, что не зависит от СУБД: пул соединений, закрепление
+соединения за потоком на время запроса, постраничная выборка продукции,
+версия данных, расчеты производства и экспорт. Общие запросы записаны с
+плейсхолдером '?' и передаются в execute_query/iter_query через sql(),
+который переводит их в формат драйвера ('%s' у MySQL); собственные запросы
+менеджеров пишутся сразу в формате своего драйвера.
+Конкретный менеджер реализует execute_query и iter_query.
+"""
+import re
+import sys
+import threading
+import queue
+import time
+import json
+import base64
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Формы результата execute_query(shape=...):
+#   dict       - список словарей (по умолчанию);
+#   tuple      - список кортежей, без копирования строк;
+#   namedtuple - именованные кортежи (класс кэшируется по набору столбцов);
+#   columns    - словарь {столбец: список значений};
+#   row        - sqlite3.Row, ленивый доступ по имени и индексу (только SQLite)
+ROW_SHAPES = ('dict', 'tuple', 'namedtuple', 'columns', 'row')
+
+# Столбцы выборки продукции (get_products_page, iter_products, get_products_listing)
+PRODUCT_COLUMNS = ('product_id', 'product_name', 'article_number', 'product_type_name',
+                   'material_type_name', 'min_partner_price', 'is_available')
+
+# Поля цеха маршрута в строках запроса get_product_details
+ROUTE_FIELDS = ('workshop_id', 'workshop_name', 'workshop_type', 'staff_count',
+                'production_time_hours', 'priority')
+
+# Справочники, которые менеджер кэширует (get_lookup):
+# имя -> (таблица, столбец id, столбец названия, запрос строк)
+LOOKUP_TABLES = {
+    'product_types': ('Product_types', 'product_type_id', 'product_type_name',
+                      "SELECT * FROM Product_types ORDER BY product_type_name"),
+    'material_types': ('Material_types', 'material_type_id', 'material_type_name',
+                       "SELECT * FROM Material_types ORDER BY material_type_name"),
+    'workshops': ('Workshops', 'workshop_id', 'workshop_name', """
+        SELECT 
+            workshop_id,
+            workshop_name,
+            workshop_type,
+            staff_count,
+            is_active
+        FROM Workshops
+        ORDER BY workshop_type, workshop_name
+    """),
+}
+
+# Таблицы справочников и каталога (в нижнем регистре): запись в другие
+# таблицы не сбрасывает кэш справочников и реплику каталога
+LOOKUP_TABLE_NAMES = frozenset(table.lower() for table, *_ in LOOKUP_TABLES.values())
+CATALOG_TABLES = LOOKUP_TABLE_NAMES | {'products'}
+
+# Таблица, которую меняет INSERT/REPLACE/UPDATE/DELETE
+_WRITE_TARGET = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)'
+    r'\s+[`"\[]?(\w+)',
+    re.IGNORECASE
+)
+
+
+def written_tables(query):
+    """Таблицы, которые меняет запрос (в нижнем регистре), или None, если не определить"""
+    match = _WRITE_TARGET.match(query)
+    return frozenset({match.group(1).lower()}) if match else None
+
+
+class Lookup:
+    """Справочник: строки и словари id -> название и название -> id
+
+    rows - строки (словари или кортежи), id_key и name_key - ключи id и
+    названия в строке. При повторяющихся названиях берется меньший id.
+    version - версия кэша справочников, из которой получен справочник.
+    """
+    
+    __slots__ = ('rows', 'names', 'ids', 'version')
+    
+    def __init__(self, rows, id_key, name_key, version=None):
+        """Построить словари по строкам"""
+        self.rows = rows
+        self.names = {row[id_key]: row[name_key] for row in rows}
+        self.ids = {}
+        for id_, name in sorted(self.names.items(), reverse=True):
+            self.ids[name] = id_
+        self.version = version
+    
+    def name(self, id_, default=None):
+        """Название по id"""
+        return self.names.get(id_, default)
+    
+    def id(self, name, default=None):
+        """id по названию"""
+        return self.ids.get(name, default)
+
+
+def encode_cursor(value, product_id):
+    """Закодировать курсор постраничной выборки (значение колонки сортировки, product_id)"""
+    raw = json.dumps([value, product_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Раскодировать курсор постраничной выборки"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, product_id = json.loads(raw.decode('utf-8'))
+        if not isinstance(value, (str, int, float, type(None))):
+            raise TypeError(value)
+        return value, int(product_id)
+    except (ValueError, TypeError):
+        raise ValueError(f"Некорректный курсор: {token}")
+
+
+def keyset_segments(column, value, product_id, forward):
+    """Условия keyset-пагинации по (column, product_id) с учетом NULL
+
+    forward=True - строки после курсора при обходе по возрастанию,
+    forward=False - по убыванию. NULL в SQLite и MySQL меньше любых значений, поэтому
+    продолжение страницы может состоять из двух диапазонов (например, остаток
+    значений и затем все NULL). Возвращает список (условие, параметры) в порядке
+    обхода; каждое условие - один диапазон индекса, без OR.
+    """
+    if column == 'p.product_id':
+        return [(f"p.product_id {'>' if forward else '<'} ?", [product_id])]
+    if value is None:
+        if forward:
+            return [(f"{column} IS NULL AND p.product_id > ?", [product_id]),
+                    (f"{column} IS NOT NULL", [])]
+        return [(f"{column} IS NULL AND p.product_id < ?", [product_id])]
+    if forward:
+        return [(f"({column}, p.product_id) > (?, ?)", [value, product_id])]
+    return [(f"({column}, p.product_id) < (?, ?)", [value, product_id]),
+            (f"{column} IS NULL", [])]
+
+
+@lru_cache(maxsize=256)
+def _row_type(columns):
+    """Класс именованного кортежа для набора столбцов"""
+    return namedtuple('Row', columns, rename=True)
+
+
+def shape_rows(columns, rows, shape):
+    """Привести строки-кортежи к форме shape (см. ROW_SHAPES)"""
+    if shape == 'tuple':
+        return rows
+    if shape == 'dict':
+        return [dict(zip(columns, row)) for row in rows]
+    if shape == 'namedtuple':
+        return list(map(_row_type(tuple(columns))._make, rows))
+    if shape == 'columns':
+        if not rows:
+            return {name: [] for name in columns}
+        return {name: list(values) for name, values in zip(columns, zip(*rows))}
+    raise ValueError(f"Неизвестная форма результата: {shape}")
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Ограниченный потокобезопасный пул соединений
+
+    connect - функция, открывающая новое соединение. Соединения создаются по
+    требованию, но не больше size; свободные хранятся в LIFO-очереди, чтобы
+    чаще переиспользовались недавно работавшие (с прогретым кэшем запросов).
+    Если все соединения заняты, acquire ждет до timeout секунд.
+    """
+
+    def __init__(self, connect, size=5, timeout=30.0):
+        """Инициализация пула"""
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        # Статистика ожидания соединений
+        self.acquire_count = 0
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+        # Функция, получающая время каждого ожидания соединения (метрики)
+        self.on_acquire = None
+
+    def acquire(self):
+        """Взять соединение для чтения из пула"""
+        start = time.perf_counter()
+        waited = False
+
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    try:
+                        connection = self._connect()
+                    except Exception:
+                        self._created -= 1
+                        raise
+
+            if connection is None:
+                waited = True
+                try:
+                    connection = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeoutError(
+                        f"Нет свободных соединений в пуле за {self.timeout} с"
+                    )
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.acquire_count += 1
+            if waited:
+                self.wait_count += 1
+            self.wait_time_total += elapsed
+            self.wait_time_max = max(self.wait_time_max, elapsed)
+        if self.on_acquire is not None:
+            self.on_acquire(elapsed)
+
+        return connection
+
+    def release(self, connection):
+        """Вернуть соединение в пул"""
+        if connection.in_transaction:
+            connection.rollback()
+        self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """Соединение для чтения на время блока with"""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def stats(self):
+        """Статистика пула"""
+        with self._lock:
+            avg_wait = self.wait_time_total / self.acquire_count if self.acquire_count else 0.0
+            return {
+                'size': self.size,
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'in_use': self._created - self._idle.qsize(),
+                'acquire_count': self.acquire_count,
+                'wait_count': self.wait_count,
+                'avg_wait_ms': round(avg_wait * 1000, 3),
+                'max_wait_ms': round(self.wait_time_max * 1000, 3),
+            }
+
+    def close(self):
+        """Закрыть свободные соединения"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class BaseDatabaseManager:
+    """Общие методы менеджеров БД"""
+    
+    # Максимальный размер страницы при постраничной выборке
+    PAGE_LIMIT_MAX = 1000
+    
+    # Колонки сортировки страницы продукции: параметр -> колонка Products
+    SORT_COLUMNS = {
+        'name': 'product_name',
+        'price': 'min_partner_price',
+        'article': 'article_number',
+        'id': 'product_id',
+    }
+    
+    # Поля Products, которые можно задавать в пакетных операциях
+    PRODUCT_FIELDS = ('product_name', 'article_number', 'product_type_id', 'material_type_id',
+                      'min_partner_price', 'is_available')
+    
+    # Максимальное число операций в одном пакете
+    BATCH_LIMIT = 10000
+    
+    # Класс ошибок драйвера БД (задается в менеджере конкретной СУБД)
+    DB_ERROR = Exception
+    
+    def __init__(self):
+        """Общее состояние: пул, закрепленные соединения, кэши и версия данных"""
+        self.pool = None
+        self._local = threading.local()
+        self._stats_cache = None
+        self._stats_cache_time = 0.0
+        self._calculator = None
+        self._scheduler = None
+        
+        # Версия данных: растет при каждой записи, по ней сбрасываются кэши
+        # (в том числе кэш ответов веб-приложения) и строится ETag
+        self._version_lock = threading.Lock()
+        self._instance_id = format(time.time_ns(), 'x')
+        self.data_version = 0
+        self.data_modified_at = time.time()
+        
+        # Реестр метрик (scripts/metrics.py), подключается через use_metrics
+        self.metrics = None
+        
+        # Реплика каталога в памяти (scripts/catalog.py), подключается через use_catalog
+        self.catalog = None
+        
+        # Кэш справочников (LOOKUP_TABLES): загружается один раз, сбрасывается
+        # только записью в таблицы справочников; версия растет при каждом сбросе
+        self._lookups = None
+        self.lookup_version = 0
+    
+    def execute_query(self, query, params=None, fetch=True, shape='dict'):
+        """Выполнение запроса: строки в форме shape при fetch=True, иначе True/False"""
+        raise NotImplementedError
+    
+    def iter_query(self, query, params=None, batch_size=1000):
+        """Потоковое чтение запроса: имена столбцов, затем списки кортежей"""
+        raise NotImplementedError
+    
+    def _writer(self):
+        """Контекстный менеджер соединения для записи"""
+        raise NotImplementedError
+    
+    def sql(self, query):
+        """Общий запрос с плейсхолдерами '?' в формате драйвера
+
+        Символ '?' в общих запросах - только плейсхолдер (не в строковых литералах).
+        """
+        return query
+    
+    def use_metrics(self, metrics):
+        """Передавать время запросов и ожидания соединений в реестр метрик"""
+        self.metrics = metrics
+        if self.pool is not None:
+            self.pool.on_acquire = metrics.observe_pool_wait if metrics else None
+    
+    def use_catalog(self, catalog):
+        """Отдавать чтение каталога из реплики в памяти (None - отключить)"""
+        self.catalog = catalog
+    
+    def _catalog_ready(self):
+        """Подключена ли реплика каталога и актуальна ли она"""
+        return self.catalog is not None and self.catalog.ready()
+    
+    @contextmanager
+    def _catalog_write(self, product_ids=(), articles=()):
+        """Запись, меняющая только указанные позиции продукции
+        
+        Записи внутри блока (в этом потоке) не сбрасывают реплику каталога
+        целиком: она перечитывает только эти позиции.
+        """
+        self._local.catalog_keys = (product_ids, articles)
+        try:
+            yield
+        finally:
+            self._local.catalog_keys = None
+    
+    def _observe_query(self, query, started, rows, error=False):
+        """Учесть выполненный запрос в метриках
+        
+        Ключ - имя метода, вызвавшего execute_query/iter_query (get_products,
+        search_products и т.д.), берется из стека вызовов.
+        """
+        if self.metrics is None:
+            return
+        try:
+            name = sys._getframe(2).f_code.co_name
+        except ValueError:
+            name = 'unknown'
+        self.metrics.observe_query(name, time.perf_counter() - started, rows, query, error)
+    
+    def acquire(self):
+        """Закрепить соединение из пула за текущим потоком (на время запроса)"""
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = self.pool.acquire()
+        return self._local.connection
+    
+    def release(self):
+        """Вернуть закрепленное соединение в пул"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            self.pool.release(connection)
+    
+    @contextmanager
+    def _reader(self):
+        """Соединение для чтения: закрепленное за потоком или временное из пула"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            yield connection
+        else:
+            with self.pool.connection() as connection:
+                yield connection
+    
+    def _data_changed(self, tables=None):
+        """Отметить изменение данных: новая версия и сброс производных кэшей
+        
+        tables - измененные таблицы в нижнем регистре (None - неизвестно какие):
+        кэш справочников и реплика каталога сбрасываются, только если
+        затронуты их таблицы.
+        """
+        with self._version_lock:
+            self.data_version += 1
+            self.data_modified_at = time.time()
+            if tables is None or not LOOKUP_TABLE_NAMES.isdisjoint(tables):
+                self._lookups = None
+                self.lookup_version += 1
+        self._stats_cache = None
+        self._calculator = None
+        self._scheduler = None
+        
+        if self.catalog is not None:
+            keys = getattr(self._local, 'catalog_keys', None)
+            if keys is not None:
+                self.catalog.refresh(*keys)
+            elif tables is None or not CATALOG_TABLES.isdisjoint(tables):
+                self.catalog.invalidate()
+    
+    def get_lookup(self, name):
+        """Справочник из кэша (Lookup): product_types, material_types или workshops
+        
+        Все справочники загружаются одним обращением и живут до записи в их
+        таблицы. Если запрос не удался, возвращается пустой справочник и
+        кэш не заполняется.
+        """
+        # Проверка версии замечает записи других процессов
+        self.data_state()
+        lookups = self._lookups
+        if lookups is None:
+            with self._version_lock:
+                version = self.lookup_version
+            loaded = {}
+            for key, (_, id_column, name_column, query) in LOOKUP_TABLES.items():
+                rows = self.execute_query(query)
+                if rows is None:
+                    return Lookup([], *LOOKUP_TABLES[name][1:3])
+                loaded[key] = Lookup(rows, id_column, name_column, version)
+            lookups = loaded
+            with self._version_lock:
+                # Запись во время загрузки: прочитанное могло устареть, не кэшируем
+                if self.lookup_version == version:
+                    self._lookups = lookups
+        return lookups[name]
+    
+    def get_product_types(self):
+        """Получить типы продукции"""
+        return [dict(row) for row in self.get_lookup('product_types').rows]
+    
+    def get_material_types(self):
+        """Получить типы материалов"""
+        return [dict(row) for row in self.get_lookup('material_types').rows]
+    
+    def get_workshops(self):
+        """Получить список цехов"""
+        return [dict(row) for row in self.get_lookup('workshops').rows]
+    
+    def data_state(self):
+        """Тег текущей версии данных (уникален для экземпляра менеджера) и время изменения"""
+        with self._version_lock:
+            return f"{self._instance_id}-{self.data_version}", self.data_modified_at
+    
+    def get_pool_stats(self):
+        """Статистика пула соединений"""
+        return self.pool.stats()
+    
+    def _products_after_query(self, after):
+        """Запрос продукции в порядке (product_name, product_id) после курсора"""
+        query = """
+            SELECT 
+                p.product_id,
+                p.product_name,
+                p.article_number,
+                pt.product_type_name,
+                mt.material_type_name,
+                p.min_partner_price,
+                p.is_available
+            FROM Products p
+            JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+        """
+        params = []
+        if after:
+            query += " WHERE (p.product_name, p.product_id) > (?, ?)"
+            params.extend(decode_cursor(after))
+        query += " ORDER BY p.product_name, p.product_id"
+        return query, params
+    
+    def get_products_page(self, limit=100, after=None, shape='dict'):
+        """Страница продукции (keyset-пагинация по product_name, product_id)
+
+        Возвращает словарь {'items': [...], 'next': курсор или None}.
+        shape='tuple' - строки кортежами в порядке PRODUCT_COLUMNS, без
+        словаря на каждую строку; имена столбцов добавляются в 'columns'.
+        """
+        if shape not in ('dict', 'tuple'):
+            raise ValueError(f"Неизвестная форма результата: {shape}")
+        
+        limit = max(1, min(int(limit), self.PAGE_LIMIT_MAX))
+        query, params = self._products_after_query(after)
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        query += " LIMIT ?"
+        params.append(limit + 1)
+        
+        rows = self.execute_query(self.sql(query), tuple(params), shape=shape)
+        if rows is None:
+            return None
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            if shape == 'tuple':
+                next_cursor = encode_cursor(last[1], last[0])
+            else:
+                next_cursor = encode_cursor(last['product_name'], last['product_id'])
+        
+        if shape == 'tuple':
+            return {'columns': list(PRODUCT_COLUMNS), 'items': rows, 'next': next_cursor}
+        return {'items': rows, 'next': next_cursor}
+    
+    def iter_products(self, after=None, batch_size=500):
+        """Потоково перебрать продукцию, не загружая всю таблицу в память"""
+        query, params = self._products_after_query(after)
+        
+        rows = self.iter_query(self.sql(query), params, batch_size)
+        columns = next(rows)
+        for batch in rows:
+            for row in batch:
+                yield dict(zip(columns, row))
+    
+    def get_products_listing(self, sort='name', order='asc', product_type_id=None,
+                             material_type_id=None, is_available=None, limit=50,
+                             after=None, before=None):
+        """Страница каталога с сортировкой, фильтрами и keyset-пагинацией
+
+        after/before - курсоры следующей и предыдущей страницы. Возвращает
+        словарь {'items', 'next', 'prev', 'total'}; total считается только без
+        фильтров или с фильтром по типу (см. _count_products), иначе None.
+        Фильтры записаны с унарным плюсом: СУБД идет по индексу колонки
+        сортировки и останавливается на LIMIT, вместо сортировки всех подходящих строк.
+        """
+        key = self.SORT_COLUMNS.get(sort, 'product_name')
+        column = f"p.{key}"
+        descending = order == 'desc'
+        limit = max(1, min(int(limit), self.PAGE_LIMIT_MAX))
+        
+        where = []
+        params = []
+        if product_type_id is not None:
+            where.append("+p.product_type_id = ?")
+            params.append(product_type_id)
+        if material_type_id is not None:
+            where.append("+p.material_type_id = ?")
+            params.append(material_type_id)
+        if is_available is not None:
+            where.append("+p.is_available = ?")
+            params.append(is_available)
+        
+        # Для предыдущей страницы идем от курсора в обратную сторону и переворачиваем результат
+        backward = before is not None and after is None
+        scan_descending = descending != backward
+        cursor = after if after is not None else before
+        if cursor is not None:
+            value, product_id = decode_cursor(cursor)
+            segments = keyset_segments(column, value, product_id, not scan_descending)
+        else:
+            segments = [(None, [])]
+        
+        direction = 'DESC' if scan_descending else 'ASC'
+        base_query = """
+            SELECT 
+                p.product_id,
+                p.product_name,
+                p.article_number,
+                pt.product_type_name,
+                mt.material_type_name,
+                p.min_partner_price,
+                p.is_available
+            FROM Products p
+            JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+        """
+        if key == 'product_id':
+            order_by = f" ORDER BY p.product_id {direction} LIMIT ?"
+        else:
+            order_by = f" ORDER BY {column} {direction}, p.product_id {direction} LIMIT ?"
+        
+        # Берем на одну строку больше, чтобы узнать, есть ли еще страница
+        rows = []
+        for condition, condition_params in segments:
+            conditions = where + ([condition] if condition else [])
+            query = base_query
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += order_by
+            
+            segment_rows = self.execute_query(
+                self.sql(query), tuple(params + condition_params + [limit + 1 - len(rows)])
+            )
+            if segment_rows is None:
+                return None
+            rows.extend(segment_rows)
+            if len(rows) > limit:
+                break
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        
+        next_cursor = prev_cursor = None
+        if rows:
+            first = encode_cursor(rows[0][key], rows[0]['product_id'])
+            last = encode_cursor(rows[-1][key], rows[-1]['product_id'])
+            if backward:
+                prev_cursor = first if has_more else None
+                next_cursor = last
+            else:
+                next_cursor = last if has_more else None
+                prev_cursor = first if cursor is not None else None
+        
+        total = None
+        if material_type_id is None and is_available is None:
+            total = self._count_products(product_type_id)
+        
+        return {'items': rows, 'next': next_cursor, 'prev': prev_cursor, 'total': total}
+    
+    def get_product(self, product_id):
+        """Продукция по id с названиями типа и материала (None, если ее нет)"""
+        if self._catalog_ready():
+            return self.catalog.get(product_id)
+        rows = self.execute_query(self.sql("""
+            SELECT
+                p.product_id,
+                p.product_name,
+                p.article_number,
+                p.product_type_id,
+                pt.product_type_name,
+                p.material_type_id,
+                mt.material_type_name,
+                p.min_partner_price,
+                p.dimensions,
+                p.weight,
+                p.description,
+                p.is_available
+            FROM Products p
+            LEFT JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            LEFT JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+            WHERE p.product_id = ?
+        """), (product_id,))
+        return rows[0] if rows else None
+    
+    @staticmethod
+    def _product_details(rows):
+        """Подробности продукции из строк запроса get_product_details (None, если строк нет)
+        
+        Строк по одной на цех маршрута, у продукции без маршрута - одна строка
+        с пустыми полями цеха. Цеха идут по приоритету, затем по названию.
+        """
+        if not rows:
+            return None
+        product = {key: value for key, value in rows[0].items() if key not in ROUTE_FIELDS}
+        route = [{key: row[key] for key in ROUTE_FIELDS} for row in rows if row['workshop_id'] is not None]
+        route.sort(key=lambda w: (w['priority'] is None, w['priority'] or 0, w['workshop_name'] or ''))
+        product['workshops'] = route
+        product['total_production_hours'] = sum(w['production_time_hours'] or 0 for w in route)
+        return product
+    
+    def _count_products(self, product_type_id=None):
+        """Количество продукции (всего или заданного типа) для страницы каталога"""
+        if self._catalog_ready():
+            return self.catalog.count(product_type_id)
+        if product_type_id is None:
+            result = self.execute_query("SELECT COUNT(*) as count FROM Products")
+        else:
+            result = self.execute_query(
+                self.sql("SELECT COUNT(*) as count FROM Products WHERE product_type_id = ?"),
+                (product_type_id,)
+            )
+        return result[0]['count'] if result else 0
+    
+    def _batch_statement(self, operation):
+        """Запрос и параметры одной операции пакета (ValueError при ошибке в описании)"""
+        if not isinstance(operation, dict):
+            raise ValueError("Операция должна быть объектом")
+        
+        op = operation.get('op')
+        unknown = set(operation) - set(self.PRODUCT_FIELDS) - {'op', 'product_id'}
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+        fields = [field for field in self.PRODUCT_FIELDS if field in operation]
+        values = tuple(operation[field] for field in fields)
+        
+        if op == 'add':
+            if 'product_name' not in operation:
+                raise ValueError("Для add нужно product_name")
+            placeholders = ', '.join('?' * len(fields))
+            return f"INSERT INTO Products ({', '.join(fields)}) VALUES ({placeholders})", values
+        
+        if op in ('update', 'delete'):
+            product_id = operation.get('product_id')
+            if product_id is None:
+                raise ValueError(f"Для {op} нужен product_id")
+            # "3" и 3 - одна позиция: реплика каталога ищет позиции по целому ключу
+            if isinstance(product_id, bool) or (isinstance(product_id, float) and not product_id.is_integer()):
+                raise ValueError(f"product_id должен быть целым числом: {product_id!r}")
+            try:
+                product_id = int(product_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"product_id должен быть целым числом: {product_id!r}") from None
+            if op == 'delete':
+                return "DELETE FROM Products WHERE product_id = ?", (product_id,)
+            if not fields:
+                raise ValueError("Для update нужно хотя бы одно поле")
+            assignments = ', '.join(f"{field} = ?" for field in fields)
+            return (f"UPDATE Products SET {assignments} WHERE product_id = ?",
+                    values + (product_id,))
+        
+        raise ValueError(f"Неизвестная операция: {op}")
+    
+    def apply_product_batch(self, operations, atomic=True):
+        """Пакет изменений продукции в одной транзакции
+
+        operations - список словарей {'op': 'add' | 'update' | 'delete', ...}:
+        для add - поля PRODUCT_FIELDS (product_name обязательно), для update -
+        product_id и изменяемые поля, для delete - product_id. Подряд идущие
+        операции с одинаковым запросом выполняются одним executemany под
+        точкой сохранения; если группа падает, она повторяется построчно, каждая
+        строка под своей точкой сохранения, чтобы найти ошибочные.
+        atomic=True - при первой ошибке откатывается весь пакет, atomic=False -
+        сохраняется все, что прошло. update и delete несуществующего product_id -
+        ошибка со статусом not_found. Возвращает {'committed', 'applied',
+        'failed', 'items'}; статус элемента: ok, error, not_found, rolled_back
+        или skipped.
+        """
+        items = []
+        groups = []
+        for index, operation in enumerate(operations):
+            item = {'index': index,
+                    'op': operation.get('op') if isinstance(operation, dict) else None,
+                    'status': 'skipped'}
+            items.append(item)
+            try:
+                query, params = self._batch_statement(operation)
+            except ValueError as e:
+                item['status'] = 'error'
+                item['error'] = str(e)
+                continue
+            if groups and groups[-1][0] == query:
+                groups[-1][1].append((index, params))
+            else:
+                groups.append((query, [(index, params)]))
+        
+        failed = any(item['status'] == 'error' for item in items)
+        if failed and atomic:
+            return self._batch_result(items, committed=False)
+        
+        with self._writer() as connection:
+            cursor = connection.cursor()
+            if not connection.in_transaction:
+                cursor.execute("BEGIN")
+            
+            for query, rows in groups:
+                # update и delete должны затронуть по строке на операцию
+                by_key = not query.startswith('INSERT')
+                query = self.sql(query)
+                try:
+                    cursor.execute("SAVEPOINT batch_group")
+                    cursor.executemany(query, [params for _, params in rows])
+                    complete = not by_key or cursor.rowcount == len(rows)
+                    if not complete:
+                        cursor.execute("ROLLBACK TO batch_group")
+                    cursor.execute("RELEASE batch_group")
+                except self.DB_ERROR:
+                    cursor.execute("ROLLBACK TO batch_group")
+                    cursor.execute("RELEASE batch_group")
+                else:
+                    if complete:
+                        for index, _ in rows:
+                            items[index]['status'] = 'ok'
+                        continue
+                
+                # Группа целиком не прошла или не нашла часть позиций: повторяем построчно
+                for index, params in rows:
+                    try:
+                        cursor.execute("SAVEPOINT batch_item")
+                        cursor.execute(query, params)
+                        found = not by_key or cursor.rowcount > 0
+                        cursor.execute("RELEASE batch_item")
+                        if not found:
+                            items[index]['status'] = 'not_found'
+                            items[index]['error'] = 'Продукция не найдена'
+                            failed = True
+                            if atomic:
+                                break
+                            continue
+                        items[index]['status'] = 'ok'
+                    except self.DB_ERROR as e:
+                        cursor.execute("ROLLBACK TO batch_item")
+                        cursor.execute("RELEASE batch_item")
+                        items[index]['status'] = 'error'
+                        items[index]['error'] = str(e)
+                        failed = True
+                        if atomic:
+                            break
+                if failed and atomic:
+                    break
+            
+            if failed and atomic:
+                connection.rollback()
+                for item in items:
+                    if item['status'] == 'ok':
+                        item['status'] = 'rolled_back'
+            else:
+                connection.commit()
+        
+        committed = not (failed and atomic)
+        applied = [operations[item['index']] for item in items if item['status'] == 'ok']
+        if committed and applied:
+            if all(op['op'] != 'add' or op.get('article_number') is not None for op in applied):
+                # product_id берется из параметров запроса (последний параметр update и delete)
+                product_ids = [params[-1] for query, rows in groups if not query.startswith('INSERT')
+                               for index, params in rows if items[index]['status'] == 'ok']
+                with self._catalog_write(product_ids,
+                                         [op['article_number'] for op in applied if op['op'] == 'add']):
+                    self._data_changed({'products'})
+            else:
+                # Новую позицию без артикула реплике не найти: перезагрузка целиком
+                self._data_changed({'products'})
+        return self._batch_result(items, committed)
+    
+    @staticmethod
+    def _batch_result(items, committed):
+        """Итог пакетной операции"""
+        return {
+            'committed': committed,
+            'applied': sum(1 for item in items if item['status'] == 'ok'),
+            'failed': sum(1 for item in items if item['status'] in ('error', 'not_found')),
+            'items': items,
+        }
+    
+    def get_production_calculator(self):
+        """Калькулятор сырья и времени производства
+
+        Коэффициенты загружаются из БД один раз и сбрасываются при записи через execute_query.
+        """
+        # Проверка версии замечает записи других процессов
+        self.data_state()
+        calculator = self._calculator
+        if calculator is None:
+            if __package__:
+                from .production_calculator import ProductionCalculator
+            else:
+                from production_calculator import ProductionCalculator
+            with self._version_lock:
+                version = self.data_version
+            calculator = ProductionCalculator.from_database(self)
+            with self._version_lock:
+                # Запись во время загрузки: прочитанное могло устареть, не кэшируем
+                if self.data_version == version:
+                    self._calculator = calculator
+        return calculator
+    
+    def calculate_material(self, product_type_id, material_type_id, quantity, param1, param2):
+        """Количество сырья для продукции заданного типа и материала (-1 при ошибке)"""
+        return self.get_production_calculator().calculate_material(
+            product_type_id, material_type_id, quantity, param1, param2
+        )
+    
+    def calculate_production(self, orders):
+        """Расчет сырья и часов производства для пакета заказов
+
+        orders - список словарей с ключами product_id, quantity, param1, param2.
+        Расчет выполняется векторно по всему пакету.
+        """
+        result = self.get_production_calculator().calculate_batch(
+            [order['product_id'] for order in orders],
+            [order['quantity'] for order in orders],
+            [order['param1'] for order in orders],
+            [order['param2'] for order in orders],
+        )
+        material = result['material_needed']
+        hours = result['production_hours']
+        
+        items = [
+            {
+                'product_id': order['product_id'],
+                'quantity': order['quantity'],
+                'material_needed': m,
+                'production_hours': h,
+            }
+            for order, m, h in zip(orders, material.tolist(), hours.tolist())
+        ]
+        return {
+            'items': items,
+            'total_material': int(material[material >= 0].sum()),
+            'total_production_hours': int(hours[hours >= 0].sum()),
+            'errors': int((material < 0).sum()),
+        }
+    
+    def get_production_scheduler(self):
+        """Планировщик загрузки цехов (маршруты кэшируются до ближайшей записи)"""
+        # Проверка версии замечает записи других процессов
+        self.data_state()
+        scheduler = self._scheduler
+        if scheduler is None:
+            if __package__:
+                from .production_scheduler import ProductionScheduler
+            else:
+                from production_scheduler import ProductionScheduler
+            with self._version_lock:
+                version = self.data_version
+            scheduler = ProductionScheduler.from_database(self)
+            with self._version_lock:
+                # Запись во время загрузки: прочитанное могло устареть, не кэшируем
+                if self.data_version == version:
+                    self._scheduler = scheduler
+        return scheduler
+    
+    def schedule_production(self, orders, details=True):
+        """Спланировать пакет заказов [{'product_id', 'quantity'}, ...] по активным цехам"""
+        return self.get_production_scheduler().schedule(orders, details=details)
+    
+    def export_table(self, table, fmt='csv', path=None, compress=False):
+        """Экспорт таблицы в файл CSV, XLSX или Parquet (см. exporter.EXPORT_QUERIES)"""
+        if __package__:
+            from .exporter import export_to_file
+        else:
+            from exporter import export_to_file
+        return export_to_file(self, table, fmt, path, compress)
+    
+    def export_all(self, directory='data', fmt='csv', compress=False, tables=None):
+        """Параллельный экспорт всех таблиц в каталог; возвращает {таблица: путь}"""
+        if __package__:
+            from .exporter import export_all
+        else:
+            from exporter import export_all
+        return export_all(self, directory, fmt, compress, tables)
+    
+    def export_products_to_csv(self, filename='data/products_export.csv'):
+        """Экспорт продукции в CSV"""
+        return self.export_table('products', 'csv', filename) is not None
+    
+    def export_workshops_to_csv(self, filename='data/workshops_export.csv'):
+        """Экспорт цехов в CSV"""
+        return self.export_table('workshops', 'csv', filename) is not None
+    
+    def export_all_to_csv(self):
+        """Экспорт всех данных"""
+        return self.export_all(tables=['products', 'workshops', 'products_workshops'])
+    
+    def close(self):
+        """Закрыть соединение"""
+        if self.pool:
+            self.release()
+            self.pool.close()
+            self.pool = None
+    
+    def __del__(self):
+        """Деструктор"""
+        self.close()
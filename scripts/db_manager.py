@@ -5,63 +5,132 @@
 """
 import mysql.connector
 from mysql.connector import Error
-import csv
-from pathlib import Path
-import os
+from mysql.connector.constants import ClientFlag
+import time
 
-class DatabaseManager:
+if __package__:
+    from .db_base import BaseDatabaseManager, ConnectionPool, shape_rows, written_tables
+else:
+    from db_base import BaseDatabaseManager, ConnectionPool, shape_rows, written_tables
+
+class DatabaseManager(BaseDatabaseManager):
     """Класс для управления БД"""
     
-    def __init__(self, host='localhost', user='root', password='', database='furniture_company'):
+    DB_ERROR = Error
+    
+    def __init__(self, host='localhost', user='root', password='', database='furniture_company',
+                 pool_size=5, pool_timeout=30.0):
         """Инициализация подключения"""
+        super().__init__()
         self.config = {
             'host': host,
             'user': user,
             'password': password,
             'database': database,
-            'charset': 'utf8mb4'
+            'charset': 'utf8mb4',
+            # rowcount у UPDATE - найденные строки, а не измененные (пакетные операции)
+            'client_flags': [ClientFlag.FOUND_ROWS]
         }
-        self.connection = None
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
         self.connect()
     
     def connect(self):
-        """Подключение к БД"""
+        """Подключение к БД (пул соединений, первое открывается сразу для проверки)"""
         try:
-            self.connection = mysql.connector.connect(**self.config)
-            if self.connection.is_connected():
-                return True
+            self.pool = self._create_pool(self.config)
+            return True
         except Error as e:
             print(f"Ошибка подключения к БД: {e}")
             # Пробуем без указания БД
             try:
                 config = self.config.copy()
                 del config['database']
-                self.connection = mysql.connector.connect(**config)
+                self.pool = self._create_pool(config)
                 return True
             except:
                 raise
-        return False
     
-    def execute_query(self, query, params=None, fetch=True):
-        """Выполнение запроса"""
+    def _create_pool(self, config):
+        """Пул соединений с заданными параметрами"""
+        pool = ConnectionPool(lambda: mysql.connector.connect(**config), self.pool_size, self.pool_timeout)
+        with pool.connection():
+            pass
+        return pool
+    
+    def sql(self, query):
+        """Плейсхолдеры общих запросов ('?') в формат mysql.connector ('%s')"""
+        return query.replace('?', '%s')
+    
+    def _writer(self):
+        """Соединение для записи: закрепленное за потоком или временное из пула"""
+        return self._reader()
+    
+    def execute_query(self, query, params=None, fetch=True, shape='dict'):
+        """Выполнение запроса (при fetch=True строки в форме shape, кроме 'row')"""
+        if shape == 'row':
+            raise ValueError("Форма row есть только у SQLite")
+        
+        started = time.perf_counter()
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                result = cursor.fetchall()
-                cursor.close()
-                return result
-            else:
-                self.connection.commit()
-                cursor.close()
-                return True
+            with self._reader() as connection:
+                cursor = connection.cursor(dictionary=(shape == 'dict'))
+                try:
+                    cursor.execute(query, params or ())
+                    if fetch:
+                        rows = cursor.fetchall()
+                        self._observe_query(query, started, len(rows))
+                        return rows if shape == 'dict' else shape_rows(cursor.column_names, rows, shape)
+                    connection.commit()
+                    self._observe_query(query, started, max(cursor.rowcount, 0))
+                except Error:
+                    if not fetch:
+                        connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            self._data_changed(written_tables(query))
+            return True
         except Error as e:
+            self._observe_query(query, started, 0, error=True)
             print(f"Ошибка выполнения запроса: {e}")
             return None if fetch else False
     
+    def iter_query(self, query, params=None, batch_size=1000):
+        """Потоковое чтение запроса порциями fetchmany
+
+        Первый элемент - список имен столбцов, дальше - списки кортежей
+        по batch_size строк. Запрос идет через отдельное соединение из пула
+        (не закрепленное за потоком) и небуферизованный курсор: строки не
+        копятся в памяти клиента, соединение запроса остается свободным, а
+        несколько выгрузок можно вести параллельно из разных потоков.
+        """
+        started = time.perf_counter()
+        count = 0
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(query, params or ())
+                yield list(cursor.column_names)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    count += len(rows)
+                    yield rows
+            finally:
+                # Потребитель мог остановиться раньше: непрочитанные строки
+                # сбрасываем, иначе соединение в пуле не примет следующий запрос
+                if connection.unread_result:
+                    connection.consume_results()
+                cursor.close()
+                # Время включает обработку порций потребителем
+                self._observe_query(query, started, count)
+    
     def get_products(self, limit=None):
         """Получить список продукции"""
+        if self._catalog_ready():
+            return self.catalog.products(limit)
         query = """
             SELECT 
                 p.product_id,
@@ -81,30 +150,6 @@ class DatabaseManager:
         
         return self.execute_query(query)
     
-    def get_product_types(self):
-        """Получить типы продукции"""
-        query = "SELECT * FROM Product_types ORDER BY product_type_name"
-        return self.execute_query(query)
-    
-    def get_material_types(self):
-        """Получить типы материалов"""
-        query = "SELECT * FROM Material_types ORDER BY material_type_name"
-        return self.execute_query(query)
-    
-    def get_workshops(self):
-        """Получить список цехов"""
-        query = """
-            SELECT 
-                workshop_id,
-                workshop_name,
-                workshop_type,
-                staff_count,
-                is_active
-            FROM Workshops
-            ORDER BY workshop_type, workshop_name
-        """
-        return self.execute_query(query)
-    
     def add_product(self, name, article, product_type_id, material_type_id, price):
         """Добавить продукцию"""
         query = """
@@ -112,7 +157,11 @@ class DatabaseManager:
             (product_name, article_number, product_type_id, material_type_id, min_partner_price)
             VALUES (%s, %s, %s, %s, %s)
         """
-        return self.execute_query(query, (name, article, product_type_id, material_type_id, price), fetch=False)
+        params = (name, article, product_type_id, material_type_id, price)
+        if article is None:
+            return self.execute_query(query, params, fetch=False)
+        with self._catalog_write(articles=(article,)):
+            return self.execute_query(query, params, fetch=False)
     
     def update_product(self, product_id, **kwargs):
         """Обновить продукцию"""
@@ -126,7 +175,74 @@ class DatabaseManager:
         values.append(product_id)
         query = f"UPDATE Products SET {', '.join(fields)} WHERE product_id = %s"
         
-        return self.execute_query(query, tuple(values), fetch=False)
+        with self._catalog_write(product_ids=(product_id,)):
+            return self.execute_query(query, tuple(values), fetch=False)
+    
+    def delete_product(self, product_id):
+        """Удалить продукцию"""
+        query = "DELETE FROM Products WHERE product_id = %s"
+        with self._catalog_write(product_ids=(product_id,)):
+            return self.execute_query(query, (product_id,), fetch=False)
+    
+    def search_products(self, search_term, limit=None):
+        """Поиск продукции по названию и артикулу"""
+        query = """
+            SELECT 
+                p.product_id,
+                p.product_name,
+                p.article_number,
+                pt.product_type_name,
+                mt.material_type_name,
+                p.min_partner_price,
+                p.is_available
+            FROM Products p
+            JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+            WHERE p.product_name LIKE %s OR p.article_number LIKE %s
+            ORDER BY p.product_name
+        """
+        search = f"%{search_term.strip()}%"
+        params = [search, search]
+        if limit:
+            query += " LIMIT %s"
+            params.append(int(limit))
+        return self.execute_query(query, tuple(params))
+    
+    def get_product_details(self, product_id):
+        """Продукция с типом, материалом и маршрутом по цехам (None, если ее нет)
+
+        Один запрос, как в менеджере SQLite.
+        """
+        query = """
+            SELECT
+                p.product_id,
+                p.product_name,
+                p.article_number,
+                p.product_type_id,
+                pt.product_type_name,
+                pt.type_coefficient,
+                p.material_type_id,
+                mt.material_type_name,
+                mt.waste_percentage,
+                p.min_partner_price,
+                p.dimensions,
+                p.weight,
+                p.description,
+                p.is_available,
+                pw.workshop_id,
+                w.workshop_name,
+                w.workshop_type,
+                w.staff_count,
+                pw.production_time_hours,
+                pw.priority
+            FROM Products p
+            LEFT JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            LEFT JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+            LEFT JOIN Product_workshops pw ON pw.product_id = p.product_id
+            LEFT JOIN Workshops w ON w.workshop_id = pw.workshop_id
+            WHERE p.product_id = %s
+        """
+        return self._product_details(self.execute_query(query, (product_id,)))
     
     def get_statistics(self):
         """Получить статистику БД"""
@@ -168,6 +284,8 @@ class DatabaseManager:
     
     def get_top_expensive_products(self, limit=10):
         """Топ самых дорогих товаров"""
+        if self._catalog_ready():
+            return self.catalog.top_expensive(limit)
         query = """
             SELECT 
                 product_name,
@@ -193,54 +311,10 @@ class DatabaseManager:
         """
         return self.execute_query(query)
     
-    def export_products_to_csv(self, filename='data/products_export.csv'):
-        """Экспорт продукции в CSV"""
-        products = self.get_products()
-        
-        if products:
-            Path(filename).parent.mkdir(exist_ok=True)
-            
-            with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.DictWriter(f, fieldnames=products[0].keys())
-                writer.writeheader()
-                writer.writerows(products)
-            
-            return True
-        return False
-    
-    def export_workshops_to_csv(self, filename='data/workshops_export.csv'):
-        """Экспорт цехов в CSV"""
-        workshops = self.get_workshops()
-        
-        if workshops:
-            Path(filename).parent.mkdir(exist_ok=True)
-            
-            with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.DictWriter(f, fieldnames=workshops[0].keys())
-                writer.writeheader()
-                writer.writerows(workshops)
-            
-            return True
-        return False
-    
-    def export_all_to_csv(self):
-        """Экспорт всех данных"""
-        self.export_products_to_csv()
-        self.export_workshops_to_csv()
-        
-        # Экспорт связей
-        data = self.get_products_with_workshops()
-        if data:
-            with open('data/products_workshops_export.csv', 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.DictWriter(f, fieldnames=data[0].keys())
-                writer.writeheader()
-                writer.writerows(data)
-    
-    def close(self):
-        """Закрыть соединение"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-    
-    def __del__(self):
-        """Деструктор"""
-        self.close()
+    def export_table(self, table, fmt='csv', path=None, compress=False):
+        """Экспорт таблицы в файл; ошибка MySQL печатается, возвращается None"""
+        try:
+            return super().export_table(table, fmt, path, compress)
+        except Error as e:
+            print(f"Ошибка экспорта {table}: {e}")
+            return None
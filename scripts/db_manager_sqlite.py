@@ -4,50 +4,645 @@
 Менеджер для работы с SQLite базой данных
 """
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-import csv
+import html
+import re
 
-class DatabaseManager:
+# PoolTimeoutError и функции курсоров остаются доступны и из этого модуля
+if __package__:
+    from .db_base import (BaseDatabaseManager, ConnectionPool as BaseConnectionPool,
+                          PoolTimeoutError, encode_cursor, decode_cursor, keyset_segments,
+                          ROW_SHAPES, shape_rows, written_tables)
+else:
+    from db_base import (BaseDatabaseManager, ConnectionPool as BaseConnectionPool,
+                         PoolTimeoutError, encode_cursor, decode_cursor, keyset_segments,
+                         ROW_SHAPES, shape_rows, written_tables)
+
+
+# Размер кэша подготовленных запросов на соединение (по умолчанию в sqlite3 - 128).
+# Страница каталога дает по запросу на сочетание сортировки, направления и
+# фильтров, поэтому запас нужен, чтобы горячие запросы не вытесняли друг друга
+STATEMENT_CACHE_SIZE = 512
+
+# Таблицы, по которым ведется статистика
+TABLES = ['Material_types', 'Product_types', 'Workshops', 'Products', 'Product_workshops']
+
+# Управляемый набор вторичных индексов: имя -> таблица(колонки)
+INDEXES = {
+    'idx_products_name': 'Products(product_name)',
+    'idx_products_price': 'Products(min_partner_price)',
+    'idx_products_type': 'Products(product_type_id)',
+    'idx_products_material': 'Products(material_type_id)',
+    'idx_product_workshops_workshop': 'Product_workshops(workshop_id)',
+    'idx_workshops_type_name': 'Workshops(workshop_type, workshop_name)',
+}
+
+# Небольшие справочные и служебные таблицы: полный просмотр и сортировка
+# во временном B-дереве для них допустимы
+SMALL_TABLES = {
+    'Material_types', 'Product_types', 'Workshops',
+    'Table_counts', 'Type_aggregates', 'Top_products',
+}
+
+# Ссылки на таблицы в запросе: FROM/JOIN таблица [AS] псевдоним
+_TABLE_REF = re.compile(
+    r'\b(?:FROM|JOIN)\s+(\w+)'
+    r'(?:\s+(?:AS\s+)?(?!(?:JOIN|LEFT|INNER|CROSS|WHERE|ON|ORDER|GROUP|LIMIT)\b)(\w+))?',
+    re.IGNORECASE
+)
+
+
+# Полнотекстовый индекс продукции (FTS5), синхронизируется триггерами
+SEARCH_SCHEMA = """
+    CREATE VIRTUAL TABLE Products_fts USING fts5(
+        product_name,
+        article_number,
+        product_type_name,
+        material_type_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    );
+    -- Вес совпадений: название важнее артикула, артикул важнее типа и материала
+    INSERT INTO Products_fts (Products_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 1.0)');
+    
+    CREATE TRIGGER trg_products_fts_ins AFTER INSERT ON Products
+    BEGIN
+        INSERT INTO Products_fts (rowid, product_name, article_number, product_type_name, material_type_name)
+        VALUES (
+            new.product_id, new.product_name, new.article_number,
+            (SELECT product_type_name FROM Product_types WHERE product_type_id = new.product_type_id),
+            (SELECT material_type_name FROM Material_types WHERE material_type_id = new.material_type_id)
+        );
+    END;
+    
+    CREATE TRIGGER trg_products_fts_del AFTER DELETE ON Products
+    BEGIN
+        DELETE FROM Products_fts WHERE rowid = old.product_id;
+    END;
+    
+    CREATE TRIGGER trg_products_fts_upd
+    AFTER UPDATE OF product_id, product_name, article_number, product_type_id, material_type_id ON Products
+    BEGIN
+        DELETE FROM Products_fts WHERE rowid = old.product_id;
+        INSERT INTO Products_fts (rowid, product_name, article_number, product_type_name, material_type_name)
+        VALUES (
+            new.product_id, new.product_name, new.article_number,
+            (SELECT product_type_name FROM Product_types WHERE product_type_id = new.product_type_id),
+            (SELECT material_type_name FROM Material_types WHERE material_type_id = new.material_type_id)
+        );
+    END;
+    
+    CREATE TRIGGER trg_product_types_fts_upd AFTER UPDATE OF product_type_name ON Product_types
+    BEGIN
+        UPDATE Products_fts SET product_type_name = new.product_type_name
+        WHERE rowid IN (SELECT product_id FROM Products WHERE product_type_id = new.product_type_id);
+    END;
+    
+    CREATE TRIGGER trg_material_types_fts_upd AFTER UPDATE OF material_type_name ON Material_types
+    BEGIN
+        UPDATE Products_fts SET material_type_name = new.material_type_name
+        WHERE rowid IN (SELECT product_id FROM Products WHERE material_type_id = new.material_type_id);
+    END;
+"""
+
+# Размер материализованного топа самых дорогих товаров
+TOP_PRODUCTS_SIZE = 100
+
+# Материализованные агрегаты для страницы аналитики, поддерживаются триггерами:
+# Type_aggregates - количество, сумма и число цен по типу продукции,
+# Top_products - TOP_PRODUCTS_SIZE самых дорогих товаров в порядке
+# ORDER BY min_partner_price DESC (товары без цены - последними)
+ANALYTICS_SCHEMA = """
+    CREATE TABLE Type_aggregates (
+        product_type_id INTEGER PRIMARY KEY,
+        product_count INTEGER NOT NULL DEFAULT 0,
+        price_sum REAL NOT NULL DEFAULT 0,
+        price_count INTEGER NOT NULL DEFAULT 0
+    );
+    
+    CREATE TABLE Top_products (
+        product_id INTEGER PRIMARY KEY,
+        min_partner_price REAL
+    );
+    CREATE INDEX idx_top_products_price ON Top_products(min_partner_price);
+"""
+
+# Новая цена попадает в заполненный топ, если она выше цены последней строки топа;
+# последние - строки без цены (MIN() их пропускает, поэтому сравнение через EXISTS)
+_TOP_ADMITS = """
+    new.min_partner_price IS NOT NULL AND EXISTS (
+        SELECT 1 FROM Top_products
+        WHERE min_partner_price IS NULL OR min_partner_price < new.min_partner_price
+    )
+"""
+
+# Триггеры агрегатов по именам: при подключении установленные триггеры
+# сверяются с этими определениями и при расхождении пересоздаются.
+# Вставки без INSERT OR IGNORE: в триггере, сработавшем от UPSERT
+# (синхронизация create_sqlite.py --sync), действует обработка конфликтов
+# внешнего запроса, и OR IGNORE не срабатывает
+ANALYTICS_TRIGGERS = {
+    'trg_products_agg_ins': f"""
+    CREATE TRIGGER trg_products_agg_ins AFTER INSERT ON Products
+    BEGIN
+        INSERT INTO Type_aggregates (product_type_id)
+        SELECT new.product_type_id
+        WHERE NOT EXISTS (SELECT 1 FROM Type_aggregates WHERE product_type_id = new.product_type_id);
+        UPDATE Type_aggregates SET
+            product_count = product_count + 1,
+            price_sum = price_sum + IFNULL(new.min_partner_price, 0),
+            price_count = price_count + (new.min_partner_price IS NOT NULL)
+        WHERE product_type_id = new.product_type_id;
+        
+        INSERT INTO Top_products (product_id, min_partner_price)
+        SELECT new.product_id, new.min_partner_price
+        WHERE (SELECT COUNT(*) FROM Top_products) < {TOP_PRODUCTS_SIZE} OR ({_TOP_ADMITS});
+        DELETE FROM Top_products WHERE product_id IN (
+            SELECT product_id FROM Top_products
+            ORDER BY min_partner_price, product_id DESC
+            LIMIT MAX(0, (SELECT COUNT(*) FROM Top_products) - {TOP_PRODUCTS_SIZE})
+        );
+    END""",
+    'trg_products_agg_del': f"""
+    CREATE TRIGGER trg_products_agg_del AFTER DELETE ON Products
+    BEGIN
+        UPDATE Type_aggregates SET
+            product_count = product_count - 1,
+            price_sum = price_sum - IFNULL(old.min_partner_price, 0),
+            price_count = price_count - (old.min_partner_price IS NOT NULL)
+        WHERE product_type_id = old.product_type_id;
+        
+        DELETE FROM Top_products WHERE product_id = old.product_id;
+        INSERT INTO Top_products (product_id, min_partner_price)
+        SELECT product_id, min_partner_price FROM Products
+        WHERE product_id NOT IN (SELECT product_id FROM Top_products)
+        ORDER BY min_partner_price DESC
+        LIMIT MAX(0, {TOP_PRODUCTS_SIZE} - (SELECT COUNT(*) FROM Top_products));
+    END""",
+    'trg_products_agg_upd': f"""
+    CREATE TRIGGER trg_products_agg_upd AFTER UPDATE OF product_type_id, min_partner_price ON Products
+    BEGIN
+        UPDATE Type_aggregates SET
+            product_count = product_count - 1,
+            price_sum = price_sum - IFNULL(old.min_partner_price, 0),
+            price_count = price_count - (old.min_partner_price IS NOT NULL)
+        WHERE product_type_id = old.product_type_id;
+        INSERT INTO Type_aggregates (product_type_id)
+        SELECT new.product_type_id
+        WHERE NOT EXISTS (SELECT 1 FROM Type_aggregates WHERE product_type_id = new.product_type_id);
+        UPDATE Type_aggregates SET
+            product_count = product_count + 1,
+            price_sum = price_sum + IFNULL(new.min_partner_price, 0),
+            price_count = price_count + (new.min_partner_price IS NOT NULL)
+        WHERE product_type_id = new.product_type_id;
+        
+        -- Убираем старую цену из топа, новая попадает в него, если она выше последней;
+        -- затем обрезаем топ до размера и добираем недостающие из Products
+        DELETE FROM Top_products WHERE product_id = old.product_id;
+        INSERT INTO Top_products (product_id, min_partner_price)
+        SELECT new.product_id, new.min_partner_price
+        WHERE {_TOP_ADMITS}
+          AND NOT EXISTS (SELECT 1 FROM Top_products WHERE product_id = new.product_id);
+        DELETE FROM Top_products WHERE product_id IN (
+            SELECT product_id FROM Top_products
+            ORDER BY min_partner_price, product_id DESC
+            LIMIT MAX(0, (SELECT COUNT(*) FROM Top_products) - {TOP_PRODUCTS_SIZE})
+        );
+        INSERT INTO Top_products (product_id, min_partner_price)
+        SELECT product_id, min_partner_price FROM Products
+        WHERE product_id NOT IN (SELECT product_id FROM Top_products)
+        ORDER BY min_partner_price DESC
+        LIMIT MAX(0, {TOP_PRODUCTS_SIZE} - (SELECT COUNT(*) FROM Top_products));
+    END""",
+}
+
+# Маркеры подсветки совпадений (заменяются на <mark> после экранирования HTML)
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+
+def highlight_html(text):
+    """Экранировать текст с маркерами подсветки и превратить маркеры в <mark>"""
+    if text is None:
+        return None
+    escaped = html.escape(text)
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _outdated_triggers(connection, triggers):
+    """Имена триггеров, которых нет в БД или чье определение отличается (без учета пробелов)"""
+    installed = dict(connection.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+    ).fetchall())
+    return [name for name, sql in triggers.items()
+            if ' '.join((installed.get(name) or '').split()) != ' '.join(sql.split())]
+
+
+def fts_query(search_term):
+    """Построить запрос FTS5: все слова обязательны, каждое ищется как префикс"""
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', search_term))
+
+
+def plan_problems(query, plan, scans=()):
+    """Найти в плане запроса полные просмотры и сортировки во временном B-дереве
+
+    plan - список строк detail из EXPLAIN QUERY PLAN. Полным просмотром
+    считается любой SCAN без условия поиска, в том числе обход индекса
+    (SCAN ... USING [COVERING] INDEX). Он допустим для небольших таблиц
+    (SMALL_TABLES) и для таблиц из scans - запрос просматривает их целиком
+    намеренно. Временное B-дерево допустимо в запросах, которые обращаются
+    только к небольшим таблицам.
+    """
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(query):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    only_small = all(table in SMALL_TABLES for table in aliases.values())
+    
+    problems = []
+    for detail in plan:
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and 'VIRTUAL TABLE' not in detail and not detail.startswith('SCAN CONSTANT ROW'):
+            table = aliases.get(match.group(1), match.group(1))
+            if table not in SMALL_TABLES and table not in scans:
+                problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail and not only_small:
+            problems.append(detail)
+    return problems
+
+
+class ConnectionPool(BaseConnectionPool):
+    """Пул соединений SQLite
+
+    БД переводится в режим WAL: читатели получают соединения только для
+    чтения из пула и не блокируют друг друга, все записи идут через одно
+    соединение-писатель под блокировкой.
+    """
+
+    def __init__(self, db_path, size=5, timeout=30.0):
+        """Инициализация пула"""
+        self.db_path = Path(db_path)
+        super().__init__(self._connect, size, timeout)
+
+        self._writer = self._connect(readonly=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._writer_lock = threading.RLock()
+
+    def _connect(self, readonly=True):
+        """Открыть новое соединение"""
+        if readonly:
+            uri = self.db_path.resolve().as_uri() + '?mode=ro'
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                         cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            connection = sqlite3.connect(self.db_path, check_same_thread=False,
+                                         cached_statements=STATEMENT_CACHE_SIZE)
+        connection.row_factory = sqlite3.Row  # Для dict-like доступа
+        return connection
+
+    @contextmanager
+    def writer(self):
+        """Соединение-писатель под блокировкой"""
+        with self._writer_lock:
+            try:
+                yield self._writer
+            except Exception:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+
+    def data_version(self):
+        """PRAGMA data_version писателя или None, если писатель занят
+
+        Счетчик соединения меняется только после фиксации записи другими
+        соединениями: читатели пула только читают, поэтому это записи других
+        процессов, а собственные записи (уже учтенные в версии данных
+        менеджера) его не меняют. Пока идет запись, проверка пропускается.
+        """
+        if not self._writer_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._writer.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._writer_lock.release()
+
+    def close(self):
+        """Закрыть все соединения"""
+        super().close()
+        with self._writer_lock:
+            self._writer.close()
+
+
+class DatabaseManager(BaseDatabaseManager):
     """Класс для управления SQLite БД"""
     
-    def __init__(self, db_path=None):
+    # Время жизни кэша статистики в памяти процесса, секунды
+    STATS_TTL = 5.0
+    
+    DB_ERROR = sqlite3.Error
+    
+    # Вызовы методов чтения (метод, args, kwargs, scans), планы запросов которых
+    # проверяет check_query_plans(). scans - таблицы, которые вызов просматривает
+    # целиком намеренно: выгрузка всей продукции, обход индекса в порядке
+    # ORDER BY до LIMIT, поиск через LIKE и точный подсчет COUNT(*)
+    PLAN_CHECKS = [
+        ('get_products', (), {}, ('Products',)),
+        ('get_products', (), {'limit': 10}, ('Products',)),
+        ('get_products_page', (), {'limit': 10}, ('Products',)),
+        ('get_products_page', (), {'limit': 10, 'after': encode_cursor('', 0)}, ()),
+        ('iter_products', (), {}, ('Products',)),
+        ('get_product', (1,), {}, ()),
+        ('get_product_details', (1,), {}, ()),
+        ('get_product_types', (), {}, ()),
+        ('get_material_types', (), {}, ()),
+        ('get_workshops', (), {}, ()),
+        ('get_statistics', (), {}, ()),
+        ('get_products_by_type', (), {}, ()),
+        ('get_average_price_by_type', (), {}, ()),
+        ('get_top_expensive_products', (10,), {}, ()),
+        ('get_top_expensive_products', (TOP_PRODUCTS_SIZE + 1,), {}, ('Products',)),
+        ('search_products', ('диван',), {}, ()),
+        ('_search_products_like', ('диван',), {}, ('Products',)),
+        ('search_by_article', ('1',), {}, ()),
+        ('get_products_listing', (), {}, ('Products',)),
+        ('get_products_listing', (), {'sort': 'price', 'order': 'desc', 'product_type_id': 1,
+                                      'after': encode_cursor(1000.0, 1)}, ()),
+        ('get_products_listing', (), {'sort': 'article', 'material_type_id': 1, 'is_available': 1,
+                                      'before': encode_cursor('5', 1)}, ()),
+        ('count_rows', (), {}, tuple(TABLES)),
+    ]
+    
+    def __init__(self, db_path=None, pool_size=5, pool_timeout=30.0):
         """Инициализация подключения"""
+        super().__init__()
         if db_path is None:
             db_path = Path(__file__).parent.parent / 'database' / 'furniture_company.db'
         
         self.db_path = db_path
-        self.connection = None
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.fts_enabled = False
+        self._external_version = None
         self.connect()
     
     def connect(self):
         """Подключение к БД"""
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.connection.row_factory = sqlite3.Row  # Для dict-like доступа
+            self.pool = ConnectionPool(self.db_path, self.pool_size, self.pool_timeout)
+            self.ensure_schema()
+            self._external_version = self.pool.data_version()
             return True
         except Exception as e:
             print(f"Ошибка подключения к БД: {e}")
             return False
     
-    def execute_query(self, query, params=None, fetch=True):
-        """Выполнение запроса"""
+    def data_state(self):
+        """Тег версии данных и время изменения с учетом записей других процессов
+
+        Записи из другого процесса (например, синхронизация каталога
+        create_sqlite.py --sync) не проходят через _data_changed(), поэтому
+        они отслеживаются по PRAGMA data_version.
+        """
+        if self.pool is not None:
+            version = self.pool.data_version()
+            if version is not None and version != self._external_version:
+                self._external_version = version
+                self._data_changed()
+        return super().data_state()
+    
+    def ensure_schema(self):
+        """Создать недостающие служебные объекты схемы (индексы и т.п.)"""
+        script = "BEGIN;"
+        for name, columns in INDEXES.items():
+            script += f"CREATE INDEX IF NOT EXISTS {name} ON {columns};"
+        script += """
+            CREATE TABLE IF NOT EXISTS Table_counts (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL
+            );
+        """
+        # Счетчики строк поддерживаются триггерами на вставку и удаление
+        for table in TABLES:
+            script += f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_count_ins AFTER INSERT ON {table}
+                BEGIN
+                    UPDATE Table_counts SET row_count = row_count + 1 WHERE table_name = '{table}';
+                END;
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_count_del AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE Table_counts SET row_count = row_count - 1 WHERE table_name = '{table}';
+                END;
+                INSERT OR IGNORE INTO Table_counts (table_name, row_count)
+                SELECT '{table}', COUNT(*) FROM {table};
+            """
+        script += "COMMIT;"
+        
+        with self.pool.writer() as connection:
+            connection.executescript(script)
+            analytics_exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Type_aggregates'"
+            ).fetchone()
+            if not analytics_exists:
+                connection.executescript("BEGIN;" + ANALYTICS_SCHEMA + "COMMIT;")
+            outdated = _outdated_triggers(connection, ANALYTICS_TRIGGERS)
+            if outdated:
+                connection.executescript("BEGIN;" + "".join(
+                    f"DROP TRIGGER IF EXISTS {name}; {ANALYTICS_TRIGGERS[name]};" for name in outdated
+                ) + "COMMIT;")
+        
+        # Агрегаты пересчитываются и после замены триггеров: прежние могли их исказить
+        if not analytics_exists or outdated:
+            self.rebuild_analytics()
+        
+        self._ensure_search_index()
+    
+    def _ensure_search_index(self):
+        """Создать полнотекстовый индекс, если его нет и SQLite собран с FTS5"""
+        with self.pool.writer() as connection:
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Products_fts'"
+            ).fetchone()
+            if not exists:
+                try:
+                    connection.executescript("BEGIN;" + SEARCH_SCHEMA + "COMMIT;")
+                except sqlite3.OperationalError as e:
+                    if connection.in_transaction:
+                        connection.rollback()
+                    print(f"Полнотекстовый поиск недоступен, используется LIKE: {e}")
+                    return
+        
+        self.fts_enabled = True
+        if not exists:
+            self.rebuild_search_index()
+    
+    def rebuild_analytics(self):
+        """Полностью пересчитать материализованные агрегаты аналитики"""
+        with self.pool.writer() as connection:
+            connection.execute("DELETE FROM Type_aggregates")
+            connection.execute("""
+                INSERT INTO Type_aggregates (product_type_id, product_count, price_sum, price_count)
+                SELECT product_type_id, COUNT(*), TOTAL(min_partner_price), COUNT(min_partner_price)
+                FROM Products
+                GROUP BY product_type_id
+            """)
+            connection.execute("DELETE FROM Top_products")
+            connection.execute("""
+                INSERT INTO Top_products (product_id, min_partner_price)
+                SELECT product_id, min_partner_price
+                FROM Products
+                ORDER BY min_partner_price DESC
+                LIMIT ?
+            """, (TOP_PRODUCTS_SIZE,))
+            connection.commit()
+        self._data_changed({'type_aggregates', 'top_products'})
+    
+    def rebuild_search_index(self):
+        """Перестроить полнотекстовый индекс продукции"""
+        with self.pool.writer() as connection:
+            connection.execute("DELETE FROM Products_fts")
+            connection.execute("""
+                INSERT INTO Products_fts (rowid, product_name, article_number, product_type_name, material_type_name)
+                SELECT p.product_id, p.product_name, p.article_number, pt.product_type_name, mt.material_type_name
+                FROM Products p
+                LEFT JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+                LEFT JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+            """)
+            connection.execute(
+                "INSERT INTO Products_fts (Products_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 1.0)')"
+            )
+            connection.execute("INSERT INTO Products_fts (Products_fts) VALUES ('optimize')")
+            connection.commit()
+        self._data_changed({'products_fts'})
+    
+    def explain_queries(self):
+        """Собрать запросы всех методов из PLAN_CHECKS и их планы
+
+        Методы выполняются на соединении с trace-callback, затем для каждого
+        перехваченного SELECT выполняется EXPLAIN QUERY PLAN. Возвращает
+        список словарей {'method', 'query', 'plan', 'scans'}.
+        """
+        captured = {}
+        self.release()
+        connection = self.pool.acquire()
+        self._local.connection = connection
+        self._stats_cache = None
+        self._lookups = None
+        
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params or ())
+            for method, args, kwargs, scans in self.PLAN_CHECKS:
+                statements = []
+                connection.set_trace_callback(statements.append)
+                try:
+                    result = getattr(self, method)(*args, **kwargs)
+                    if hasattr(result, 'close'):
+                        # Генератор: достаточно выполнить запрос
+                        next(result, None)
+                        result.close()
+                finally:
+                    connection.set_trace_callback(None)
+                
+                for query in statements:
+                    # Внутренние запросы FTS5 к теневым таблицам пропускаем
+                    if query.lstrip().upper().startswith('SELECT') and "'main'." not in query:
+                        captured.setdefault((method, query), set()).update(scans)
             
+            return [
+                {
+                    'method': method,
+                    'query': query,
+                    'plan': [row['detail'] for row in connection.execute('EXPLAIN QUERY PLAN ' + query)],
+                    'scans': sorted(scans),
+                }
+                for (method, query), scans in captured.items()
+            ]
+        finally:
+            self._local.connection = None
+            self.pool.release(connection)
+    
+    def check_query_plans(self):
+        """Проверить планы запросов: полные просмотры и сортировки во временном B-дереве
+
+        Возвращает список проблем {'method', 'query', 'detail'}; пустой список - все в порядке.
+        """
+        problems = []
+        for item in self.explain_queries():
+            for detail in plan_problems(item['query'], item['plan'], item['scans']):
+                problems.append({'method': item['method'], 'query': item['query'], 'detail': detail})
+        return problems
+    
+    def execute_query(self, query, params=None, fetch=True, shape='dict'):
+        """Выполнение запроса
+
+        При fetch=True строки возвращаются в форме shape (см. db_base.ROW_SHAPES).
+        Курсор читает простые кортежи, поэтому для dict создается один словарь
+        на строку, а tuple и row обходятся без копирования.
+        """
+        if shape not in ROW_SHAPES:
+            raise ValueError(f"Неизвестная форма результата: {shape}")
+        
+        started = time.perf_counter()
+        try:
             if fetch:
-                rows = cursor.fetchall()
-                # Конвертируем в список словарей
-                return [dict(row) for row in rows]
+                with self._reader() as connection:
+                    cursor = connection.cursor()
+                    if shape != 'row':
+                        cursor.row_factory = None
+                    cursor.execute(query, params or ())
+                    rows = cursor.fetchall()
+                self._observe_query(query, started, len(rows))
+                if shape == 'row':
+                    return rows
+                return shape_rows([column[0] for column in cursor.description], rows, shape)
             else:
-                self.connection.commit()
+                with self.pool.writer() as connection:
+                    cursor = connection.cursor()
+                    cursor.execute(query, params or ())
+                    connection.commit()
+                self._observe_query(query, started, max(cursor.rowcount, 0))
+                self._data_changed(written_tables(query))
                 return True
         except Exception as e:
+            self._observe_query(query, started, 0, error=True)
             print(f"Ошибка выполнения запроса: {e}")
             return None if fetch else False
     
+    def _writer(self):
+        """Соединение-писатель пула под блокировкой"""
+        return self.pool.writer()
+    
+    def iter_query(self, query, params=None, batch_size=1000):
+        """Потоковое чтение запроса порциями fetchmany
+
+        Первый элемент - список имен столбцов, дальше - списки кортежей
+        по batch_size строк.
+        """
+        started = time.perf_counter()
+        count = 0
+        with self._reader() as connection:
+            cursor = connection.cursor()
+            cursor.row_factory = None
+            cursor.execute(query, params or ())
+            try:
+                yield [column[0] for column in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    count += len(rows)
+                    yield rows
+            finally:
+                # Время включает обработку порций потребителем
+                self._observe_query(query, started, count)
+    
     def get_products(self, limit=None):
         """Получить список продукции"""
+        if self._catalog_ready():
+            return self.catalog.products(limit)
         query = """
             SELECT 
                 p.product_id,
@@ -60,37 +655,13 @@ class DatabaseManager:
             FROM Products p
             JOIN Product_types pt ON p.product_type_id = pt.product_type_id
             JOIN Material_types mt ON p.material_type_id = mt.material_type_id
-            ORDER BY p.product_name
+            ORDER BY p.product_name, p.product_id
         """
         if limit:
-            query += f" LIMIT {limit}"
+            query += f" LIMIT {int(limit)}"
         
         return self.execute_query(query)
     
-    def get_product_types(self):
-        """Получить типы продукции"""
-        query = "SELECT * FROM Product_types ORDER BY product_type_name"
-        return self.execute_query(query)
-    
-    def get_material_types(self):
-        """Получить типы материалов"""
-        query = "SELECT * FROM Material_types ORDER BY material_type_name"
-        return self.execute_query(query)
-    
-    def get_workshops(self):
-        """Получить список цехов"""
-        query = """
-            SELECT 
-                workshop_id,
-                workshop_name,
-                workshop_type,
-                staff_count,
-                is_active
-            FROM Workshops
-            ORDER BY workshop_type, workshop_name
-        """
-        return self.execute_query(query)
-    
     def add_product(self, name, article, product_type_id, material_type_id, price):
         """Добавить продукцию"""
         query = """
@@ -98,7 +669,11 @@ class DatabaseManager:
             (product_name, article_number, product_type_id, material_type_id, min_partner_price)
             VALUES (?, ?, ?, ?, ?)
         """
-        return self.execute_query(query, (name, article, product_type_id, material_type_id, price), fetch=False)
+        params = (name, article, product_type_id, material_type_id, price)
+        if article is None:
+            return self.execute_query(query, params, fetch=False)
+        with self._catalog_write(articles=(article,)):
+            return self.execute_query(query, params, fetch=False)
     
     def update_product(self, product_id, **kwargs):
         """Обновить продукцию"""
@@ -112,65 +687,258 @@ class DatabaseManager:
         values.append(product_id)
         query = f"UPDATE Products SET {', '.join(fields)} WHERE product_id = ?"
         
-        return self.execute_query(query, tuple(values), fetch=False)
+        with self._catalog_write(product_ids=(product_id,)):
+            return self.execute_query(query, tuple(values), fetch=False)
     
     def delete_product(self, product_id):
         """Удалить продукцию"""
         query = "DELETE FROM Products WHERE product_id = ?"
-        return self.execute_query(query, (product_id,), fetch=False)
+        with self._catalog_write(product_ids=(product_id,)):
+            return self.execute_query(query, (product_id,), fetch=False)
+    
+    def get_product_details(self, product_id):
+        """Продукция с типом, материалом и маршрутом по цехам (None, если ее нет)
+
+        Один запрос: строка продукции по первичному ключу и строки маршрута по
+        индексу UNIQUE (product_id, workshop_id) таблицы Product_workshops.
+        Время производства единицы - сумма часов по цехам маршрута.
+        """
+        query = """
+            SELECT
+                p.product_id,
+                p.product_name,
+                p.article_number,
+                p.product_type_id,
+                pt.product_type_name,
+                pt.type_coefficient,
+                p.material_type_id,
+                mt.material_type_name,
+                mt.waste_percentage,
+                p.min_partner_price,
+                p.dimensions,
+                p.weight,
+                p.description,
+                p.is_available,
+                pw.workshop_id,
+                w.workshop_name,
+                w.workshop_type,
+                w.staff_count,
+                pw.production_time_hours,
+                pw.priority
+            FROM Products p
+            LEFT JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            LEFT JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+            LEFT JOIN Product_workshops pw ON pw.product_id = p.product_id
+            LEFT JOIN Workshops w ON w.workshop_id = pw.workshop_id
+            WHERE p.product_id = ?
+        """
+        return self._product_details(self.execute_query(query, (product_id,)))
     
     def get_statistics(self):
-        """Получить статистику БД"""
-        tables = ['Material_types', 'Product_types', 'Workshops', 'Products', 'Product_workshops']
+        """Получить статистику БД
+
+        Количество строк берется из таблицы счетчиков Table_counts, которую
+        обновляют триггеры, и кэшируется в памяти на STATS_TTL секунд.
+        """
+        now = time.monotonic()
+        if self._stats_cache is not None and now - self._stats_cache_time < self.STATS_TTL:
+            return dict(self._stats_cache)
+        
+        result = self.execute_query("SELECT table_name, row_count FROM Table_counts")
+        if result is None:
+            return {}
+        
+        counts = {row['table_name']: row['row_count'] for row in result}
+        stats = {table: counts[table] for table in TABLES if table in counts}
+        
+        self._stats_cache = stats
+        self._stats_cache_time = now
+        return dict(stats)
+    
+    def _count_products(self, product_type_id=None):
+        """Количество продукции из счетчиков: всего - Table_counts, по типу - Type_aggregates"""
+        if product_type_id is None:
+            return self.get_statistics().get('Products')
+        
+        result = self.execute_query(
+            "SELECT product_count FROM Type_aggregates WHERE product_type_id = ?",
+            (product_type_id,)
+        )
+        return result[0]['product_count'] if result else 0
+    
+    def count_rows(self):
+        """Точное количество строк в таблицах (полный подсчет COUNT(*))"""
         stats = {}
         
-        for table in tables:
+        for table in TABLES:
             result = self.execute_query(f"SELECT COUNT(*) as count FROM {table}")
             if result:
                 stats[table] = result[0]['count']
         
         return stats
     
+    def refresh_statistics(self):
+        """Пересчитать счетчики строк заново"""
+        with self.pool.writer() as connection:
+            for table in TABLES:
+                connection.execute(
+                    "INSERT OR REPLACE INTO Table_counts (table_name, row_count) "
+                    f"SELECT '{table}', COUNT(*) FROM {table}"
+                )
+            connection.commit()
+        
+        self._data_changed({'table_counts'})
+        return self.get_statistics()
+    
+    def verify_statistics(self):
+        """Сверить счетчики с точными значениями
+
+        Возвращает словарь расхождений {таблица: (счетчик, точное значение)}.
+        """
+        self._stats_cache = None
+        cached = self.get_statistics()
+        exact = self.count_rows()
+        
+        return {
+            table: (cached.get(table), count)
+            for table, count in exact.items()
+            if cached.get(table) != count
+        }
+    
     def get_products_by_type(self):
-        """Продукция по типам"""
+        """Продукция по типам (из материализованных агрегатов)"""
         query = """
             SELECT 
                 pt.product_type_name,
-                COUNT(*) as count
-            FROM Products p
-            JOIN Product_types pt ON p.product_type_id = pt.product_type_id
-            GROUP BY pt.product_type_name
+                a.product_count as count
+            FROM Type_aggregates a
+            JOIN Product_types pt ON a.product_type_id = pt.product_type_id
+            WHERE a.product_count > 0
             ORDER BY count DESC
         """
         return self.execute_query(query)
     
     def get_average_price_by_type(self):
-        """Средняя цена по типам"""
+        """Средняя цена по типам (из материализованных агрегатов)"""
         query = """
             SELECT 
                 pt.product_type_name,
-                AVG(p.min_partner_price) as avg_price
-            FROM Products p
-            JOIN Product_types pt ON p.product_type_id = pt.product_type_id
-            GROUP BY pt.product_type_name
+                CASE WHEN a.price_count > 0 THEN a.price_sum / a.price_count END as avg_price
+            FROM Type_aggregates a
+            JOIN Product_types pt ON a.product_type_id = pt.product_type_id
+            WHERE a.product_count > 0
             ORDER BY avg_price DESC
         """
         return self.execute_query(query)
     
     def get_top_expensive_products(self, limit=10):
-        """Топ самых дорогих товаров"""
+        """Топ самых дорогих товаров
+
+        До TOP_PRODUCTS_SIZE записей отдается из материализованного топа
+        (CROSS JOIN фиксирует порядок соединения: сначала топ, затем Products).
+        """
+        if self._catalog_ready():
+            return self.catalog.top_expensive(limit)
+        if limit <= TOP_PRODUCTS_SIZE:
+            query = """
+                SELECT 
+                    p.product_name,
+                    t.min_partner_price
+                FROM Top_products t
+                CROSS JOIN Products p ON t.product_id = p.product_id
+                ORDER BY t.min_partner_price DESC
+                LIMIT ?
+            """
+        else:
+            query = """
+                SELECT 
+                    product_name,
+                    min_partner_price
+                FROM Products
+                ORDER BY min_partner_price DESC
+                LIMIT ?
+            """
+        return self.execute_query(query, (limit,))
+    
+    def search_products(self, search_term, limit=None):
+        """Поиск продукции
+
+        Сначала идут точные и префиксные совпадения по артикулу (индекс по
+        article_number), затем совпадения полнотекстового индекса по названию,
+        артикулу, типу и материалу в порядке релевантности (bm25). Поле
+        highlight содержит название с подсветкой совпадений в виде HTML.
+        """
+        search_term = search_term.strip()
+        if not self.fts_enabled:
+            return self._search_products_like(search_term, limit)
+        
+        results = self.search_by_article(search_term, limit)
+        if results is None:
+            return None
+        seen = {row['product_id'] for row in results}
+        
+        match = fts_query(search_term)
+        if match and (limit is None or len(results) < limit):
+            query = f"""
+                SELECT 
+                    p.product_id,
+                    p.product_name,
+                    p.article_number,
+                    pt.product_type_name,
+                    mt.material_type_name,
+                    p.min_partner_price,
+                    p.is_available,
+                    highlight(Products_fts, 0, '{_MARK_START}', '{_MARK_END}') AS highlight
+                FROM Products_fts
+                JOIN Products p ON p.product_id = Products_fts.rowid
+                JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+                JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+                WHERE Products_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """
+            rows = self.execute_query(query, (match, -1 if limit is None else limit))
+            if rows is None:
+                return None
+            for row in rows:
+                if row['product_id'] not in seen:
+                    row['highlight'] = highlight_html(row['highlight'])
+                    results.append(row)
+        
+        return results if limit is None else results[:limit]
+    
+    def search_by_article(self, prefix, limit=None):
+        """Поиск по артикулу: точное совпадение, затем артикулы с этим префиксом"""
+        if not prefix:
+            return []
+        
         query = """
             SELECT 
-                product_name,
-                min_partner_price
-            FROM Products
-            ORDER BY min_partner_price DESC
+                p.product_id,
+                p.product_name,
+                p.article_number,
+                pt.product_type_name,
+                mt.material_type_name,
+                p.min_partner_price,
+                p.is_available
+            FROM Products p
+            JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+            WHERE p.article_number >= ? AND p.article_number < ?
+            ORDER BY p.article_number
             LIMIT ?
         """
-        return self.execute_query(query, (limit,))
+        # Диапазон [prefix, prefix + максимальный символ) идет по уникальному индексу
+        # article_number, точное совпадение в нем всегда первое
+        rows = self.execute_query(query, (prefix, prefix + '\U0010ffff', -1 if limit is None else limit))
+        if rows is None:
+            return None
+        for row in rows:
+            row['highlight'] = highlight_html(row['product_name'])
+        return rows
     
-    def search_products(self, search_term):
-        """Поиск продукции"""
+    def _search_products_like(self, search_term, limit=None):
+        """Поиск продукции через LIKE (если FTS5 недоступен)"""
         query = """
             SELECT 
                 p.product_id,
@@ -178,21 +946,102 @@ class DatabaseManager:
                 p.article_number,
                 pt.product_type_name,
                 mt.material_type_name,
-                p.min_partner_price
+                p.min_partner_price,
+                p.is_available
             FROM Products p
             JOIN Product_types pt ON p.product_type_id = pt.product_type_id
             JOIN Material_types mt ON p.material_type_id = mt.material_type_id
             WHERE p.product_name LIKE ? OR p.article_number LIKE ?
             ORDER BY p.product_name
+            LIMIT ?
         """
         search = f"%{search_term}%"
-        return self.execute_query(query, (search, search))
+        return self.execute_query(query, (search, search, -1 if limit is None else limit))
+
+
+def main():
+    """Служебные команды для SQLite БД"""
+    import sys
     
-    def close(self):
-        """Закрыть соединение"""
-        if self.connection:
-            self.connection.close()
+    if len(sys.argv) < 2:
+        print("как использовать:")
+        print("  python scripts/db_manager_sqlite.py refresh-stats  - пересчитать счетчики строк")
+        print("  python scripts/db_manager_sqlite.py verify-stats   - сверить счетчики с COUNT(*)")
+        print("  python scripts/db_manager_sqlite.py rebuild-search - перестроить полнотекстовый индекс")
+        print("  python scripts/db_manager_sqlite.py rebuild-analytics - пересчитать агрегаты аналитики")
+        print("  python scripts/db_manager_sqlite.py check-plans    - проверить планы запросов (EXPLAIN QUERY PLAN)")
+        print("  python scripts/db_manager_sqlite.py check-catalog  - сверить реплику каталога в памяти с БД")
+        print("  python scripts/db_manager_sqlite.py export [csv|xlsx|parquet] [--gzip] - выгрузить таблицы в data/")
+        return
+    
+    command = sys.argv[1].lower()
+    db = DatabaseManager()
+    
+    if command == 'refresh-stats':
+        for table, count in db.refresh_statistics().items():
+            print(f"{table}: {count} записей")
     
-    def __del__(self):
-        """Деструктор"""
-        self.close()
+    elif command == 'verify-stats':
+        mismatches = db.verify_statistics()
+        if not mismatches:
+            print("счетчики совпадают с таблицами")
+        for table, (cached, exact) in mismatches.items():
+            print(f"{table}: счетчик {cached}, на самом деле {exact}")
+        sys.exit(1 if mismatches else 0)
+    
+    elif command == 'rebuild-search':
+        if not db.fts_enabled:
+            print("полнотекстовый поиск недоступен (SQLite без FTS5)")
+            sys.exit(1)
+        db.rebuild_search_index()
+        print("полнотекстовый индекс перестроен")
+    
+    elif command == 'rebuild-analytics':
+        db.rebuild_analytics()
+        print("агрегаты аналитики пересчитаны")
+    
+    elif command == 'check-plans':
+        for item in db.explain_queries():
+            print(f"{item['method']}:")
+            for detail in item['plan']:
+                print(f"  {detail}")
+        
+        problems = db.check_query_plans()
+        if not problems:
+            print("\nпланы запросов в порядке")
+        else:
+            print("\nпроблемы:")
+        for problem in problems:
+            print(f"  {problem['method']}: {problem['detail']}")
+        sys.exit(1 if problems else 0)
+    
+    elif command == 'check-catalog':
+        if __package__:
+            from .catalog import CatalogReplica
+        else:
+            from catalog import CatalogReplica
+        start = time.perf_counter()
+        replica = CatalogReplica(db)
+        print(f"реплика загружена за {time.perf_counter() - start:.3f} с: {replica.stats()['products']} позиций")
+        
+        problems = replica.verify()
+        if not problems:
+            print("реплика совпадает с БД")
+        for kind, items in problems.items():
+            print(f"  {kind}: {items[:20]}{' ...' if len(items) > 20 else ''}")
+        sys.exit(1 if problems else 0)
+    
+    elif command == 'export':
+        fmt = next((arg for arg in sys.argv[2:] if not arg.startswith('--')), 'csv')
+        start = time.perf_counter()
+        paths = db.export_all(fmt=fmt, compress='--gzip' in sys.argv)
+        for table, path in paths.items():
+            print(f"{table}: {path}")
+        print(f"выгружено за {time.perf_counter() - start:.2f} с")
+    
+    else:
+        print(f"неизвестная команда: {command}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Потоковый экспорт таблиц в CSV, XLSX и Parquet
+
+Работает с любым менеджером БД, у которого есть iter_query(query, params,
+batch_size): первый элемент - имена столбцов, дальше - списки строк по
+batch_size штук (курсор читается через fetchmany). Файл формируется по
+порциям, поэтому в памяти никогда не лежит вся таблица:
+    CSV     - байты каждой порции отдаются сразу;
+    XLSX    - openpyxl в режиме write_only (строки сбрасываются во временный файл);
+    Parquet - pyarrow.ParquetWriter, одна группа строк на порцию (нужен pyarrow).
+Любой формат можно сжать gzip на лету.
+"""
+import csv
+import io
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Размер порции fetchmany
+EXPORT_BATCH_SIZE = 1000
+
+# Размер блока при чтении временного файла (XLSX, Parquet)
+FILE_BLOCK_SIZE = 64 * 1024
+
+# Выгружаемые таблицы. Запросы совместимы и с MySQL, и с SQLite; порядок
+# строк выбран так, чтобы СУБД могла отдавать их по индексу без сортировки
+EXPORT_QUERIES = {
+    'products': """
+        SELECT
+            p.product_id,
+            p.product_name,
+            p.article_number,
+            pt.product_type_name,
+            mt.material_type_name,
+            p.min_partner_price,
+            p.is_available
+        FROM Products p
+        LEFT JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+        LEFT JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+        ORDER BY p.product_name, p.product_id
+    """,
+    'workshops': """
+        SELECT workshop_id, workshop_name, workshop_type, staff_count, is_active
+        FROM Workshops
+        ORDER BY workshop_type, workshop_name
+    """,
+    'products_workshops': """
+        SELECT
+            p.product_name,
+            w.workshop_name,
+            w.workshop_type,
+            pw.production_time_hours
+        FROM Product_workshops pw
+        JOIN Products p ON p.product_id = pw.product_id
+        JOIN Workshops w ON w.workshop_id = pw.workshop_id
+        ORDER BY pw.product_workshop_id
+    """,
+    'product_types': "SELECT * FROM Product_types ORDER BY product_type_id",
+    'material_types': "SELECT * FROM Material_types ORDER BY material_type_id",
+}
+
+# Типы столбцов для Parquet: схема известна до чтения строк и одинакова для
+# MySQL и SQLite (DECIMAL приводится к float, дата и время - к строке).
+# Столбцы, которых здесь нет, выгружаются строками
+EXPORT_COLUMN_TYPES = {
+    'product_id': int, 'product_type_id': int, 'material_type_id': int, 'workshop_id': int,
+    'staff_count': int, 'is_available': int, 'is_active': int, 'is_ecological': int,
+    'min_partner_price': float, 'production_time_hours': float,
+    'type_coefficient': float, 'waste_percentage': float,
+}
+
+# Формат -> MIME-тип
+FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_filename(table, fmt, compress=False):
+    """Имя файла экспорта: products_export.csv, products_export.csv.gz и т.д."""
+    return f"{table}_export.{fmt}" + ('.gz' if compress else '')
+
+
+def export_mimetype(fmt, compress=False):
+    """MIME-тип файла экспорта"""
+    return 'application/gzip' if compress else FORMATS[fmt]
+
+
+def export_stream(db, table, fmt='csv', compress=False, batch_size=EXPORT_BATCH_SIZE):
+    """Поток байтов файла экспорта таблицы
+
+    Таблица и формат проверяются сразу (ValueError), запрос к БД выполняется
+    при чтении потока.
+    """
+    if table not in EXPORT_QUERIES:
+        raise ValueError(f"Неизвестная таблица для экспорта: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+    if fmt == 'parquet':
+        _require_pyarrow()
+
+    def generate():
+        rows = db.iter_query(EXPORT_QUERIES[table], batch_size=batch_size)
+        columns = next(rows)
+        if fmt == 'csv':
+            chunks = _csv_chunks(columns, rows)
+        elif fmt == 'xlsx':
+            chunks = _xlsx_chunks(columns, rows, table)
+        else:
+            chunks = _parquet_chunks(columns, rows)
+        if compress:
+            chunks = _gzip_chunks(chunks)
+        yield from chunks
+
+    return generate()
+
+
+def export_to_file(db, table, fmt='csv', path=None, compress=False, batch_size=EXPORT_BATCH_SIZE):
+    """Экспорт таблицы в файл (по умолчанию data/<таблица>_export.<формат>)"""
+    path = Path(path or Path('data') / export_filename(table, fmt, compress))
+    chunks = export_stream(db, table, fmt, compress, batch_size)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return path
+
+
+def export_all(db, directory='data', fmt='csv', compress=False, tables=None, workers=None):
+    """Параллельный экспорт нескольких таблиц, по потоку на таблицу
+
+    Каждая таблица читается своим соединением, поэтому выгрузки не мешают
+    друг другу. Возвращает словарь {таблица: путь к файлу}.
+    """
+    tables = list(tables or EXPORT_QUERIES)
+    directory = Path(directory)
+
+    with ThreadPoolExecutor(max_workers=workers or len(tables)) as executor:
+        futures = {
+            table: executor.submit(export_to_file, db, table, fmt,
+                                   directory / export_filename(table, fmt, compress), compress)
+            for table in tables
+        }
+        return {table: future.result() for table, future in futures.items()}
+
+
+def _csv_chunks(columns, rows):
+    """CSV в utf-8 с BOM (как прежний экспорт, чтобы Excel понимал кириллицу)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+
+    for batch in rows:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _xlsx_chunks(columns, rows, title):
+    """XLSX через write_only-книгу openpyxl"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(list(columns))
+    for batch in rows:
+        for row in batch:
+            sheet.append(list(row))
+
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        yield from iter(lambda: f.read(FILE_BLOCK_SIZE), b'')
+
+
+def _typed_columns(columns, batch):
+    """Значения порции по столбцам, приведенные к типам EXPORT_COLUMN_TYPES"""
+    data = {}
+    for i, name in enumerate(columns):
+        cast = EXPORT_COLUMN_TYPES.get(name, str)
+        data[name] = [None if row[i] is None else cast(row[i]) for row in batch]
+    return data
+
+
+def _parquet_chunks(columns, rows):
+    """Parquet: каждая порция - отдельная группа строк"""
+    pa, pq = _require_pyarrow()
+    arrow_types = {int: pa.int64(), float: pa.float64(), str: pa.string()}
+    schema = pa.schema([pa.field(name, arrow_types[EXPORT_COLUMN_TYPES.get(name, str)])
+                        for name in columns])
+
+    with tempfile.TemporaryFile() as f:
+        writer = pq.ParquetWriter(f, schema)
+        for batch in rows:
+            writer.write_table(pa.Table.from_pydict(_typed_columns(columns, batch), schema=schema))
+        writer.close()
+
+        f.seek(0)
+        yield from iter(lambda: f.read(FILE_BLOCK_SIZE), b'')
+
+
+def _gzip_chunks(chunks):
+    """Сжатие потока в формат gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _require_pyarrow():
+    """Импорт pyarrow (необязательная зависимость)"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("для экспорта в Parquet нужен pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
@@ -4,8 +4,12 @@
 import pandas as pd
 import os
 
-def read_excel_files():
-    """Читает все Excel файлы и выводит их структуру"""
+def read_excel_files(force=False):
+    """Читает все Excel файлы и выводит их структуру
+    
+    Файл, CSV-копия которого новее самого файла, не перечитывается
+    (force=True - конвертировать все файлы).
+    """
     
     excel_files = [
         'Material_type_import.xlsx',
@@ -16,7 +20,11 @@ def read_excel_files():
     ]
     
     for file in excel_files:
-        if os.path.exists(file):
+        csv_file = file.replace('.xlsx', '.csv')
+        if (not force and os.path.exists(file) and os.path.exists(csv_file)
+                and os.path.getmtime(csv_file) >= os.path.getmtime(file)):
+            print(f"\nФайл {file} не изменился, {csv_file} актуален")
+        elif os.path.exists(file):
             print(f"\n{'='*60}")
             print(f"Файл: {file}")
             print('='*60)
@@ -29,7 +37,6 @@ def read_excel_files():
                 print(df.head(3).to_string())
                 
                 # Сохраняем в CSV для удобства импорта
-                csv_file = file.replace('.xlsx', '.csv')
                 df.to_csv(csv_file, index=False, encoding='utf-8-sig')
                 print(f"\nСохранено в: {csv_file}")
                 
@@ -40,4 +47,5 @@ def read_excel_files():
 
 if __name__ == "__main__":
     print("Анализ файлов импорта...")
-    read_excel_files()
+    import sys
+    read_excel_files(force='--force' in sys.argv)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест: Flask (web_app) против асинхронного API (api_async)
+
+Одни и те же GET-запросы отправляются concurrency одновременными клиентами
+в оба приложения; считаются запросы в секунду и перцентили задержки.
+По умолчанию приложения вызываются в процессе: Flask - как WSGI через
+тестовые клиенты в потоках, ASGI - напрямую из цикла событий. С --flask-url
+и --asgi-url тест идет по HTTP к запущенным серверам.
+
+Использование:
+    python scripts/load_test.py [--requests N] [--concurrency C] [--path /api/stats ...]
+                                [--no-cache] [--db файл.db]
+                                [--flask-url http://127.0.0.1:5000 --asgi-url http://127.0.0.1:8001]
+"""
+import argparse
+import asyncio
+import http.client
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Запросы по умолчанию: одинаковые одновременные запросы - типичная волна
+# обращений к популярной странице. Только пути, которые есть в обоих
+# приложениях (в web_app нет /api/search): иначе ответы 404 попадут в сравнение
+DEFAULT_PATHS = ['/api/stats', '/api/products?limit=100', '/api/lookups']
+
+
+def summary(name, latencies, elapsed, errors):
+    """Строка итогов: запросы в секунду и перцентили задержки"""
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    count = len(latencies)
+    return (f"  {name:6} {count / elapsed:9.0f} зап/с   p50 {percentile(0.5):7.2f} мс   "
+            f"p95 {percentile(0.95):7.2f} мс   p99 {percentile(0.99):7.2f} мс   "
+            f"среднее {statistics.mean(latencies) * 1000:7.2f} мс   ошибок {errors}")
+
+
+def run_threads(request, total, concurrency):
+    """total запросов из concurrency потоков; request() возвращает код ответа"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        local = []
+        local_errors = 0
+        send = request()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            start = time.perf_counter()
+            if send() >= 400:
+                local_errors += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, errors
+
+
+def flask_client(app, path):
+    """Фабрика отправителя запросов во Flask в процессе (свой клиент на поток)"""
+    def factory():
+        client = app.test_client()
+
+        def send():
+            response = client.get(path)
+            response.get_data()
+            return response.status_code
+        return send
+    return factory
+
+
+def http_client(base_url, path):
+    """Фабрика отправителя запросов по HTTP (свое соединение keep-alive на поток)"""
+    url = urlsplit(base_url)
+
+    def factory():
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+
+        def send():
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        return send
+    return factory
+
+
+async def call_asgi(app, path):
+    """Вызвать ASGI-приложение в процессе, вернуть код ответа"""
+    target, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': 'GET', 'path': target,
+             'query_string': query.encode('utf-8'), 'headers': []}
+    status = 500
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_asgi(app, path, total, concurrency):
+    """total запросов к ASGI-приложению из concurrency задач"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        while next(remaining, None) is not None:
+            start = time.perf_counter()
+            if await call_asgi(app, path) >= 400:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, errors
+
+
+def main():
+    """Запуск нагрузочного теста"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест Flask и асинхронного API")
+    parser.add_argument('--requests', type=int, default=2000, help="запросов на каждый путь")
+    parser.add_argument('--concurrency', type=int, default=50, help="одновременных клиентов")
+    parser.add_argument('--path', action='append', help="путь запроса (можно несколько раз)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="без кэша готовых ответов: каждый запрос доходит до БД")
+    parser.add_argument('--db', help="файл SQLite вместо БД из config.ini")
+    parser.add_argument('--flask-url', help="адрес запущенного web_app")
+    parser.add_argument('--asgi-url', help="адрес запущенного api_async")
+    args = parser.parse_args()
+    paths = args.path or DEFAULT_PATHS
+
+    flask_app = asgi_app = None
+    if not args.flask_url:
+        import web_app
+        flask_app = web_app.app
+        if args.db:
+            from scripts.db_manager_sqlite import DatabaseManager
+            web_app.db.close()
+            web_app.db = DatabaseManager(args.db)
+            web_app.db.use_metrics(web_app.metrics)
+        if args.no_cache:
+            web_app.response_cache.max_entries = 0
+    if not args.asgi_url:
+        import api_async
+        # Тест вызывает приложение без lifespan: БД открываем сами
+        if args.db:
+            from scripts.db_manager_sqlite import DatabaseManager
+            db = DatabaseManager(args.db)
+        else:
+            from scripts.repository import open_database
+            db = open_database()
+        asgi_app = api_async.AsyncApi(db=db, cache=not args.no_cache)
+
+    print(f"запросов на путь: {args.requests}, одновременно: {args.concurrency}"
+          f"{', без кэша ответов' if args.no_cache else ''}")
+    for path in paths:
+        print(f"\n{path}")
+        if flask_app is not None:
+            factory = flask_client(flask_app, path)
+        else:
+            factory = http_client(args.flask_url, path)
+        print(summary('flask', *run_threads(factory, args.requests, args.concurrency)))
+
+        if asgi_app is not None:
+            result = asyncio.run(run_asgi(asgi_app, path, args.requests, args.concurrency))
+        else:
+            result = run_threads(http_client(args.asgi_url, path), args.requests, args.concurrency)
+        print(summary('asgi', *result))
+
+    if asgi_app is not None:
+        print(f"\nобъединение запросов asgi: {asgi_app.coalescer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
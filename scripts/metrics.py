@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Метрики производительности и журнал медленных запросов
+
+Собираются:
+    время ответа по маршрутам веб-приложения (гистограммы);
+    время и число строк запросов к БД по методу менеджера, ошибки запросов;
+    время ожидания соединения из пула.
+Metrics.render() отдает все в текстовом формате Prometheus (маршрут /metrics).
+Запросы дольше порога пишутся в журнал медленных запросов (logging,
+файл из config.ini или stderr) и хранятся в памяти последние из них.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Сколько последних медленных запросов держать в памяти
+SLOW_QUERIES_KEEP = 100
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как histogram в Prometheus)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Инициализация гистограммы"""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Учесть значение (вызывается под блокировкой реестра)"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """Строки формата Prometheus: накопительные корзины, сумма и количество"""
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            result.append(f'{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}')
+        result.append(f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}')
+        result.append(f'{name}_sum{_labels(labels)} {_number(self.sum)}')
+        result.append(f'{name}_count{_labels(labels)} {self.count}')
+        return result
+
+
+class Metrics:
+    """Реестр метрик процесса (потокобезопасный)"""
+
+    def __init__(self, slow_query_threshold=0.1, slow_query_log=None):
+        """Инициализация реестра
+
+        slow_query_threshold - порог медленного запроса в секундах,
+        slow_query_log - файл журнала медленных запросов (None - stderr).
+        """
+        self.slow_query_threshold = slow_query_threshold
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+        self.requests = {}       # (метод HTTP, маршрут) -> Histogram
+        self.responses = {}      # (метод HTTP, маршрут, код ответа) -> количество
+        self.queries = {}        # метод менеджера -> Histogram
+        self.query_rows = {}     # метод менеджера -> число строк
+        self.query_errors = {}   # метод менеджера -> число ошибок
+        self.pool_wait = Histogram()
+        self.slow_queries = deque(maxlen=SLOW_QUERIES_KEEP)
+        self.slow_query_count = 0
+
+        self.slow_log = logging.getLogger('furniture.slow_queries')
+        if not self.slow_log.handlers:
+            handler = logging.FileHandler(slow_query_log, encoding='utf-8') if slow_query_log \
+                else logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.slow_log.addHandler(handler)
+            self.slow_log.setLevel(logging.WARNING)
+            self.slow_log.propagate = False
+
+    def observe_request(self, method, route, status, seconds):
+        """Учесть обработанный HTTP-запрос"""
+        with self._lock:
+            histogram = self.requests.get((method, route))
+            if histogram is None:
+                histogram = self.requests[(method, route)] = Histogram()
+            histogram.observe(seconds)
+            key = (method, route, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def observe_query(self, name, seconds, rows, query=None, error=False):
+        """Учесть запрос к БД, выполненный методом менеджера name"""
+        with self._lock:
+            histogram = self.queries.get(name)
+            if histogram is None:
+                histogram = self.queries[name] = Histogram()
+            histogram.observe(seconds)
+            self.query_rows[name] = self.query_rows.get(name, 0) + rows
+            if error:
+                self.query_errors[name] = self.query_errors.get(name, 0) + 1
+
+        if seconds >= self.slow_query_threshold:
+            sql = ' '.join((query or '').split())
+            entry = {'time': time.time(), 'method': name, 'ms': round(seconds * 1000, 1),
+                     'rows': rows, 'error': error, 'query': sql[:1000]}
+            with self._lock:
+                self.slow_queries.append(entry)
+                self.slow_query_count += 1
+            self.slow_log.warning("%.1f мс %s строк=%d%s: %s", entry['ms'], name, rows,
+                                  ' ОШИБКА' if error else '', entry['query'])
+
+    def observe_pool_wait(self, seconds):
+        """Учесть ожидание соединения из пула"""
+        with self._lock:
+            self.pool_wait.observe(seconds)
+
+    def recent_slow_queries(self, limit=None):
+        """Последние медленные запросы, новые первыми"""
+        with self._lock:
+            entries = list(self.slow_queries)[::-1]
+        return entries[:limit] if limit else entries
+
+    def render(self, gauges=None):
+        """Все метрики в текстовом формате Prometheus
+
+        gauges - дополнительные мгновенные значения {имя: (описание, значение)}.
+        """
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            header('http_request_duration_seconds', 'histogram', 'Время обработки HTTP-запроса')
+            for (method, route), histogram in sorted(self.requests.items()):
+                lines.extend(histogram.lines('http_request_duration_seconds',
+                                             {'method': method, 'route': route}))
+
+            header('http_responses_total', 'counter', 'Ответы по коду статуса')
+            for (method, route, status), count in sorted(self.responses.items()):
+                lines.append(f'http_responses_total'
+                             f'{_labels({"method": method, "route": route, "status": status})} {count}')
+
+            header('db_query_duration_seconds', 'histogram', 'Время запроса к БД по методу менеджера')
+            for name, histogram in sorted(self.queries.items()):
+                lines.extend(histogram.lines('db_query_duration_seconds', {'method': name}))
+
+            header('db_query_rows_total', 'counter', 'Строк прочитано или изменено')
+            for name, rows in sorted(self.query_rows.items()):
+                lines.append(f'db_query_rows_total{_labels({"method": name})} {rows}')
+
+            header('db_query_errors_total', 'counter', 'Ошибки запросов к БД')
+            for name, count in sorted(self.query_errors.items()):
+                lines.append(f'db_query_errors_total{_labels({"method": name})} {count}')
+
+            header('db_pool_wait_seconds', 'histogram', 'Ожидание соединения из пула')
+            lines.extend(self.pool_wait.lines('db_pool_wait_seconds', {}))
+
+            header('db_slow_queries_total', 'counter',
+                   f'Запросы дольше {_number(self.slow_query_threshold)} с')
+            lines.append(f'db_slow_queries_total {self.slow_query_count}')
+
+        header('process_uptime_seconds', 'gauge', 'Время работы процесса')
+        lines.append(f'process_uptime_seconds {_number(time.time() - self._started)}')
+
+        for name, (text, value) in (gauges or {}).items():
+            header(name, 'gauge', text)
+            lines.append(f'{name} {_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    """Число в формате Prometheus"""
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, **extra):
+    """Метки в фигурных скобках с экранированием значений"""
+    items = dict(labels, **extra)
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for v in items.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(items, escaped)) + '}'
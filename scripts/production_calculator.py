@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Расчет сырья и времени производства продукции
+
+Формулы те же, что в server.js (POST /api/calculate-material):
+    сырье = ceil(param1 * param2 * коэффициент_типа * (1 + процент_потерь) * количество)
+    время = ceil(сумма production_time_hours по цехам маршрута * количество)
+При ошибке (неизвестный продукт или тип, неположительные параметры) возвращается -1.
+"""
+import math
+
+import numpy as np
+
+
+class ProductionCalculator:
+    """Калькулятор по предзагруженным массивам коэффициентов
+
+    Массивы упорядочены по product_id, поэтому пакетный расчет находит
+    продукты через np.searchsorted и считает все заказы одной векторной
+    операцией, без цикла на Python.
+    """
+
+    def __init__(self, product_ids, type_coefficients, waste_percentages, unit_hours,
+                 types=None, materials=None):
+        """Инициализация из массивов, упорядоченных по product_id"""
+        order = np.argsort(np.asarray(product_ids, dtype=np.int64), kind='stable')
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)[order]
+        self.type_coefficients = np.asarray(type_coefficients, dtype=np.float64)[order]
+        self.waste_percentages = np.asarray(waste_percentages, dtype=np.float64)[order]
+        self.unit_hours = np.asarray(unit_hours, dtype=np.float64)[order]
+
+        # Словари для расчета по одному заказу и по типам
+        self._index = {int(pid): i for i, pid in enumerate(self.product_ids)}
+        self.types = types or {}
+        self.materials = materials or {}
+
+    @classmethod
+    def from_database(cls, db):
+        """Загрузить коэффициенты из БД (DatabaseManager)"""
+        rows = db.execute_query("""
+            SELECT
+                p.product_id,
+                pt.type_coefficient,
+                mt.waste_percentage,
+                IFNULL(r.hours, 0) as unit_hours
+            FROM Products p
+            JOIN Product_types pt ON p.product_type_id = pt.product_type_id
+            JOIN Material_types mt ON p.material_type_id = mt.material_type_id
+            LEFT JOIN (
+                SELECT product_id, SUM(production_time_hours) as hours
+                FROM Product_workshops
+                GROUP BY product_id
+            ) r ON r.product_id = p.product_id
+        """) or []
+        types = db.execute_query("SELECT product_type_id, type_coefficient FROM Product_types") or []
+        materials = db.execute_query("SELECT material_type_id, waste_percentage FROM Material_types") or []
+
+        return cls(
+            [row['product_id'] for row in rows],
+            [_nan_if_none(row['type_coefficient']) for row in rows],
+            [_nan_if_none(row['waste_percentage']) for row in rows],
+            [row['unit_hours'] for row in rows],
+            types={row['product_type_id']: row['type_coefficient'] for row in types},
+            materials={row['material_type_id']: row['waste_percentage'] for row in materials},
+        )
+
+    def calculate_material(self, product_type_id, material_type_id, quantity, param1, param2):
+        """Количество сырья по типу продукции и типу материала (как в server.js)"""
+        coefficient = self.types.get(product_type_id)
+        waste = self.materials.get(material_type_id)
+        if coefficient is None or waste is None:
+            return -1
+        if quantity <= 0 or param1 <= 0 or param2 <= 0:
+            return -1
+
+        material_per_unit = param1 * param2 * coefficient
+        material_with_waste = material_per_unit * (1 + waste)
+        return math.ceil(material_with_waste * quantity)
+
+    def calculate_order(self, product_id, quantity, param1, param2):
+        """Расчет одного заказа: (сырье, часы производства)"""
+        i = self._index.get(product_id)
+        if i is None or quantity <= 0:
+            return -1, -1
+
+        hours = math.ceil(self.unit_hours[i] * quantity)
+        coefficient = self.type_coefficients[i]
+        waste = self.waste_percentages[i]
+        if param1 <= 0 or param2 <= 0 or math.isnan(coefficient) or math.isnan(waste):
+            return -1, hours
+
+        material_per_unit = param1 * param2 * coefficient
+        material_with_waste = material_per_unit * (1 + waste)
+        return math.ceil(material_with_waste * quantity), hours
+
+    def calculate_batch(self, product_ids, quantities, param1, param2):
+        """Векторный расчет пакета заказов
+
+        Принимает массивы одинаковой длины, возвращает словарь массивов
+        material_needed и production_hours (-1 для ошибочных заказов).
+        """
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.float64)
+        param1 = np.asarray(param1, dtype=np.float64)
+        param2 = np.asarray(param2, dtype=np.float64)
+
+        if len(self.product_ids) == 0:
+            missing = np.full(len(product_ids), -1, dtype=np.int64)
+            return {'material_needed': missing, 'production_hours': missing.copy()}
+
+        pos = np.searchsorted(self.product_ids, product_ids)
+        pos = np.minimum(pos, len(self.product_ids) - 1)
+        found = (self.product_ids[pos] == product_ids) & (quantities > 0)
+
+        coefficient = self.type_coefficients[pos]
+        waste = self.waste_percentages[pos]
+        with np.errstate(invalid='ignore'):
+            material_per_unit = param1 * param2 * coefficient
+            material_with_waste = material_per_unit * (1 + waste)
+            material = np.ceil(material_with_waste * quantities)
+            hours = np.ceil(self.unit_hours[pos] * quantities)
+
+        valid = found & (param1 > 0) & (param2 > 0) & ~np.isnan(material)
+        return {
+            'material_needed': np.where(valid, material, -1).astype(np.int64),
+            'production_hours': np.where(found, hours, -1).astype(np.int64),
+        }
+
+
+def _nan_if_none(value):
+    """None -> NaN для числовых массивов"""
+    return float('nan') if value is None else value
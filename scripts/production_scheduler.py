@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Планирование загрузки цехов
+
+Каждый заказ (продукт и количество) проходит цеха своего маршрута из
+Product_workshops по очереди: этапы упорядочены по типу цеха
+(проектирование -> обработка -> сушка -> сборка), внутри этапа - по
+priority и workshop_id. Операция занимает одного сотрудника цеха на
+production_time_hours * количество часов, в цехе одновременно выполняется
+не больше staff_count операций. Неактивные цеха не используются: заказы,
+маршрут которых проходит через них, не планируются.
+
+Планировщик списочный: готовые операции извлекаются из кучи по времени
+готовности, каждой назначается сотрудник цеха, освобождающийся раньше всех
+(куча моментов освобождения на цех). Сложность O(N log N) по числу операций.
+"""
+import heapq
+
+# Порядок этапов производства по типу цеха
+STAGE_ORDER = {
+    'Проектирование': 0,
+    'Обработка': 1,
+    'Сушка': 2,
+    'Сборка': 3,
+}
+
+
+class ProductionScheduler:
+    """Списочный планировщик производства по цехам"""
+
+    def __init__(self, routings, workshops):
+        """Инициализация
+
+        routings - {product_id: [(workshop_id, часы на единицу), ...]} в порядке маршрута,
+        workshops - {workshop_id: {'workshop_name', 'staff_count', 'is_active'}}.
+        """
+        self.routings = routings
+        self.workshops = workshops
+
+    @classmethod
+    def from_database(cls, db):
+        """Загрузить маршруты и цеха из БД (DatabaseManager)"""
+        workshops = {
+            row['workshop_id']: row
+            for row in db.execute_query(
+                "SELECT workshop_id, workshop_name, workshop_type, staff_count, is_active FROM Workshops"
+            ) or []
+        }
+        rows = db.execute_query("""
+            SELECT product_id, workshop_id, production_time_hours, priority
+            FROM Product_workshops
+        """) or []
+
+        def route_key(row):
+            workshop = workshops.get(row['workshop_id'], {})
+            stage = STAGE_ORDER.get(workshop.get('workshop_type'), len(STAGE_ORDER))
+            return (row['product_id'], stage, row['priority'] or 0, row['workshop_id'])
+
+        routings = {}
+        for row in sorted(rows, key=route_key):
+            routings.setdefault(row['product_id'], []).append(
+                (row['workshop_id'], row['production_time_hours'] or 0.0)
+            )
+
+        return cls(routings, workshops)
+
+    def schedule(self, orders, details=True):
+        """Спланировать пакет заказов
+
+        orders - список словарей {'product_id', 'quantity'}. Возвращает словарь
+        с makespan (часы до завершения всех заказов), загрузкой цехов и, если
+        details=True, сроками начала и окончания каждого заказа.
+        """
+        # Свободные сотрудники: на каждый активный цех куча моментов освобождения
+        free_at = {}
+        busy_hours = {}
+        operations = {}
+        for workshop_id, workshop in self.workshops.items():
+            if workshop.get('is_active', 1):
+                free_at[workshop_id] = [0.0] * max(1, workshop.get('staff_count') or 1)
+                busy_hours[workshop_id] = 0.0
+                operations[workshop_id] = 0
+
+        unscheduled = []
+        ready = []
+        starts = {}
+        finishes = {}
+
+        for index, order in enumerate(orders):
+            route = self.routings.get(order['product_id'])
+            if not route:
+                unscheduled.append({'index': index, 'product_id': order['product_id'],
+                                    'reason': 'нет маршрута'})
+                continue
+            if any(workshop_id not in free_at for workshop_id, _ in route):
+                unscheduled.append({'index': index, 'product_id': order['product_id'],
+                                    'reason': 'маршрут проходит через неактивный цех'})
+                continue
+            # (время готовности, номер заказа, номер операции в маршруте)
+            ready.append((0.0, index, 0))
+
+        heapq.heapify(ready)
+        makespan = 0.0
+
+        while ready:
+            ready_time, index, step = heapq.heappop(ready)
+            order = orders[index]
+            workshop_id, unit_hours = self.routings[order['product_id']][step]
+            duration = unit_hours * order['quantity']
+
+            # Сотрудник цеха, который освобождается раньше всех
+            staff = free_at[workshop_id]
+            start = max(ready_time, staff[0])
+            finish = start + duration
+            heapq.heapreplace(staff, finish)
+
+            busy_hours[workshop_id] += duration
+            operations[workshop_id] += 1
+            if step == 0:
+                starts[index] = start
+
+            if step + 1 < len(self.routings[order['product_id']]):
+                heapq.heappush(ready, (finish, index, step + 1))
+            else:
+                finishes[index] = finish
+                makespan = max(makespan, finish)
+
+        utilization = []
+        for workshop_id in free_at:
+            workshop = self.workshops[workshop_id]
+            staff_count = len(free_at[workshop_id])
+            capacity = staff_count * makespan
+            utilization.append({
+                'workshop_id': workshop_id,
+                'workshop_name': workshop.get('workshop_name'),
+                'staff_count': staff_count,
+                'operations': operations[workshop_id],
+                'busy_hours': round(busy_hours[workshop_id], 2),
+                'utilization': round(busy_hours[workshop_id] / capacity, 4) if capacity else 0.0,
+            })
+
+        result = {
+            'makespan_hours': round(makespan, 2),
+            'scheduled_orders': len(finishes),
+            'workshops': utilization,
+            'unscheduled': unscheduled,
+        }
+        if details:
+            result['orders'] = [
+                {
+                    'index': index,
+                    'product_id': orders[index]['product_id'],
+                    'quantity': orders[index]['quantity'],
+                    'start_hours': round(starts[index], 2),
+                    'finish_hours': round(finishes[index], 2),
+                }
+                for index in sorted(finishes)
+            ]
+        return result
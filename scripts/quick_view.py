@@ -1,4 +1,4 @@
-from db_manager import DatabaseManager
+from repository import open_database
 import sys
 
 def main():
@@ -13,7 +13,7 @@ def main():
     command = sys.argv[1].lower()
     
     try:
-        db = DatabaseManager()
+        db = open_database()
         
         if command == 'products':
             products = db.get_products(limit=10)
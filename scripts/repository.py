@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Выбор бэкенда БД по config.ini и асинхронный интерфейс
+
+Секция [database] в config.ini:
+    backend = sqlite | mysql
+    path = database/furniture_company.db    (SQLite, путь от корня проекта)
+    host, user, password, database          (MySQL)
+    pool_size = 5, pool_timeout = 30        (оба бэкенда)
+
+Секция [metrics]: slow_query_ms (порог медленного запроса) и slow_query_log.
+
+Другой файл настроек можно задать переменной окружения FURNITURE_CONFIG
+(так бенчмарк запускает web_app на временной копии БД).
+
+Оба менеджера наследуют BaseDatabaseManager и дают одинаковый набор
+методов, поэтому manage.py, quick_view.py и web_app.py работают с любым.
+"""
+import asyncio
+import configparser
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+CONFIG_PATH = ROOT / 'config.ini'
+CONFIG_ENV = 'FURNITURE_CONFIG'
+
+BACKENDS = ('sqlite', 'mysql')
+
+
+def config_path(path=None):
+    """Файл настроек: path, затем FURNITURE_CONFIG, затем config.ini проекта"""
+    return Path(path or os.environ.get(CONFIG_ENV) or CONFIG_PATH)
+
+
+def load_config(path=None):
+    """Настройки подключения из config.ini (значения по умолчанию - SQLite)"""
+    parser = configparser.ConfigParser()
+    parser.read(config_path(path), encoding='utf-8')
+    section = parser['database'] if parser.has_section('database') else {}
+
+    return {
+        'backend': section.get('backend', 'sqlite').strip().lower(),
+        'path': section.get('path', 'database/furniture_company.db'),
+        'host': section.get('host', 'localhost'),
+        'user': section.get('user', 'root'),
+        'password': section.get('password', ''),
+        'database': section.get('database', 'furniture_company'),
+        'pool_size': int(section.get('pool_size', 5)),
+        'pool_timeout': float(section.get('pool_timeout', 30)),
+        'catalog_replica': parser.getboolean('catalog', 'replica', fallback=False),
+    }
+
+
+def load_metrics_config(path=None):
+    """Настройки метрик из config.ini: порог медленного запроса и файл журнала"""
+    parser = configparser.ConfigParser()
+    parser.read(config_path(path), encoding='utf-8')
+    section = parser['metrics'] if parser.has_section('metrics') else {}
+    
+    log_path = section.get('slow_query_log', '').strip()
+    if log_path:
+        log_path = Path(log_path)
+        if not log_path.is_absolute():
+            log_path = ROOT / log_path
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    return {
+        'slow_query_ms': float(section.get('slow_query_ms', 100)),
+        'slow_query_log': log_path or None,
+    }
+
+
+def open_database(config=None, **overrides):
+    """Менеджер БД бэкенда из настроек (config.ini, если config не передан)"""
+    config = dict(config or load_config())
+    config.update(overrides)
+    backend = config['backend']
+
+    if backend == 'sqlite':
+        if __package__:
+            from .db_manager_sqlite import DatabaseManager
+        else:
+            from db_manager_sqlite import DatabaseManager
+        path = Path(config['path'])
+        if not path.is_absolute():
+            path = ROOT / path
+        db = DatabaseManager(path, pool_size=config['pool_size'], pool_timeout=config['pool_timeout'])
+
+    elif backend == 'mysql':
+        # mysql.connector нужен только для этого бэкенда
+        if __package__:
+            from .db_manager import DatabaseManager
+        else:
+            from db_manager import DatabaseManager
+        db = DatabaseManager(config['host'], config['user'], config['password'], config['database'],
+                             pool_size=config['pool_size'], pool_timeout=config['pool_timeout'])
+
+    else:
+        raise ValueError(f"Неизвестный бэкенд БД: {backend} (варианты: {', '.join(BACKENDS)})")
+
+    if config.get('catalog_replica'):
+        if __package__:
+            from .catalog import CatalogReplica
+        else:
+            from catalog import CatalogReplica
+        db.use_catalog(CatalogReplica(db))
+    return db
+
+
+class AsyncDatabase:
+    """Асинхронный интерфейс к менеджеру БД
+
+    Любой метод менеджера вызывается как корутина: он выполняется в пуле
+    потоков размером с пул соединений, так что цикл событий не блокируется,
+    а одновременно к БД идет не больше запросов, чем есть соединений.
+    Генераторы (iter_query, iter_products) так не оборачиваются: их порции
+    читаются через run().
+    """
+
+    def __init__(self, db, workers=None):
+        """Инициализация поверх готового менеджера"""
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=workers or db.pool.size,
+                                            thread_name_prefix='db')
+
+    def __getattr__(self, name):
+        """Корутина-обертка над методом менеджера"""
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнить func(*args, **kwargs) в пуле потоков БД"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def close(self):
+        """Дождаться запросов в работе и остановить пул потоков"""
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class Coalescer:
+    """Объединение одинаковых одновременных вызовов
+
+    Пока вызов с ключом key выполняется, следующие вызовы с тем же ключом
+    не запускают свой, а ждут результат первого. Готовые результаты не
+    хранятся: это не кэш, а защита БД от волны одинаковых запросов. Результат
+    общий для всех ожидающих, изменять его нельзя.
+    """
+
+    def __init__(self):
+        """Инициализация"""
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def run(self, key, factory):
+        """Результат корутины factory() или уже выполняющегося вызова с тем же ключом"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+        else:
+            self.calls += 1
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._inflight.pop(key, None))
+        # Отмена одного ожидающего не должна отменять вызов для остальных
+        return await asyncio.shield(future)
+
+    def stats(self):
+        """Статистика: выполнено вызовов, получено готовых, выполняется сейчас"""
+        return {'calls': self.calls, 'shared': self.shared, 'inflight': len(self._inflight)}
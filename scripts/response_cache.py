@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Кэш готовых HTTP-ответов
+
+Ответ хранится по ключу (маршрут + строка запроса) вместе с версией данных,
+при которой он был построен. После любой записи версия данных растет, и
+старые записи считаются промахом при следующем обращении, поэтому явная
+очистка не нужна. Размер ограничен по числу записей и по объему тел,
+вытесняются давно не использовавшиеся (LRU).
+"""
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Потокобезопасный LRU-кэш тел ответов"""
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, max_entry_bytes=1024 * 1024):
+        """Инициализация кэша"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """Запись {'body', 'mimetype', 'headers'} или None, если ее нет или она устарела"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['version'] != version:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body, mimetype, headers=None):
+        """Сохранить тело ответа; слишком большие ответы не кэшируются"""
+        if len(body) > self.max_entry_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                'version': version,
+                'body': body,
+                'mimetype': mimetype,
+                'headers': headers or {},
+            }
+            self._bytes += len(body)
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Статистика кэша"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key):
+        """Удалить запись (вызывается под блокировкой)"""
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry['body'])
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Потоковое чтение листов XLSX
+
+XML листа разбирается через iterparse прямо из архива: каждая строка
+отдается сразу после разбора, а разобранные элементы удаляются, поэтому
+память не растет с числом строк (кроме таблицы общих строк книги).
+Это в несколько раз быстрее openpyxl (даже в режиме read_only) и не требует
+pandas. Даты и формулы не вычисляются: возвращается сохраненное значение
+ячейки (число, строка или bool).
+"""
+import posixpath
+import zipfile
+from xml.etree.ElementTree import fromstring, iterparse
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+ROW = NS + 'row'
+CELL = NS + 'c'
+VALUE = NS + 'v'
+TEXT = NS + 't'
+SHEET_DATA = NS + 'sheetData'
+
+
+def column_index(ref):
+    """Номер колонки (с 0) по адресу ячейки: A1 -> 0, AB7 -> 27"""
+    index = 0
+    for char in ref:
+        if char.isdigit():
+            break
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def iter_rows(path, sheet=0):
+    """Строки листа (по номеру или имени) как кортежи значений ячеек"""
+    with zipfile.ZipFile(path) as archive:
+        shared = _shared_strings(archive)
+        with archive.open(_sheet_path(archive, sheet)) as f:
+            row = []
+            sheet_data = None
+            for event, element in iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == SHEET_DATA:
+                        sheet_data = element
+                    continue
+
+                tag = element.tag
+                if tag == CELL:
+                    ref = element.get('r')
+                    if ref:
+                        index = column_index(ref)
+                        row.extend([None] * (index - len(row)))
+                    row.append(_cell_value(element, shared))
+                elif tag == ROW:
+                    yield tuple(row)
+                    row = []
+                    # Разобранные строки больше не нужны
+                    sheet_data.clear()
+
+
+def read_xlsx_rows(path, columns, dtype=None):
+    """Кортежи значений указанных колонок (первая строка листа - заголовок)
+
+    Заголовок сверяется с ожидаемыми колонками без учета пробелов по краям,
+    при расхождении - ValueError. Колонки с dtype str приводятся к строке
+    (артикул, сохраненный в Excel числом 1549922, станет '1549922').
+    Полностью пустые строки пропускаются.
+    """
+    rows = iter_rows(path)
+    header = next(rows, ())
+    positions = {str(name).strip(): i for i, name in enumerate(header) if name is not None}
+    missing = [c for c in columns if c.strip() not in positions]
+    if missing:
+        raise ValueError(f"{path}: нет колонок {missing}, в файле: {list(positions)}")
+
+    indexes = [positions[c.strip()] for c in columns]
+    text = [bool(dtype) and dtype.get(c) is str for c in columns]
+    for row in rows:
+        values = tuple(row[i] if i < len(row) else None for i in indexes)
+        if all(v is None for v in values):
+            continue
+        if any(text):
+            values = tuple(_to_text(v) if t else v for v, t in zip(values, text))
+        yield values
+
+
+def _cell_value(cell, shared):
+    """Значение ячейки по типу t"""
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(TEXT))
+
+    value = cell.find(VALUE)
+    if value is None or value.text is None:
+        return None
+    text = value.text
+    if kind == 's':
+        return shared[int(text)]
+    if kind in ('str', 'e'):
+        return text
+    if kind == 'b':
+        return text == '1'
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _to_text(value):
+    """Значение текстовой колонки"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _shared_strings(archive):
+    """Таблица общих строк книги"""
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, element in iterparse(f):
+            if element.tag == NS + 'si':
+                # Текст с форматированием разбит на несколько <r><t>
+                strings.append(''.join(t.text or '' for t in element.iter(TEXT)))
+                element.clear()
+    return strings
+
+
+def _sheet_path(archive, sheet):
+    """Путь к XML листа внутри архива по workbook.xml и его связям"""
+    workbook = fromstring(archive.read('xl/workbook.xml'))
+    sheets = workbook.find(NS + 'sheets').findall(NS + 'sheet')
+    if isinstance(sheet, str):
+        matches = [s for s in sheets if s.get('name') == sheet]
+        if not matches:
+            raise ValueError(f"Лист не найден: {sheet}")
+        entry = matches[0]
+    else:
+        entry = sheets[sheet]
+
+    relations = fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    rel_id = entry.get(REL_NS + 'id')
+    for relation in relations.iter(PACKAGE_REL_NS + 'Relationship'):
+        if relation.get('Id') == rel_id:
+            target = relation.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError(f"Не найден файл листа {entry.get('name')}")
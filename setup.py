@@ -42,10 +42,29 @@ def create_config():
     
     config_content = """# Конфигурация подключения к БД
 [database]
+# бэкенд: sqlite или mysql
+backend = sqlite
+# файл БД SQLite (от корня проекта)
+path = database/furniture_company.db
+# подключение к MySQL
 host = localhost
 user = root
 password = 
 database = furniture_company
+# пул соединений
+pool_size = 5
+pool_timeout = 30
+
+# Метрики (/metrics) и журнал медленных запросов
+[metrics]
+# порог медленного запроса, мс
+slow_query_ms = 100
+# файл журнала медленных запросов от корня проекта (пусто - вывод в консоль)
+slow_query_log = 
+
+# Копия каталога в памяти процесса: продукция и справочники читаются без запросов к БД
+[catalog]
+replica = no
 """
     
     with open('config.ini', 'w', encoding='utf-8') as f:
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Общие фикстуры тестов: БД SQLite из CSV-файлов data/ во временном каталоге"""
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from database.create_sqlite import create_database  # noqa: E402
+from scripts.db_manager_sqlite import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Копия CSV-источников импорта (их можно менять в тесте)"""
+    path = tmp_path / 'data'
+    path.mkdir()
+    for source in (ROOT / 'data').glob('*.csv'):
+        shutil.copy(source, path)
+    return path
+
+
+@pytest.fixture
+def db_path(tmp_path, data_dir):
+    """Файл БД, загруженный из data_dir"""
+    path = tmp_path / 'furniture_company.db'
+    create_database(path, data_dir)
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    """Менеджер БД SQLite (триггеры и агрегаты устанавливаются при подключении)"""
+    manager = DatabaseManager(str(db_path))
+    yield manager
+    manager.close()
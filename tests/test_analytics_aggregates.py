@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Материализованные агрегаты аналитики (триггеры Type_aggregates и Top_products)"""
+import sqlite3
+
+from scripts.db_manager_sqlite import DatabaseManager, TOP_PRODUCTS_SIZE
+
+
+def aggregates(db_path):
+    """Агрегаты по типам: из Type_aggregates и прямым запросом к Products"""
+    with sqlite3.connect(db_path) as connection:
+        stored = connection.execute("""
+            SELECT product_type_id, product_count, price_sum, price_count
+            FROM Type_aggregates WHERE product_count > 0 ORDER BY product_type_id
+        """).fetchall()
+        expected = connection.execute("""
+            SELECT product_type_id, COUNT(*), TOTAL(min_partner_price), COUNT(min_partner_price)
+            FROM Products GROUP BY product_type_id ORDER BY product_type_id
+        """).fetchall()
+    return stored, expected
+
+
+def top_prices(db_path, limit):
+    """Цены самых дорогих товаров прямым запросом к Products"""
+    with sqlite3.connect(db_path) as connection:
+        return [row[0] for row in connection.execute(
+            "SELECT min_partner_price FROM Products ORDER BY min_partner_price DESC LIMIT ?", (limit,)
+        )]
+
+
+def test_aggregates_follow_writes(db, db_path):
+    types = [row['product_type_id'] for row in db.get_product_types()]
+    material_id = db.get_material_types()[0]['material_type_id']
+    product_id = db.execute_query("SELECT MIN(product_id) AS id FROM Products")[0]['id']
+
+    db.add_product("Новый дорогой", "AGG-1", types[0], material_id, 10 ** 7)
+    db.add_product("Новый без цены", "AGG-2", types[-1], material_id, None)
+    db.update_product(product_id, product_type_id=types[1], min_partner_price=1.5)
+    last_id = db.execute_query("SELECT MAX(product_id) AS id FROM Products WHERE article_number NOT LIKE 'AGG-%'")
+    db.delete_product(last_id[0]['id'])
+
+    stored, expected = aggregates(db_path)
+    assert stored == expected
+
+    prices = [row['min_partner_price'] for row in db.get_top_expensive_products(10)]
+    assert prices == top_prices(db_path, 10)
+    assert prices[0] == 10 ** 7
+
+
+def test_rebuild_matches_triggers(db, db_path):
+    db.add_product("Новый", "AGG-3", db.get_product_types()[0]['product_type_id'],
+                   db.get_material_types()[0]['material_type_id'], 123.0)
+    before = aggregates(db_path)[0]
+    db.rebuild_analytics()
+    assert aggregates(db_path)[0] == before
+
+
+def test_top_with_null_prices(db, db_path):
+    type_id = db.get_product_types()[0]['product_type_id']
+    material_id = db.get_material_types()[0]['material_type_id']
+    # Больше TOP_PRODUCTS_SIZE товаров без цены: топ заполнен строками с NULL
+    for i in range(TOP_PRODUCTS_SIZE + 10):
+        db.add_product(f"Без цены {i}", f"NULL-{i}", type_id, material_id, None)
+    db.rebuild_analytics()
+    db.execute_query("UPDATE Products SET min_partner_price = NULL WHERE article_number NOT LIKE 'NULL-%'",
+                     fetch=False)
+
+    # Цена ниже любой другой, но выше NULL - должна попасть в топ
+    db.add_product("Дешевый", "CHEAP-1", type_id, material_id, 5.0)
+    cheap = db.execute_query("SELECT product_id FROM Products WHERE article_number = 'CHEAP-1'")[0]['product_id']
+    prices = [row['min_partner_price'] for row in db.get_top_expensive_products(TOP_PRODUCTS_SIZE)]
+    assert prices == top_prices(db_path, TOP_PRODUCTS_SIZE)
+    assert prices[0] == 5.0
+
+    # Обновление цены товара без цены тоже вытесняет NULL
+    other = db.execute_query("SELECT product_id FROM Products WHERE article_number = 'NULL-0'")[0]['product_id']
+    db.update_product(other, min_partner_price=3.0)
+    db.update_product(cheap, min_partner_price=None)
+    prices = [row['min_partner_price'] for row in db.get_top_expensive_products(TOP_PRODUCTS_SIZE)]
+    assert prices == top_prices(db_path, TOP_PRODUCTS_SIZE)
+    assert prices[0] == 3.0
+
+
+def test_outdated_triggers_are_replaced(db, db_path):
+    db.close()
+    with sqlite3.connect(db_path) as connection:
+        connection.executescript("""
+            DROP TRIGGER trg_products_agg_ins;
+            CREATE TRIGGER trg_products_agg_ins AFTER INSERT ON Products BEGIN SELECT 1; END;
+            DELETE FROM Top_products;
+        """)
+
+    manager = DatabaseManager(str(db_path))
+    try:
+        with sqlite3.connect(db_path) as connection:
+            sql = connection.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'trg_products_agg_ins'"
+            ).fetchone()[0]
+        assert 'Top_products' in sql
+        prices = [row['min_partner_price'] for row in manager.get_top_expensive_products(10)]
+        assert prices == top_prices(db_path, 10)
+    finally:
+        manager.close()
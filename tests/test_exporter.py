@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Потоковый экспорт таблиц (exporter)"""
+from decimal import Decimal
+
+from scripts.exporter import EXPORT_QUERIES, _typed_columns, export_stream
+
+
+def test_parquet_values_follow_declared_types():
+    # В первой порции цена пустая, а MySQL отдает DECIMAL и datetime
+    columns = ['product_id', 'min_partner_price', 'created_at']
+    assert _typed_columns(columns, [(1, None, None), (2, Decimal('10.50'), '2024-01-01 00:00:00')]) == {
+        'product_id': [1, 2],
+        'min_partner_price': [None, 10.5],
+        'created_at': [None, '2024-01-01 00:00:00'],
+    }
+
+
+def test_csv_export_streams_every_table(db):
+    for table in EXPORT_QUERIES:
+        data = b''.join(export_stream(db, table, 'csv', batch_size=7)).decode('utf-8-sig')
+        rows = db.execute_query(EXPORT_QUERIES[table])
+        assert len(data.splitlines()) == len(rows) + 1
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Пакетные изменения продукции (apply_product_batch)"""
+
+from scripts.catalog import CatalogReplica
+
+MISSING_ID = 10 ** 9
+
+
+def product_ids(db):
+    return [row['product_id'] for row in db.execute_query("SELECT product_id FROM Products ORDER BY product_id")]
+
+
+def price(db, product_id):
+    rows = db.execute_query("SELECT min_partner_price FROM Products WHERE product_id = ?", (product_id,))
+    return rows[0]['min_partner_price'] if rows else None
+
+
+def new_product(db, article, **fields):
+    operation = {'op': 'add', 'product_name': f"Пакет {article}", 'article_number': article,
+                 'product_type_id': db.get_product_types()[0]['product_type_id'],
+                 'material_type_id': db.get_material_types()[0]['material_type_id']}
+    operation.update(fields)
+    return operation
+
+
+def test_batch_applies_all_operations(db):
+    first, second, third = product_ids(db)[:3]
+    result = db.apply_product_batch([
+        new_product(db, 'BATCH-1', min_partner_price=10.0),
+        new_product(db, 'BATCH-2'),
+        {'op': 'update', 'product_id': first, 'min_partner_price': 1.0},
+        {'op': 'update', 'product_id': second, 'min_partner_price': 2.0},
+        {'op': 'delete', 'product_id': third},
+    ])
+    assert result['committed']
+    assert result['applied'] == 5 and result['failed'] == 0
+    assert (price(db, first), price(db, second)) == (1.0, 2.0)
+    assert third not in product_ids(db)
+    assert len(db.execute_query("SELECT 1 FROM Products WHERE article_number LIKE 'BATCH-%'")) == 2
+
+
+def test_atomic_batch_rolls_back_on_error(db):
+    first = product_ids(db)[0]
+    before = price(db, first)
+    result = db.apply_product_batch([
+        {'op': 'update', 'product_id': first, 'min_partner_price': 1.0},
+        new_product(db, 'BATCH-3'),
+        new_product(db, 'BATCH-3'),
+        {'op': 'delete', 'product_id': first},
+    ])
+    assert not result['committed']
+    assert result['applied'] == 0 and result['failed'] == 1
+    assert [item['status'] for item in result['items']] == ['rolled_back', 'rolled_back', 'error', 'skipped']
+    assert price(db, first) == before
+    assert not db.execute_query("SELECT 1 FROM Products WHERE article_number = 'BATCH-3'")
+
+
+def test_partial_batch_keeps_successful_rows(db):
+    first = product_ids(db)[0]
+    result = db.apply_product_batch([
+        new_product(db, 'BATCH-4'),
+        new_product(db, 'BATCH-4'),
+        {'op': 'update', 'product_id': first, 'min_partner_price': 1.0},
+    ], atomic=False)
+    assert result['committed']
+    assert [item['status'] for item in result['items']] == ['ok', 'error', 'ok']
+    assert price(db, first) == 1.0
+
+
+def test_malformed_operations_are_rejected_before_writing(db):
+    result = db.apply_product_batch([
+        new_product(db, 'BATCH-5'),
+        {'op': 'update', 'min_partner_price': 1.0},
+        {'op': 'merge', 'product_id': 1},
+        {'op': 'add', 'article_number': 'BATCH-6'},
+    ])
+    assert not result['committed']
+    assert [item['status'] for item in result['items']] == ['skipped', 'error', 'error', 'error']
+    assert not db.execute_query("SELECT 1 FROM Products WHERE article_number LIKE 'BATCH-%'")
+
+
+def test_missing_id_rolls_back_atomic_batch(db):
+    first, second = product_ids(db)[:2]
+    result = db.apply_product_batch([
+        {'op': 'update', 'product_id': first, 'min_partner_price': 1.0},
+        {'op': 'update', 'product_id': MISSING_ID, 'min_partner_price': 2.0},
+        {'op': 'delete', 'product_id': second},
+    ])
+    assert not result['committed']
+    assert result['applied'] == 0
+    assert result['failed'] == 1
+    assert [item['status'] for item in result['items']] == ['rolled_back', 'not_found', 'skipped']
+    assert db.get_product(first)['min_partner_price'] != 1.0
+    assert db.get_product(second) is not None
+
+
+def test_missing_id_reported_in_partial_batch(db):
+    first, second = product_ids(db)[:2]
+    result = db.apply_product_batch([
+        {'op': 'update', 'product_id': first, 'min_partner_price': 1.0},
+        {'op': 'update', 'product_id': MISSING_ID, 'min_partner_price': 2.0},
+        {'op': 'delete', 'product_id': MISSING_ID},
+        {'op': 'delete', 'product_id': second},
+    ], atomic=False)
+    assert result['committed']
+    assert result['applied'] == 2
+    assert result['failed'] == 2
+    assert [item['status'] for item in result['items']] == ['ok', 'not_found', 'not_found', 'ok']
+    assert db.get_product(first)['min_partner_price'] == 1.0
+    assert db.get_product(second) is None
+
+
+def test_update_to_same_value_is_ok(db):
+    first = product_ids(db)[0]
+    price = db.get_product(first)['min_partner_price']
+    result = db.apply_product_batch([{'op': 'update', 'product_id': first, 'min_partner_price': price}])
+    assert result['committed'] and result['applied'] == 1
+
+
+def test_string_product_id_reaches_catalog_replica(db):
+    db.use_catalog(CatalogReplica(db))
+    first = product_ids(db)[0]
+    result = db.apply_product_batch([{'op': 'delete', 'product_id': str(first)}])
+    assert result['committed']
+    assert db.get_product(first) is None
+    assert not db.catalog.verify()
+
+
+def test_non_integer_product_id_is_rejected(db):
+    first = product_ids(db)[0]
+    result = db.apply_product_batch([
+        {'op': 'delete', 'product_id': f"{first}abc"},
+        {'op': 'update', 'product_id': first + 0.5, 'min_partner_price': 1.0},
+        {'op': 'delete', 'product_id': True},
+    ], atomic=False)
+    assert [item['status'] for item in result['items']] == ['error', 'error', 'error']
+    assert db.get_product(first) is not None
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Кэш калькулятора и планировщика производства при записи из другого процесса"""
+import sqlite3
+
+
+def test_calculator_sees_external_writes(db, db_path):
+    type_id = db.get_product_types()[0]['product_type_id']
+    material_id = db.get_material_types()[0]['material_type_id']
+    before = db.calculate_material(type_id, material_id, 100, 2.0, 3.0)
+
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("UPDATE Product_types SET type_coefficient = type_coefficient * 2 "
+                           "WHERE product_type_id = ?", (type_id,))
+    assert db.calculate_material(type_id, material_id, 100, 2.0, 3.0) > before
+
+
+def test_scheduler_sees_external_writes(db, db_path):
+    product_id = db.execute_query("SELECT product_id FROM Product_workshops LIMIT 1")[0]['product_id']
+    orders = [{'product_id': product_id, 'quantity': 10}]
+    before = db.schedule_production(orders)['makespan_hours']
+
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("UPDATE Product_workshops SET production_time_hours = production_time_hours * 3 "
+                           "WHERE product_id = ?", (product_id,))
+    assert db.schedule_production(orders)['makespan_hours'] > before
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Проверка планов запросов (plan_problems, check_query_plans)"""
+from scripts.db_manager_sqlite import plan_problems
+
+QUERY = "SELECT p.product_name FROM Products p JOIN Product_types pt ON p.product_type_id = pt.product_type_id"
+
+
+def test_index_scan_is_a_full_scan():
+    plan = ['SCAN p USING INDEX idx_products_name', 'SEARCH pt USING INTEGER PRIMARY KEY (rowid=?)']
+    assert plan_problems(QUERY, plan) == ['SCAN p USING INDEX idx_products_name']
+    assert plan_problems(QUERY, ['SCAN p USING COVERING INDEX idx_products_material']) != []
+    assert plan_problems(QUERY, plan, scans=('Products',)) == []
+
+
+def test_small_tables_and_searches_pass():
+    plan = ['SEARCH p USING INDEX idx_products_type (product_type_id=?)', 'SCAN pt']
+    assert plan_problems(QUERY, plan) == []
+
+
+def test_checked_methods_have_no_problems(db):
+    assert db.check_query_plans() == []
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Синхронизация рабочей БД с файлами импорта (create_sqlite.py --sync)"""
+import csv
+import json
+import sqlite3
+
+from database.create_sqlite import import_sources, sync_database
+
+
+def edit_source(path, change):
+    """Изменить строки CSV-источника: change(row) правит строку на месте"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))
+    for row in rows[1:]:
+        change(row)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+
+def test_sync_applies_changed_new_and_removed_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    # Состояние файлов как после полной загрузки
+    import_sources(cursor, apply=False, force=True)
+
+    changed, added = [json.loads(key)[0] for (key,) in cursor.execute(
+        "SELECT row_key FROM Import_rows WHERE source = 'Products' ORDER BY row_key LIMIT 2")]
+    # Строка изменилась в файле: в БД старая цена и старый хэш строки
+    cursor.execute("UPDATE Products SET min_partner_price = -1 WHERE article_number = ?", (changed,))
+    cursor.execute("UPDATE Import_rows SET row_hash = 'old' WHERE source = 'Products' AND row_key = ?",
+                   (json.dumps([changed]),))
+    # Строка появилась в файле: ее нет ни в БД, ни в состоянии импорта
+    cursor.execute("DELETE FROM Products WHERE article_number = ?", (added,))
+    cursor.execute("DELETE FROM Import_rows WHERE source = 'Products' AND row_key = ?", (json.dumps([added]),))
+    # Строка исчезла из файла: есть в БД и в состоянии импорта
+    cursor.execute("""
+        INSERT INTO Products (product_name, article_number, product_type_id, material_type_id, min_partner_price)
+        SELECT 'Снятая с производства', 'GONE-1', product_type_id, material_type_id, 1.0 FROM Products LIMIT 1
+    """)
+    cursor.execute("INSERT INTO Import_rows VALUES ('Products', ?, 'old')", (json.dumps(['GONE-1']),))
+
+    report = import_sources(cursor, force=True)
+    stats = report['Products']
+    assert (stats['updated'], stats['inserted'], stats['removed']) == (1, 1, 1)
+
+    def product(article):
+        return cursor.execute("SELECT min_partner_price, is_available FROM Products WHERE article_number = ?",
+                              (article,)).fetchone()
+    assert product(changed)[0] != -1
+    assert product(added) is not None
+    assert product('GONE-1')[1] == 0
+
+    # Повторная синхронизация ничего не меняет
+    report = import_sources(cursor)
+    assert all(stats['inserted'] == stats['updated'] == stats['removed'] == 0 for stats in report.values()
+               if isinstance(stats, dict))
+    connection.close()
+
+
+def test_sync_changed_rows_with_triggers(db, db_path, data_dir):
+    # Менеджер уже установил триггеры агрегатов; закрываем его перед синхронизацией
+    db.close()
+    types = [row[0] for row in csv.reader(open(data_dir / 'Product_type_import.csv', encoding='utf-8-sig'))][1:]
+
+    def change(row):
+        row[3] = str(float(row[3]) + 1)
+        if row[2].endswith('2'):
+            row[0] = types[(types.index(row[0]) + 1) % len(types)]
+    edit_source(data_dir / 'Products_import.csv', change)
+
+    report = sync_database(db_path=db_path, data_dir=data_dir)
+    assert report['Products']['updated'] > 0
+
+    with sqlite3.connect(db_path) as connection:
+        aggregates = connection.execute("""
+            SELECT product_type_id, product_count, price_sum, price_count
+            FROM Type_aggregates WHERE product_count > 0 ORDER BY product_type_id
+        """).fetchall()
+        expected = connection.execute("""
+            SELECT product_type_id, COUNT(*), TOTAL(min_partner_price), COUNT(min_partner_price)
+            FROM Products GROUP BY product_type_id ORDER BY product_type_id
+        """).fetchall()
+        assert aggregates == expected
+
+        top = connection.execute("SELECT product_id FROM Top_products ORDER BY product_id").fetchall()
+        products = connection.execute("SELECT product_id FROM Products ORDER BY product_id").fetchall()
+        assert top == products
+
+
+def test_returned_row_makes_product_available(db_path, data_dir):
+    source = data_dir / 'Products_import.csv'
+    original = source.read_bytes()
+    with open(source, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))
+    article = rows[1][2]
+    with open(source, 'w', encoding='utf-8-sig', newline='') as f:
+        csv.writer(f).writerows(rows[:1] + rows[2:])
+
+    def available():
+        with sqlite3.connect(db_path) as connection:
+            return connection.execute("SELECT is_available FROM Products WHERE article_number = ?",
+                                      (article,)).fetchone()[0]
+
+    assert sync_database(db_path=db_path, data_dir=data_dir)['Products']['removed'] == 1
+    assert available() == 0
+
+    # Строка вернулась в файл: позиция снова в продаже
+    source.write_bytes(original)
+    assert sync_database(db_path=db_path, data_dir=data_dir)['Products']['inserted'] == 1
+    assert available() == 1
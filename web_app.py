@@ -1,51 +1,188 @@
 # веб приложение для мебельной компании
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-from scripts.db_manager_sqlite import DatabaseManager
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context, g, abort
+from scripts.repository import open_database, load_metrics_config
+from scripts.response_cache import ResponseCache
+from scripts.metrics import Metrics
+from scripts.exporter import export_stream, export_filename, export_mimetype
+from scripts.analytics_engine import AnalyticsEngine, parse_report_params
 from pathlib import Path
+from functools import wraps
+from datetime import datetime, timezone
+import time
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'furniture-company-secret-key'
 
-# Инициализация БД
-db = DatabaseManager()
+# Инициализация БД (бэкенд из config.ini; пул соединений, по одному соединению на запрос)
+db = open_database()
+
+# Кэш готовых ответов GET-страниц и апи (сбрасывается версией данных БД)
+response_cache = ResponseCache()
+
+# Метрики: время маршрутов, запросов к БД и ожидания пула, журнал медленных запросов
+metrics_config = load_metrics_config()
+metrics = Metrics(metrics_config['slow_query_ms'] / 1000, metrics_config['slow_query_log'])
+db.use_metrics(metrics)
+
+# Отчеты с группировкой по колоночному снимку каталога в памяти
+analytics_engine = AnalyticsEngine(db)
+
+@app.before_request
+def acquire_connection():
+    # взять соединение из пула на время запроса (ожидание входит во время запроса)
+    g.request_started = time.perf_counter()
+    db.acquire()
+
+@app.after_request
+def record_request_time(response):
+    # время обработки по шаблону маршрута (не по пути, чтобы не плодить метки)
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(request.method, route, response.status_code,
+                                time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def release_connection(exc):
+    # вернуть соединение в пул
+    db.release()
+
+def cached_response(view):
+    # кэш ответа по маршруту и строке запроса, плюс ETag/Last-Modified и 304;
+    # любая запись через db меняет версию данных, и кэш с тегом устаревают
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag, modified_at = db.data_state()
+        last_modified = datetime.fromtimestamp(int(modified_at), timezone.utc)
+        # дата с точностью до секунды надежна, только когда секунда изменения прошла:
+        # иначе следующая запись в ту же секунду даст ту же дату и клиент получит 304
+        # на устаревший ответ; до этого Last-Modified не отдается, проверка - по ETag
+        dated = int(modified_at) < int(time.time())
+        
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = (dated and request.if_modified_since is not None
+                            and last_modified <= request.if_modified_since)
+        
+        if not_modified:
+            response = Response(status=304)
+        else:
+            key = request.full_path
+            entry = response_cache.get(key, etag)
+            if entry is not None:
+                response = Response(entry['body'], content_type=entry['mimetype'])
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if not response.is_streamed:
+                    response_cache.put(key, etag, response.get_data(), response.content_type)
+        
+        response.set_etag(etag)
+        if dated:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
 
 @app.route('/')
+@cached_response
 def index():
     # главная страница
     stats = db.get_statistics()
     return render_template('index.html', stats=stats)
 
 @app.route('/products')
+@cached_response
 def products():
-    # список продукции
+    # список продукции: постранично, с сортировкой и фильтрами
     search = request.args.get('search', '')
+    sort = request.args.get('sort', 'name')
+    order = request.args.get('order', 'asc')
+    product_type_id = request.args.get('type', type=int)
+    material_type_id = request.args.get('material', type=int)
+    available = request.args.get('available', '')
+    is_available = int(available) if available in ('0', '1') else None
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    if sort not in db.SORT_COLUMNS:
+        sort = 'name'
+    if order not in ('asc', 'desc'):
+        order = 'asc'
     
     if search:
-        products_list = db.search_products(search)
+        # результаты поиска упорядочены по релевантности, показываем первые limit
+        page = {'items': db.search_products(search, limit=limit) or [],
+                'next': None, 'prev': None, 'total': None}
     else:
-        products_list = db.get_products()
+        try:
+            page = db.get_products_listing(sort=sort, order=order,
+                                           product_type_id=product_type_id,
+                                           material_type_id=material_type_id,
+                                           is_available=is_available, limit=limit,
+                                           after=request.args.get('after'),
+                                           before=request.args.get('before'))
+        except ValueError:
+            return redirect(url_for('products'))
+        if page is None:
+            page = {'items': [], 'next': None, 'prev': None, 'total': None}
     
-    return render_template('products.html', products=products_list, search=search)
+    # текущие параметры страницы без курсоров - для ссылок сортировки и пагинации
+    query = {key: value for key, value in request.args.items()
+             if key not in ('after', 'before') and value != ''}
+    
+    def products_url(**changes):
+        params = dict(query)
+        params.update(changes)
+        return url_for('products', **{k: v for k, v in params.items() if v is not None})
+    
+    return render_template('products.html',
+                         products=page['items'],
+                         page=page,
+                         search=search,
+                         sort=sort,
+                         order=order,
+                         product_type_id=product_type_id,
+                         material_type_id=material_type_id,
+                         available=available,
+                         limit=limit,
+                         product_types=db.get_lookup('product_types').rows,
+                         material_types=db.get_lookup('material_types').rows,
+                         products_url=products_url)
 
 @app.route('/products/add', methods=['GET', 'POST'])
 def add_product():
-    # добавить продукцию
+    # добавить продукцию (справочники - из кэша менеджера, без запросов к БД)
+    product_types = db.get_lookup('product_types')
+    material_types = db.get_lookup('material_types')
+    
     if request.method == 'POST':
         name = request.form['name']
         article = request.form['article']
-        product_type_id = request.form['product_type_id']
-        material_type_id = request.form['material_type_id']
+        product_type_id = request.form.get('product_type_id', type=int)
+        material_type_id = request.form.get('material_type_id', type=int)
         price = request.form['price']
         
+        if product_type_id not in product_types.names or material_type_id not in material_types.names:
+            return 'Неизвестный тип продукции или материала', 400
+        
         db.add_product(name, article, product_type_id, material_type_id, price)
         return redirect(url_for('products'))
     
-    product_types = db.get_product_types()
-    material_types = db.get_material_types()
-    
     return render_template('add_product.html', 
-                         product_types=product_types,
-                         material_types=material_types)
+                         product_types=product_types.rows,
+                         material_types=material_types.rows)
+
+@app.route('/products/<int:product_id>')
+@cached_response
+def product_detail(product_id):
+    # карточка продукции: тип, материал, маршрут по цехам и время производства
+    product = db.get_product_details(product_id)
+    if product is None:
+        abort(404)
+    return render_template('product_detail.html', product=product)
 
 @app.route('/products/edit/<int:product_id>', methods=['GET', 'POST'])
 def edit_product(product_id):
@@ -59,9 +196,9 @@ def edit_product(product_id):
         db.update_product(product_id, **updates)
         return redirect(url_for('products'))
     
-    product = db.execute_query("SELECT * FROM Products WHERE product_id = ?", (product_id,))
-    if product:
-        product = product[0]
+    product = db.get_product(product_id)
+    if product is None:
+        abort(404)
     
     return render_template('edit_product.html', product=product)
 
@@ -72,12 +209,14 @@ def delete_product(product_id):
     return redirect(url_for('products'))
 
 @app.route('/workshops')
+@cached_response
 def workshops():
     # список цехов
     workshops_list = db.get_workshops()
     return render_template('workshops.html', workshops=workshops_list)
 
 @app.route('/analytics')
+@cached_response
 def analytics():
     # аналитика
     by_type = db.get_products_by_type()
@@ -90,14 +229,229 @@ def analytics():
                          top_products=top_products)
 
 @app.route('/api/stats')
+@cached_response
 def api_stats():
     # апи статистика
     return jsonify(db.get_statistics())
 
+@app.route('/api/lookups')
+@cached_response
+def api_lookups():
+    # апи справочники: типы продукции, материалы, цеха
+    lookups = {name: db.get_lookup(name) for name in ('product_types', 'material_types', 'workshops')}
+    result = {name: lookup.rows for name, lookup in lookups.items()}
+    result['version'] = lookups['workshops'].version
+    return jsonify(result)
+
+@app.route('/api/pool')
+def api_pool():
+    # апи статистика пула соединений
+    return jsonify(db.get_pool_stats())
+
+@app.route('/api/cache')
+def api_cache():
+    # апи статистика кэша ответов
+    return jsonify(response_cache.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # метрики в формате Prometheus
+    pool = db.get_pool_stats()
+    cache = response_cache.stats()
+    gauges = {
+        'db_pool_size': ('Размер пула соединений', pool['size']),
+        'db_pool_in_use': ('Занятые соединения пула', pool['in_use']),
+        'db_data_version': ('Версия данных', db.data_version),
+        'response_cache_entries': ('Записей в кэше ответов', cache['entries']),
+        'response_cache_bytes': ('Объем кэша ответов, байт', cache['bytes']),
+        'response_cache_hits': ('Попадания в кэш ответов', cache['hits']),
+        'response_cache_misses': ('Промахи кэша ответов', cache['misses']),
+    }
+    if db.catalog is not None:
+        replica = db.catalog.stats()
+        gauges['catalog_replica_products'] = ('Позиций в реплике каталога', replica['products'])
+        gauges['catalog_replica_loads'] = ('Полные загрузки реплики каталога', replica['loads'])
+        gauges['catalog_replica_refreshes'] = ('Сквозные обновления реплики каталога', replica['refreshes'])
+    return Response(metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/slow-queries')
+def api_slow_queries():
+    # апи последние медленные запросы (?limit=N)
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        'threshold_ms': metrics.slow_query_threshold * 1000,
+        'queries': metrics.recent_slow_queries(limit),
+    })
+
 @app.route('/api/products')
+@cached_response
 def api_products():
     # апи продукция
-    return jsonify(db.get_products())
+    # ?limit=N&after=<курсор> - постраничная выдача {"items": [...], "next": курсор}
+    # ?format=ndjson - потоковая выдача по одной записи в строке
+    # ?format=rows - страница компактно: {"columns": [...], "items": [[...], ...], "next": курсор}
+    # без параметров - весь каталог JSON-массивом, но тоже потоком
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
+    fmt = request.args.get('format', 'json')
+    
+    try:
+        if fmt == 'ndjson':
+            rows = db.iter_products(after=after)
+            first = next(rows, None)
+            return Response(stream_with_context(_ndjson(first, rows)),
+                            mimetype='application/x-ndjson')
+        
+        if limit is not None or after or fmt == 'rows':
+            page = db.get_products_page(limit=limit or 100, after=after,
+                                        shape='tuple' if fmt == 'rows' else 'dict')
+            if page is None:
+                return jsonify({'error': 'Ошибка выполнения запроса'}), 500
+            return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return Response(stream_with_context(_json_array(db.iter_products())),
+                    mimetype='application/json')
+
+@app.route('/api/products/<int:product_id>')
+@cached_response
+def api_product(product_id):
+    # апи карточка продукции с маршрутом по цехам
+    product = db.get_product_details(product_id)
+    if product is None:
+        return jsonify({'error': 'Продукция не найдена'}), 404
+    return jsonify(product)
+
+@app.route('/api/analytics/report')
+def api_analytics_report():
+    # апи отчет с группировкой по снимку каталога в памяти
+    # ?group_by=type,workshop&measures=count,price:avg,hours:p95&material=...&sort=count&limit=N
+    # без кэша ответов: снимок обновляется по своему интервалу, а не по каждой версии данных
+    try:
+        return jsonify(analytics_engine.report(**parse_report_params(request.args)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/export/<table>.<fmt>')
+def export_table(table, fmt):
+    # выгрузка таблицы файлом: csv, xlsx или parquet; ?gzip=1 - сжать
+    compress = request.args.get('gzip') in ('1', 'true')
+    try:
+        chunks = export_stream(db, table, fmt, compress=compress)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except ImportError as e:
+        return jsonify({'error': str(e)}), 501
+    
+    filename = export_filename(table, fmt, compress)
+    return Response(stream_with_context(chunks),
+                    mimetype=export_mimetype(fmt, compress),
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+def _ndjson(first, rows):
+    # строки ndjson из генератора записей
+    if first is None:
+        return
+    yield app.json.dumps(first) + '\n'
+    for row in rows:
+        yield app.json.dumps(row) + '\n'
+
+def _json_array(rows):
+    # json-массив из генератора записей, по одному элементу за раз
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + app.json.dumps(row)
+    yield ']'
+
+@app.route('/api/products/batch', methods=['POST'])
+def api_products_batch():
+    # апи пакетные изменения продукции в одной транзакции
+    # тело: {"operations": [{"op": "add" | "update" | "delete", ...}, ...], "atomic": true}
+    # atomic=false - ошибочные операции пропускаются, остальные сохраняются
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else data
+    atomic = data.get('atomic', True) if isinstance(data, dict) else True
+    if not isinstance(operations, list):
+        return jsonify({'error': 'Ожидается список операций operations'}), 400
+    # строка "false" в bool() дала бы True: принимаем только true/false из json
+    if not isinstance(atomic, bool):
+        return jsonify({'error': 'atomic должен быть true или false'}), 400
+    if len(operations) > db.BATCH_LIMIT:
+        return jsonify({'error': f'Не больше {db.BATCH_LIMIT} операций в пакете'}), 400
+    
+    result = db.apply_product_batch(operations, atomic=atomic)
+    return jsonify(result), 200 if result['committed'] else 409
+
+@app.route('/api/calculate-material', methods=['POST'])
+def api_calculate_material():
+    # апи расчет сырья по типу продукции и материала
+    data = request.get_json(silent=True) or {}
+    try:
+        product_type_id = int(data['product_type_id'])
+        material_type_id = int(data['material_type_id'])
+        quantity = int(data['quantity'])
+        param1 = float(data['param1'])
+        param2 = float(data['param2'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Недостаточно параметров'}), 400
+    
+    material = db.calculate_material(product_type_id, material_type_id, quantity, param1, param2)
+    return jsonify({
+        'product_type_id': product_type_id,
+        'material_type_id': material_type_id,
+        'quantity': quantity,
+        'param1': param1,
+        'param2': param2,
+        'material_needed': material
+    })
+
+@app.route('/api/production/calculate', methods=['POST'])
+def api_production_calculate():
+    # апи пакетный расчет сырья и времени производства
+    # тело: {"orders": [{"product_id", "quantity", "param1", "param2"}, ...]}
+    data = request.get_json(silent=True)
+    orders = data.get('orders') if isinstance(data, dict) else data
+    if not isinstance(orders, list):
+        return jsonify({'error': 'Ожидается список заказов orders'}), 400
+    
+    try:
+        orders = [
+            {
+                'product_id': int(order['product_id']),
+                'quantity': int(order['quantity']),
+                'param1': float(order['param1']),
+                'param2': float(order['param2'])
+            }
+            for order in orders
+        ]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'У каждого заказа должны быть product_id, quantity, param1, param2'}), 400
+    
+    return jsonify(db.calculate_production(orders))
+
+@app.route('/api/schedule', methods=['POST'])
+def api_schedule():
+    # апи план загрузки цехов
+    # тело: {"orders": [{"product_id", "quantity"}, ...], "details": true}
+    data = request.get_json(silent=True)
+    orders = data.get('orders') if isinstance(data, dict) else data
+    details = data.get('details', True) if isinstance(data, dict) else True
+    if not isinstance(orders, list):
+        return jsonify({'error': 'Ожидается список заказов orders'}), 400
+    
+    try:
+        orders = [
+            {'product_id': int(order['product_id']), 'quantity': int(order['quantity'])}
+            for order in orders
+        ]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'У каждого заказа должны быть product_id и quantity'}), 400
+    
+    if any(order['quantity'] <= 0 for order in orders):
+        return jsonify({'error': 'Количество должно быть положительным'}), 400
+    
+    return jsonify(db.schedule_production(orders, details=bool(details)))
 
 if __name__ == '__main__':
     # Создать папку templates если нет